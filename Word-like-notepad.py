@@ -1,36 +1,1009 @@
+import time
+
+# Reference point for --startup-profile
+STARTED = time.perf_counter()
+
 import tkinter as tk
-from tkinter import filedialog, messagebox, ttk, font
+from tkinter import filedialog, messagebox, simpledialog, ttk, font
 from tkinter.colorchooser import askcolor
 import os
+import csv
+import ctypes
+import ctypes.util
 import json
+import heapq
+import queue
+import re
+import struct
+import sys
+import threading
+from bisect import bisect_right
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from PIL import Image, ImageTk
+from itertools import accumulate, chain
+
+from notepad_core import (
+    APP_DIR,
+    LARGE_FILE_PAGE_LINES,
+    IMAGE_MAX_SIZE,
+    OBJECT_CHAR,
+    PDF_FONT_FAMILIES,
+    PDF_FONTS,
+    PLAIN_STYLE,
+    SettingsStore,
+    RICH_EXTENSION,
+    Document,
+    DocumentStats,
+    EditJournal,
+    ExportJob,
+    ExportStyle,
+    LOAD_RESTART,
+    FileLoader,
+    LargeFileView,
+    PdfWriter,
+    SpellChecker,
+    Style,
+    StyleTable,
+    TableModel,
+    TextEdit,
+    UndoHistory,
+    atomic_write,
+    codec_errors,
+    config_dir,
+    decode_thumbnail,
+    compile_search,
+    count_words,
+    diff_hunks,
+    file_stamp,
+    iter_html,
+    iter_large_export_items,
+    journal_in_use,
+    open_delimited,
+    plan_replacements,
+    read_rich_document,
+    read_file,
+    replace_file,
+    sniff_file,
+    text_with_tables,
+    write_rich_document,
+    write_temp_file,
+)
+
+# PIL is imported on first use of an image feature, not at startup
+
+ICON_DIR = os.path.join(APP_DIR, "icons")
+
+# Files at least this big are opened in paged, memory-mapped mode
+LARGE_FILE_THRESHOLD = 64 * 1024 * 1024
+LARGE_FILE_WINDOW_PAGES = 3
+# Encodings whose lines LargeFileView can find by searching for b"\n"
+PAGEABLE_ENCODINGS = ("utf-8", "cp1252")
+# UI time spent inserting streamed-in text per event-loop turn
+LOAD_FRAME_MS = 30
+
+# Matches highlighted per tag_add call / per incremental search step
+FIND_BATCH = 2000
+
+
+def iter_match_indices(text, pattern):
+    # Yields (start, end) Tk indices for every non-empty match, counting
+    # lines incrementally so the whole scan stays a single pass.
+    line, line_start, pos = 1, 0, 0
+
+    def advance(offset):
+        nonlocal line, line_start, pos
+        newlines = text.count("\n", pos, offset)
+        if newlines:
+            line += newlines
+            line_start = text.rfind("\n", pos, offset) + 1
+        pos = offset
+        return f"{line}.{offset - line_start}"
+
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        if start != end:
+            yield advance(start), advance(end)
+
+
+# Tags that reflect editor state rather than formatting
+TRANSIENT_TAGS = ("sel", "found", "misspelled")
+STYLE_OPTIONS = ("font", "foreground", "background", "underline", "overstrike")
+# How often recorded edits are flushed to the recovery journal
+JOURNAL_INTERVAL_MS = 3000
+# How often open files are checked for changes made by other programs
+WATCH_INTERVAL_MS = 1000
+
+
+class FileWatcher:
+    """Tells which of a set of files may have changed on disk.
+
+    On Linux the files' directories are watched with inotify, through ctypes,
+    so only files with events are reported. Elsewhere, or if inotify is not
+    available, every file is reported on each call and the caller compares
+    file_stamp values, which amounts to mtime polling.
+    """
+
+    # IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE,
+    # IN_DELETE: in-place writes (including appends by programs that keep
+    # the file open) and atomic renames over the file
+    EVENTS = 0x2 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+    IN_Q_OVERFLOW = 0x4000
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self):
+        self._fd = None
+        self._dirs = {}  # directory -> watch descriptor
+        self._changed = set()
+        if sys.platform.startswith("linux"):
+            try:
+                self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+                fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            except (OSError, AttributeError):
+                fd = -1
+            if fd >= 0:
+                self._fd = fd
+
+    def changed(self, paths):
+        if self._fd is None:
+            return set(paths)
+        unwatched = self._update_watches(
+            {os.path.dirname(os.path.abspath(p)) for p in paths}
+        )
+        overflow = self._read_events()
+        if overflow:
+            return set(paths)
+        # Files in directories inotify would not watch (out of watches, no
+        # permission) are always reported, so the caller's stamps decide
+        changed = {
+            p
+            for p in paths
+            if os.path.abspath(p) in self._changed
+            or os.path.dirname(os.path.abspath(p)) in unwatched
+        }
+        self._changed.clear()
+        return changed
+
+    def _update_watches(self, directories):
+        # Returns the directories that could not be watched; they are tried
+        # again on the next call
+        for directory in set(self._dirs) - directories:
+            self._libc.inotify_rm_watch(self._fd, self._dirs.pop(directory))
+        unwatched = set()
+        for directory in directories - set(self._dirs):
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(directory), self.EVENTS
+            )
+            if wd >= 0:
+                self._dirs[directory] = wd
+            else:
+                unwatched.add(directory)
+        return unwatched
+
+    def _read_events(self):
+        names = {wd: directory for directory, wd in self._dirs.items()}
+        overflow = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return overflow
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & self.IN_Q_OVERFLOW:
+                    overflow = True
+                elif wd in names:
+                    self._changed.add(os.path.join(names[wd], os.fsdecode(name)))
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+# How long after text is deleted unused style tags are collected
+STYLE_COLLECT_MS = 1000
+
+
+class StyleRegistry(StyleTable):
+    """Interns style combinations as one Text tag each (style_<n>).
+
+    Every character carries at most one style tag, so identical neighbouring
+    runs share a tag and Tk merges their ranges. Tk already counts each
+    tag's ranges, so a tag is deleted as soon as tag_nextrange finds none.
+
+    One registry serves every tab: a style has the same tag name in each of
+    them, and attach() points it at whichever tab's widget is showing.
+    """
+
+    def __init__(self, widget=None):
+        super().__init__()
+        self.widget = widget
+        self._configured = set()  # tags configured on the current widget
+
+    def attach(self, widget):
+        # A new widget has none of the tags yet; tag_for configures them
+        # as the text it shows asks for them.
+        self.widget = widget
+        self._configured = set()
+
+    def tag_for(self, style):
+        tag = self.intern(style)
+        if tag not in self._configured:
+            self.configure(tag, style)
+        return tag
+
+    def configure(self, tag, style):
+        base = font.Font(font=self.widget.cget("font")).actual()
+        modifiers = [
+            name
+            for name, enabled in zip(
+                ("bold", "italic", "underline"),
+                (style.bold, style.italic, style.underline),
+            )
+            if enabled
+        ]
+        options = {
+            "font": (
+                style.family or base["family"],
+                style.size or base["size"],
+                " ".join(modifiers),
+            )
+        }
+        if style.foreground:
+            options["foreground"] = style.foreground
+        if style.background:
+            options["background"] = style.background
+        self.widget.tag_configure(tag, **options)
+        self._configured.add(tag)
+
+    def style_at(self, index):
+        for tag in self.widget.tag_names(index):
+            if tag in self._styles:
+                return self._styles[tag]
+        return PLAIN_STYLE
+
+    def runs(self, start, end):
+        # (start, end, style tag or None) for each stretch of one style
+        start, end = self.widget.index(start), self.widget.index(end)
+        active = [tag for tag in self.widget.tag_names(start) if tag in self._styles]
+        current = active[0] if active else None
+        runs = []
+        position = start
+        dump = self.widget.tk.splitlist(
+            self.widget.tk.call(self.widget._w, "dump", "-tag", start, end)
+        )
+        for key, tag, index in zip(dump[::3], dump[1::3], dump[2::3]):
+            if tag not in self._styles:
+                continue
+            index = str(index)
+            if index != position and self.widget.compare(index, ">", position):
+                runs.append((position, index, current))
+                position = index
+            current = tag if key == "tagon" else None
+        if self.widget.compare(position, "<", end):
+            runs.append((position, end, current))
+        return runs
+
+    def restyle(self, start, end, change):
+        # Applies change(style) -> style to every run in the range, with one
+        # tag remove/add call per tag involved.
+        removals = {}
+        additions = {}
+        for run_start, run_end, tag in self.runs(start, end):
+            old = self._styles[tag] if tag else PLAIN_STYLE
+            new = change(old)
+            if new == old:
+                continue
+            if tag is not None:
+                removals.setdefault(tag, []).extend((run_start, run_end))
+            if new != PLAIN_STYLE:
+                additions.setdefault(self.tag_for(new), []).extend((run_start, run_end))
+        for tag, ranges in removals.items():
+            self.widget.tk.call(self.widget._w, "tag", "remove", tag, *ranges)
+        for tag, ranges in additions.items():
+            self.widget.tag_add(tag, *ranges)
+        self.collect(removals)
+
+    def adopt(self, style, ranges):
+        # Applies runs loaded from a saved document
+        tag = self.tag_for(style)
+        if ranges:
+            self.widget.tag_add(tag, *ranges)
+        return tag
+
+    def collect(self, tags=None):
+        # Frees style tags no text uses any more. Deleting text drops ranges
+        # behind our back, so a full collect checks every style tag.
+        for tag in list(self._styles if tags is None else tags):
+            if tag in self._styles and not self.widget.tag_nextrange(tag, "1.0"):
+                self.widget.tag_delete(tag)
+                self._configured.discard(tag)
+                self.forget(tag)
+
+    def statistics(self):
+        ranges = sum(
+            len(self.widget.tag_ranges(tag)) // 2 for tag in self.widget.tag_names()
+        )
+        return len(self.widget.tag_names()), len(self._styles), ranges
+
+
+IMAGE_CACHE_SIZE = 64
+
+
+def image_key(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+class ThumbnailCache:
+    """LRU cache of decoded thumbnails keyed by path, mtime and size."""
+
+    def __init__(self, capacity=IMAGE_CACHE_SIZE):
+        self.capacity = capacity
+        self._items = OrderedDict()
+
+    def get(self, key):
+        image = self._items.get(key)
+        if image is not None:
+            self._items.move_to_end(key)
+        return image
+
+    def put(self, key, image):
+        self._items[key] = image
+        self._items.move_to_end(key)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+
+# Rows an embedded table shows at once, and the widest a column is drawn
+TABLE_VISIBLE_ROWS = 15
+TABLE_MAX_COLUMN_CHARS = 30
+# Rows sampled when sizing the columns of a table
+TABLE_SAMPLE_ROWS = 200
+
+
+class TableView(ttk.Frame):
+    """A TableModel embedded in the text, drawing only the rows in sight.
+
+    The canvas holds one text item per visible cell; scrolling rewrites
+    their text instead of creating items, so a 10k-row table costs the same
+    to show as a 10-row one. Double-click a cell to edit it.
+    """
+
+    def __init__(self, master, model, on_change=None):
+        super().__init__(master)
+        self.model = model
+        self.on_change = on_change
+        self.top = 0
+        self.font = font.nametofont("TkDefaultFont")
+        self.row_height = self.font.metrics("linespace") + 6
+        self.char_width = self.font.measure("0")
+        self.widths = self.column_widths()
+        self.edges = list(accumulate(self.widths, initial=0))
+        self.canvas = tk.Canvas(
+            self,
+            width=self.edges[-1] + 1,
+            height=(TABLE_VISIBLE_ROWS + 1) * self.row_height + 1,
+            background="white",
+            highlightthickness=0,
+        )
+        self.canvas.pack(side=tk.LEFT)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.items = []  # canvas text items, header row first
+        self._editor = None
+        self.draw_grid()
+        self.redraw()
+        self.canvas.bind("<Double-Button-1>", self.edit_cell)
+        self.canvas.bind("<MouseWheel>", self.on_wheel)
+        self.canvas.bind("<Button-4>", lambda event: self.yview("scroll", -3, "units"))
+        self.canvas.bind("<Button-5>", lambda event: self.yview("scroll", 3, "units"))
+
+    def column_widths(self):
+        widths = [len(str(name)) for name in self.model.header]
+        for row in self.model.iter_rows(TABLE_SAMPLE_ROWS):
+            widths = [max(width, len(str(cell))) for width, cell in zip(widths, row)]
+        return [
+            (min(max(width, 4), TABLE_MAX_COLUMN_CHARS) + 2) * self.char_width
+            for width in widths
+        ]
+
+    def draw_grid(self):
+        height = (TABLE_VISIBLE_ROWS + 1) * self.row_height
+        for x in self.edges:
+            self.canvas.create_line(x, 0, x, height, fill="#b0b0b0")
+        for row in range(TABLE_VISIBLE_ROWS + 2):
+            y = row * self.row_height
+            self.canvas.create_line(0, y, self.edges[-1], y, fill="#b0b0b0")
+        self.canvas.create_rectangle(
+            1, 1, self.edges[-1], self.row_height, fill="#eeeeee", outline=""
+        )
+        for row in range(TABLE_VISIBLE_ROWS + 1):
+            y = row * self.row_height + self.row_height // 2
+            self.items.append(
+                [
+                    self.canvas.create_text(
+                        x + self.char_width // 2, y, anchor=tk.W, font=self.font
+                    )
+                    for x in self.edges[:-1]
+                ]
+            )
+
+    def _clip(self, text, column):
+        limit = self.widths[column] // self.char_width - 2
+        text = str(text).replace("\n", " ")
+        return text if len(text) <= limit else text[: limit - 1] + "\u2026"
+
+    def redraw(self):
+        rows = self.model.rows
+        for line, items in enumerate(self.items):
+            row = -1 if line == 0 else self.top + line - 1
+            for column, item in enumerate(items):
+                text = self.model.cell(row, column) if row < rows else ""
+                self.canvas.itemconfigure(item, text=self._clip(text, column))
+        if rows:
+            self.scrollbar.set(
+                self.top / rows, min(self.top + TABLE_VISIBLE_ROWS, rows) / rows
+            )
+        else:
+            self.scrollbar.set(0, 1)
+
+    def refresh(self):
+        # Called while rows are still being imported
+        self.redraw()
+
+    def yview(self, *args):
+        rows = self.model.rows
+        if args[0] == "moveto":
+            top = int(float(args[1]) * rows)
+        elif args[2] == "pages":
+            top = self.top + int(args[1]) * TABLE_VISIBLE_ROWS
+        else:
+            top = self.top + int(args[1])
+        top = max(0, min(top, rows - TABLE_VISIBLE_ROWS))
+        if top != self.top:
+            self.top = top
+            self.redraw()
+
+    def on_wheel(self, event):
+        self.yview("scroll", -3 if event.delta > 0 else 3, "units")
+
+    def cell_at(self, x, y):
+        column = bisect_right(self.edges, x) - 1
+        line = int(y // self.row_height)
+        if not 0 <= column < len(self.widths) or line > TABLE_VISIBLE_ROWS:
+            return None
+        row = -1 if line == 0 else self.top + line - 1
+        if row >= self.model.rows:
+            return None
+        return row, column
+
+    def edit_cell(self, event):
+        cell = self.cell_at(event.x, event.y)
+        if cell is None:
+            return
+        self.finish_edit()
+        row, column = cell
+        line = 0 if row < 0 else row - self.top + 1
+        entry = ttk.Entry(self.canvas, font=self.font)
+        entry.insert(0, self.model.cell(row, column))
+        entry.select_range(0, tk.END)
+        window = self.canvas.create_window(
+            self.edges[column] + 1,
+            line * self.row_height + 1,
+            anchor=tk.NW,
+            window=entry,
+            width=self.widths[column] - 1,
+            height=self.row_height - 1,
+        )
+        self._editor = (entry, window, row, column)
+        entry.bind("<Return>", lambda event: self.finish_edit())
+        entry.bind("<FocusOut>", lambda event: self.finish_edit())
+        entry.bind("<Escape>", lambda event: self.finish_edit(keep=False))
+        entry.focus_set()
+
+    def finish_edit(self, keep=True):
+        if self._editor is None:
+            return
+        entry, window, row, column = self._editor
+        self._editor = None
+        value = entry.get()
+        self.canvas.delete(window)
+        entry.destroy()
+        if keep and value != self.model.cell(row, column):
+            self.model.set_cell(row, column, value)
+            self.redraw()
+            if self.on_change is not None:
+                self.on_change()
+
+
+# Export walks the widget this many lines per dump call, and spends at most
+# EXPORT_FRAME_MS of each event-loop turn writing
+EXPORT_DUMP_LINES = 200
+EXPORT_FRAME_MS = 30
+# Their modification times stand in for the state of the font configuration
+FONT_DIRS = (
+    "/etc/fonts",
+    "/etc/fonts/conf.d",
+    "/usr/share/fonts",
+    "/usr/local/share/fonts",
+    "/var/cache/fontconfig",
+    "~/.fonts",
+    "~/.local/share/fonts",
+    "~/.config/fontconfig",
+    "~/.cache/fontconfig",
+    "/Library/Fonts",
+    "/System/Library/Fonts",
+    "~/Library/Fonts",
+    os.path.join(os.environ.get("WINDIR", r"C:\Windows"), "Fonts"),
+)
+
+
+def font_cache_key():
+    key = []
+    for directory in FONT_DIRS:
+        path = os.path.expanduser(directory)
+        try:
+            key.append([path, os.stat(path).st_mtime_ns])
+        except OSError:
+            pass
+    return key
+
+
+def cached_font_families(root):
+    # font.families() walks every installed font; reuse the last answer
+    # until the font directories change.
+    path = os.path.join(config_dir("cache"), "fonts.json")
+    key = font_cache_key()
+    try:
+        with open(path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached["key"] == key:
+            return cached["families"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    families = sorted(set(font.families(root)))
+    try:
+        atomic_write(path, [json.dumps({"key": key, "families": families})])
+    except OSError:
+        pass
+    return families
+
+
+# Minimum time between two status bar repaints (one frame at 60 Hz)
+STATUS_FRAME_MS = 16
+
+
+class LatencyMonitor:
+    """Keystroke-to-paint latencies of the most recent keystrokes."""
+
+    def __init__(self, size=1000):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, percent):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        # Nearest-rank percentile
+        rank = round(percent / 100 * len(ordered)) - 1
+        return ordered[max(0, min(len(ordered) - 1, rank))]
+
+    def summary(self):
+        if not self.samples:
+            return "No keystrokes measured yet."
+        return "\n".join(
+            [f"Keystrokes: {len(self.samples)}"]
+            + [
+                f"p{percent}: {self.percentile(percent) * 1000:.1f} ms"
+                for percent in (50, 95, 99)
+            ]
+            + [f"max: {max(self.samples) * 1000:.1f} ms"]
+        )
+
+
+class StartupProfiler:
+    """Times the phases of startup for --startup-profile."""
+
+    def __init__(self, started=STARTED):
+        self.phases = []
+        self._last = started
+        self.started = started
+        self.first_paint = None
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+        if name == "first paint":
+            self.first_paint = now - self.started
+
+    def report(self):
+        print("Startup profile:")
+        for name, seconds in self.phases:
+            print(f"  {name:<24}{seconds * 1000:9.1f} ms")
+        if self.first_paint is not None:
+            print(f"Time to first paint: {self.first_paint * 1000:.1f} ms")
+
+
+# Commands remembered by the command profiler, and how many of the slowest
+# keep their full cProfile data for "Save Slowest Calls"
+COMMAND_HISTORY = 500
+COMMAND_SLOWEST_KEPT = 10
+# Python -> Tcl entry points counted as Tcl round trips
+TCL_ENTRY_POINTS = (
+    "<method 'call' of '_tkinter.tkapp' objects>",
+    "<method 'eval' of '_tkinter.tkapp' objects>",
+)
+
+CommandSample = namedtuple("CommandSample", "name started seconds tcl_calls peak")
+
+
+class CommandProfiler:
+    """Opt-in timings of menu and toolbar commands.
+
+    While enabled, each wrapped command runs under cProfile and tracemalloc;
+    its wall time, Tcl round trips and peak Python memory go into a ring
+    buffer. Only the UI thread's share of a command is measured, which is
+    the part that freezes the window. Times include the profiler's overhead.
+    """
+
+    def __init__(self, history=COMMAND_HISTORY, keep=COMMAND_SLOWEST_KEPT):
+        self.samples = deque(maxlen=history)
+        self.keep = keep
+        self.slowest = []  # heap of (seconds, sequence, sample, profile)
+        self.enabled = False
+        self._active = False
+        self._sequence = 0
+
+    def enable(self):
+        import tracemalloc
+
+        if not self.enabled:
+            self.enabled = True
+            tracemalloc.start()
+
+    def disable(self):
+        import tracemalloc
+
+        if self.enabled:
+            self.enabled = False
+            tracemalloc.stop()
+
+    def wrap(self, name, func):
+        def command(*args):
+            # Commands run from other commands count towards the outer one
+            if not self.enabled or self._active:
+                return func(*args)
+            return self.run(name, func, *args)
+
+        return command
+
+    def run(self, name, func, *args):
+        import cProfile
+        import tracemalloc
+
+        profile = cProfile.Profile()
+        self._active = True
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        started = datetime.now()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+            seconds = time.perf_counter() - start
+            peak = max(0, tracemalloc.get_traced_memory()[1] - base)
+            self._active = False
+            self.record(name, started, seconds, peak, profile)
+
+    def record(self, name, started, seconds, peak, profile):
+        profile.create_stats()
+        tcl_calls = sum(
+            stat[1]
+            for (path, _, function), stat in profile.stats.items()
+            if path == "~" and function in TCL_ENTRY_POINTS
+        )
+        sample = CommandSample(name, started, seconds, tcl_calls, peak)
+        self.samples.append(sample)
+        self._sequence += 1
+        entry = (seconds, self._sequence, sample, profile)
+        if len(self.slowest) < self.keep:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+    def summary(self):
+        if not self.samples:
+            return "No commands recorded yet."
+        by_name = {}
+        for sample in self.samples:
+            by_name.setdefault(sample.name, []).append(sample)
+        lines = []
+        for name, samples in sorted(
+            by_name.items(), key=lambda item: -max(s.seconds for s in item[1])
+        ):
+            slowest = max(samples, key=lambda s: s.seconds)
+            lines.append(
+                f"{name}: {len(samples)} calls, slowest "
+                f"{slowest.seconds * 1000:.1f} ms, {slowest.tcl_calls} Tcl calls, "
+                f"{slowest.peak / 1024:.0f} KB peak "
+                f"(at {slowest.started.strftime('%H:%M:%S')})"
+            )
+        return "\n".join(lines)
+
+    def dump(self, path):
+        # One cProfile stats file covering the slowest calls; it opens in
+        # pstats, snakeviz, or flameprof for a flame graph.
+        import pstats
+
+        if not self.slowest:
+            return 0
+        profiles = [entry[3] for entry in sorted(self.slowest, reverse=True)]
+        pstats.Stats(*profiles).dump_stats(path)
+        return len(profiles)
+
+
+class LineNumberGutter(tk.Canvas):
+    """Numbers for the lines of a Text widget that are in view.
+
+    Only visible lines are drawn, reusing one canvas item per screen line,
+    so a redraw costs the same on a 10-line file as on a 1M-line one.
+    """
+
+    def __init__(self, master, text):
+        super().__init__(master, width=1, highlightthickness=0)
+        self.text = text
+        self.font = font.nametofont("TkFixedFont")
+        self.foreground = "#808080"
+        self.items = []
+        self._digits = 0
+
+    def set_colors(self, background, foreground):
+        self.foreground = foreground
+        self.config(background=background)
+        for item in self.items:
+            self.itemconfigure(item, fill=foreground)
+
+    def redraw(self, first_line=0, total=1):
+        # first_line counts the lines before widget line 1 (paged files)
+        digits = len(str(first_line + total))
+        if digits != self._digits:
+            self._digits = digits
+            self.config(width=(max(digits, 2) + 1) * self.font.measure("0"))
+        right = int(self.cget("width")) - self.font.measure("0") // 2
+        used = 0
+        # The first line in view may have started above the top edge
+        index = self.text.index("@0,0")
+        while True:
+            info = self.text.dlineinfo(index)
+            if info is None:
+                break
+            line = int(index.split(".")[0])
+            if used == len(self.items):
+                self.items.append(
+                    self.create_text(
+                        0, 0, anchor=tk.NE, font=self.font, fill=self.foreground
+                    )
+                )
+            item = self.items[used]
+            self.coords(item, right, info[1])
+            self.itemconfigure(item, text=first_line + line, state=tk.NORMAL)
+            used += 1
+            index = self.text.index(f"{line + 1}.0")
+            if int(index.split(".")[0]) <= line:
+                break  # past the last line
+        for item in self.items[used:]:
+            self.itemconfigure(item, state=tk.HIDDEN)
+
+
+class InstrumentedMenu(tk.Menu):
+    """Menu whose commands are timed by a CommandProfiler."""
+
+    def __init__(self, master, profiler, name, **options):
+        super().__init__(master, **options)
+        self.profiler = profiler
+        self.name = name
+
+    def add_command(self, cnf={}, **options):
+        if "command" in options:
+            options["command"] = self.profiler.wrap(
+                f"{self.name} > {options.get('label')}", options["command"]
+            )
+        super().add_command(cnf, **options)
+
+
+class DocumentTab:
+    """One open document and the notebook page it is shown on.
+
+    Only the selected tab has a Text widget. A hidden tab keeps its Document,
+    its style runs and image paths in the collect_styles format, or, in
+    large-file mode, its LargeFileView with the edited pages.
+    """
+
+    def __init__(self, frame, number, undo_history):
+        self.frame = frame
+        self.number = number  # keeps journal file names apart
+        self.undo_history = undo_history
+        self.filename = None
+        self.large_view = None
+        self._paging_scheduled = False
+        self.document = Document()
+        self.stats = DocumentStats()
+        self.journal = None
+        self._journal_base = (None, None)
+        self._save_future = None
+        self.images = {}  # image name in the widget -> {"path", "photo"}
+        self.tables = {}  # window path in the widget -> TableView
+        self.loader = None  # FileLoader while the file is still streaming in
+        self.on_disk = (None, None)  # path and file_stamp as last read or written
+        self.disk_check = False  # set when the file may have changed on disk
+        self.external_change = False  # changed on disk and not reloaded
+        self.reloading = False
+        self.encoding = "utf-8"  # what plain-text saves are written in
+        self.bom = False
+        self.content_saved = True
+        self.text_widget = None
+        self.scrollbar = None
+        self.gutter = None
+        self._text_command = None
+        self.saved_styles = None  # collect_styles() output while hidden
+        self.view_index = "1.0"
+        self.insert_index = "1.0"
+
+    @property
+    def title(self):
+        return os.path.basename(self.filename) if self.filename else "Untitled"
+
+    def is_blank(self):
+        return (
+            self.filename is None
+            and self.large_view is None
+            and self.content_saved
+            and not len(self.document)
+        )
+
+
+class TabAttribute:
+    """WordLikeNotepad attribute that lives on the selected DocumentTab."""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, app, owner=None):
+        if app is None:
+            return self
+        return getattr(app.tab, self.name)
+
+    def __set__(self, app, value):
+        setattr(app.tab, self.name, value)
 
 
 class WordLikeNotepad:
-    def __init__(self, master):
+    # Per-document state, read from and written to the selected tab
+    filename = TabAttribute()
+    large_view = TabAttribute()
+    _paging_scheduled = TabAttribute()
+    document = TabAttribute()
+    stats = TabAttribute()
+    journal = TabAttribute()
+    _journal_base = TabAttribute()
+    _save_future = TabAttribute()
+    images = TabAttribute()
+    tables = TabAttribute()
+    content_saved = TabAttribute()
+    text_widget = TabAttribute()
+    scrollbar = TabAttribute()
+    gutter = TabAttribute()
+    _text_command = TabAttribute()
+
+    def __init__(self, master, profiler=None, profile_commands=False):
         self.master = master
+        self.profiler = profiler
+        self.command_profiler = CommandProfiler()
+        if profile_commands:
+            self.command_profiler.enable()
         self.master.title("Word-like Notepad")
         self.master.geometry("800x600")  # Set initial size
         self.master.minsize(400, 300)  # Set minimum size
 
-        self.filename = None
-        self.settings = self.load_settings()
+        self.tabs = []
+        self.tab = None
+        self._next_tab = 0
+        self._restoring = False
+        self._skip_undo = False
+        self._quiet = False  # inside _quiet_edit
+        self.edit_listeners = []
+        self._search_job = None
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.spell_checker = None
+        self.spell_enabled = False
+        self._spell_dirty = set()
+        self._spell_checking = set()  # lines being checked on the worker
+        self._spell_job = None
+        self._spell_running = False
+        self.edit_listeners.append(self.track_spell_lines)
+        self._stats_scheduled = False
+        self.edit_listeners.append(self.track_stats)
+        self._gutter_scheduled = False
+        self.edit_listeners.append(self.track_gutter)
+        self.edit_listeners.append(self.record_edit)
+        self.edit_listeners.append(self.record_undo)
+        self._style_collect_job = None
+        self.edit_listeners.append(self.track_style_tags)
+        self.image_executor = ThreadPoolExecutor(
+            max_workers=min(4, os.cpu_count() or 1)
+        )
+        self.thumbnails = ThumbnailCache()
+        self._placeholder = None
+        self.settings = SettingsStore(self.master, self.executor)
         self.default_font = font.Font(family="Arial", size=12)
+        self.fonts = None  # filled in when the font dropdown first opens
+        self._status_message = "Ready"
+        self._status_text = None
+        self._status_scheduled = False
+        self._status_painted = 0.0
+        self.progress_frame = None  # see show_progress
+        self._export = None  # the ExportJob being written
+        self.latency = LatencyMonitor()
+        self._key_started = None
+        self._startup_finished = False
+        self.mark_startup("settings")
 
         """ self.download_icons()  # Download icons before creating UI elements """
 
-        self.create_text_widget()
+        self.styles = StyleRegistry()
+        self.create_notebook()
+        self.mark_startup("text widget")
         self.create_menu()
+        self.mark_startup("menu")
         self.create_toolbar()
+        self.mark_startup("toolbar")
         self.create_format_bar()
+        self.mark_startup("format bar")
         self.create_status_bar()
+        self.mark_startup("status bar")
 
         self.apply_theme(self.settings.get("theme", "light"))
+        self.mark_startup("theme")
+
+        # Icons and the recovery check wait until the window is on screen
+        self._expose_binding = self.text_widget.bind("<Expose>", self.on_first_paint)
+        self.master.after(1000, self.finish_startup)
 
-        self.content_saved = True
-        self.text_widget.bind("<<Modified>>", self.on_content_modified)
         self.master.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.master.after(JOURNAL_INTERVAL_MS, self.flush_journal)
+        self.file_watcher = FileWatcher()
+        self.master.after(WATCH_INTERVAL_MS, self.watch_files)
+
+    def mark_startup(self, phase):
+        if self.profiler is not None:
+            self.profiler.mark(phase)
+
+    def on_first_paint(self, event=None):
+        widget = event.widget if event is not None else self.text_widget
+        widget.unbind("<Expose>", self._expose_binding)
+        self.mark_startup("first paint")
+        self.master.after_idle(self.finish_startup)
+
+    def finish_startup(self):
+        if self._startup_finished:
+            return
+        self._startup_finished = True
+        self.load_toolbar_icons()
+        self.mark_startup("icons (deferred)")
+        if self.profiler is not None:
+            self.profiler.report()
+        self.offer_recovery()
 
     def download_icons(self):
         icons = {
@@ -52,75 +1025,63 @@ class WordLikeNotepad:
                 img.save(f"icons/{name}.png")
         """
 
-    def load_settings(self):
-        settings_file = "notepad_settings.json"
-        default_settings = {
-            "font_family": "Arial",
-            "font_size": 12,
-            "theme": "light",
-        }
-
-        if os.path.exists(settings_file):
-            with open(settings_file, "r") as f:
-                try:
-                    return json.load(f)
-                except json.JSONDecodeError:
-                    print("Error reading settings file. Using default settings.")
-                    return default_settings
-        else:
-            print("Settings file not found. Using default settings.")
-            return default_settings
-
-    def save_settings(self):
-        settings_file = "word_like_notepad_settings.json"
-        with open(settings_file, "w") as f:
-            json.dump(self.settings, f)
-
     def create_toolbar(self):
         self.toolbar = ttk.Frame(self.master)
         self.toolbar.pack(side=tk.LEFT, fill=tk.X)
 
-        self.new_icon = ImageTk.PhotoImage(Image.open("icons/new.png"))
-        self.open_icon = ImageTk.PhotoImage(Image.open("icons/open.png"))
-        self.save_icon = ImageTk.PhotoImage(Image.open("icons/save.png"))
-
-        self.bold_icon = ImageTk.PhotoImage(Image.open("icons/bold.png"))
-        self.italic_icon = ImageTk.PhotoImage(Image.open("icons/italic.png"))
-        self.underline_icon = ImageTk.PhotoImage(Image.open("icons/underline.png"))
-
-        ttk.Button(self.toolbar, image=self.new_icon, command=self.new_file).pack(
-            side=tk.LEFT,
-            padx=2,
-            pady=2,
-        )
-        ttk.Button(self.toolbar, image=self.open_icon, command=self.open_file).pack(
-            side=tk.LEFT, padx=2, pady=2
-        )
-        ttk.Button(self.toolbar, image=self.save_icon, command=self.save_file).pack(
-            side=tk.LEFT, padx=2, pady=2
-        )
+        # Buttons start out as text; load_toolbar_icons swaps the icons in
+        # once the window is showing.
+        self.toolbar_buttons = {}
+        for name, label, command in (
+            ("new", "New", self.new_file),
+            ("open", "Open", self.open_file),
+            ("save", "Save", self.save_file),
+            ("bold", "B", self.toggle_bold),
+            ("italic", "I", self.toggle_italic),
+            ("underline", "U", self.toggle_underline),
+        ):
+            button = ttk.Button(
+                self.toolbar,
+                text=label,
+                command=self.command_profiler.wrap(f"Toolbar > {label}", command),
+            )
+            button.pack(side=tk.LEFT, padx=2, pady=2)
+            self.toolbar_buttons[name] = button
+
+    def load_toolbar_icons(self):
+        # Tk decodes PNG natively, so PIL is not needed for icons. The
+        # decoded pixels are not cached on disk: Tk 8.6 can only write them
+        # back as PPM (no alpha) or GIF (one bit of alpha), which would give
+        # boxed or jagged icons, and the PNGs are already the smallest form
+        # to read. Decoding after the first paint keeps them off the startup
+        # path instead.
+        for name, button in self.toolbar_buttons.items():
+            try:
+                icon = tk.PhotoImage(
+                    master=self.master, file=os.path.join(ICON_DIR, f"{name}.png")
+                )
+            except tk.TclError:
+                continue  # keep the text label
+            setattr(self, f"{name}_icon", icon)
+            button.config(image=icon)
 
-        ttk.Button(self.toolbar, image=self.bold_icon, command=self.toggle_bold).pack(
-            side=tk.LEFT, padx=2, pady=2
-        )
-        ttk.Button(
-            self.toolbar, image=self.italic_icon, command=self.toggle_italic
-        ).pack(side=tk.LEFT, padx=2, pady=2)
-        ttk.Button(
-            self.toolbar, image=self.underline_icon, command=self.toggle_underline
-        ).pack(side=tk.LEFT, padx=2, pady=2)
+    def create_notebook(self):
+        self.notebook = ttk.Notebook(self.master)
+        self.notebook.pack(expand=True, fill=tk.BOTH)
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.new_tab()
 
     def create_text_widget(self):
-        self.text_frame = ttk.Frame(self.master)
-        self.text_frame.pack(expand=True, fill=tk.BOTH)
-
-        # Text Widget
-        self.text_widget = tk.Text(self.text_frame, wrap=tk.WORD, undo=True)
+        # Text Widget, created in the selected tab's page
+        # Undo is handled by the tab's UndoHistory, not Tk
+        self.text_widget = tk.Text(self.tab.frame, wrap=tk.WORD, undo=False)
         self.text_widget.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.install_text_proxy()
+        self.styles.attach(self.text_widget)
 
         # Scrollbar
         self.scrollbar = ttk.Scrollbar(
-            self.text_widget, orient=tk.VERTICAL, command=self.text_widget.yview
+            self.text_widget, orient=tk.VERTICAL, command=self.on_scrollbar
         )
         self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
@@ -129,32 +1090,333 @@ class WordLikeNotepad:
 
         # Bind events
         self.text_widget.bind("<KeyPress>", self.on_key_press)
-        self.text_widget.bind("<KeyRelease>", self.on_key_press)
-        self.text_widget.config(
-            yscrollcommand=lambda *args: (self.scrollbar.set(*args))
+        self.install_latency_probe(self.text_widget)
+        self.text_widget.bind("<<Selection>>", self.schedule_stats_update)
+        self.text_widget.bind("<<Modified>>", self.on_content_modified)
+        self.text_widget.bind("<Configure>", self.schedule_gutter_update)
+        self.text_widget.config(yscrollcommand=self.on_text_scroll)
+
+        # Line numbers, left of the text
+        self.gutter = LineNumberGutter(self.tab.frame, self.text_widget)
+        self.gutter.pack(side=tk.LEFT, fill=tk.Y, before=self.text_widget)
+        self.apply_theme(self.settings.get("theme", "light"))
+
+    def destroy_text_widget(self, tab):
+        # The proxy command is ours, so Tk leaves it behind on destroy
+        widget = tab.text_widget
+        path = widget._w
+        widget.destroy()
+        widget.tk.deletecommand(path)
+        tab.gutter.destroy()
+        tab.text_widget = tab.scrollbar = tab._text_command = tab.gutter = None
+        tab.images = {}
+        tab.tables = {}
+        tab._paging_scheduled = False
+
+    def new_tab(self):
+        history = UndoHistory(
+            self.settings["undo_steps"],
+            self.settings["undo_memory_mb"] * 1024 * 1024,
+            self.settings["undo_spill"],
         )
+        tab = DocumentTab(ttk.Frame(self.notebook), self._next_tab, history)
+        self._next_tab += 1
+        self.tabs.append(tab)
+        self.notebook.add(tab.frame, text=tab.title)
+        self.activate_tab(tab)
+        return tab
+
+    def prepare_tab(self):
+        # Documents open in a new tab unless the current one is still blank
+        if self.tab.is_blank():
+            return self.tab
+        return self.new_tab()
+
+    def on_tab_changed(self, event=None):
+        selected = self.notebook.select()
+        for tab in self.tabs:
+            if str(tab.frame) == selected:
+                self.activate_tab(tab)
+                break
+
+    def activate_tab(self, tab):
+        if tab is self.tab:
+            return
+        self.cancel_search()
+        self.hide_progress()  # _pump_load shows it again for a loading tab
+        # An export reads the widget being released, so it cannot go on
+        export_cancelled = self._export is not None
+        if self.tab is not None:
+            self.cancel_export()
+            self.release_tab(self.tab)
+        self.tab = tab
+        self.notebook.select(tab.frame)
+        self.create_text_widget()
+        self.restore_tab(tab)
+        self.update_title()
+        self.schedule_stats_update()
+        tab.disk_check = True
+        self.check_disk(tab)
+        if self.spell_enabled:
+            self.text_widget.tag_config(
+                "misspelled", underline=True, foreground="#c00000"
+            )
+            self._spell_dirty = None
+            self.schedule_spell_check(delay=0)
+        if export_cancelled:
+            self.update_status("Export cancelled: its tab was switched away from")
+
+    def release_tab(self, tab):
+        # Keep only the compact model of a tab that goes out of view
+        view = tab.large_view
+        if view is not None:
+            if view.last_page >= 0:
+                self.store_pages()
+                view.last_page = -1  # first_page is where it comes back
+            tab.document = Document()
+            tab.stats = DocumentStats()
+        else:
+            tab.saved_styles = self.collect_styles()
+            tab.saved_styles["tables"] = self.collect_tables()
+            tab.view_index = self.text_widget.index("@0,0")
+            tab.insert_index = self.text_widget.index(tk.INSERT)
+        self.destroy_text_widget(tab)
+
+    def restore_tab(self, tab):
+        view = tab.large_view
+        if view is not None:
+            if view.page_available(view.first_page):
+                self.show_pages(view.first_page)
+            self._poll_large_index(view, view.first_page)
+            return
+        if tab.saved_styles is None:
+            return
+        styles, tab.saved_styles = tab.saved_styles, None
+        text = tab.document.text()
+
+        def fill():
+            # The document already holds this text; only the widget is new
+            self._restoring = True
+            try:
+                self.text_widget.insert("1.0", text)
+                self.apply_styles(styles)
+                dropped = self.restore_images(styles.get("images", []))
+                self.restore_tables(styles.get("tables", []))
+            finally:
+                self._restoring = False
+            if dropped:
+                self.resync_document()  # an image file went missing
+
+        self._quiet_edit(fill)
+        self.text_widget.mark_set(tk.INSERT, tab.insert_index)
+        self.text_widget.yview(tab.view_index)
+
+    def update_title(self):
+        tab = self.tab
+        self.notebook.tab(tab.frame, text=tab.title)
+        if tab.filename:
+            self.master.title(f"Word-like Notepad - {tab.title}")
+        else:
+            self.master.title("Word-like Notepad")
 
-        # Ensure line numbers width stays fixed
-        self.text_widget.grid_columnconfigure(0, minsize=1)  # Adjust as needed
+    def close_tab(self):
+        tab = self.tab
+        if not tab.content_saved:
+            response = messagebox.askyesnocancel(
+                "Unsaved Changes",
+                f"Save the changes to {tab.title} before closing it?",
+            )
+            if response is None:
+                return
+            if response:
+                self.save_file(then=lambda: self.discard_tab(tab))
+                return
+        self.discard_tab(tab)
+
+    def discard_tab(self, tab):
+        if tab not in self.tabs:
+            return
+        index = self.tabs.index(tab)
+        if tab is self.tab:
+            self.cancel_export()
+            self.destroy_text_widget(tab)
+            self.tab = None
+        if tab.loader is not None:
+            tab.loader.cancel()
+            tab.loader = None
+        if tab.large_view is not None:
+            self.wait_for_save(tab)
+            tab.large_view.close()
+            tab.large_view = None
+        if tab.journal is not None:
+            tab.journal.discard()
+            tab.journal = None
+        self.tabs.remove(tab)
+        self.notebook.forget(tab.frame)
+        tab.frame.destroy()
+        if not self.tabs:
+            self.new_tab()
+        elif self.tab is None:
+            self.activate_tab(self.tabs[min(index, len(self.tabs) - 1)])
+
+    def save_tabs(self, tabs, then):
+        # One tab at a time, since each save may ask for a file name
+        if not tabs:
+            then()
+            return
+        self.activate_tab(tabs[0])
+        self.save_file(then=lambda: self.save_tabs(tabs[1:], then))
+
+    def install_text_proxy(self):
+        # Route the widget's Tcl command through Python so every insert and
+        # delete, typed or programmatic, also updates self.document.
+        widget = self.text_widget
+        self._text_command = widget._w + "_orig"
+        widget.tk.call("rename", widget._w, self._text_command)
+        widget.tk.createcommand(widget._w, self._text_proxy)
+        # Kept up to date by _text_proxy, so edits need no cget round trip
+        self._text_disabled = str(widget.cget("state")) == tk.DISABLED
+
+    def _tk_call(self, *args):
+        return self.text_widget.tk.call((self._text_command,) + args)
+
+    def _tk_offset(self, index):
+        line, column = self._tk_call("index", index).split(".")
+        return self.document.offset_of(int(line), int(column))
+
+    def _text_proxy(self, *args):
+        command = args[0] if args else ""
+        if command in ("insert", "delete", "replace") and self._text_disabled:
+            # Tk ignores edits to a disabled widget, so must the document
+            return self._tk_call(*args)
+        if command == "insert" and len(args) >= 3:
+            offset = min(self._tk_offset(args[1]), len(self.document))
+            result = self._tk_call(*args)
+            self._apply_edit(offset, offset, "".join(args[2::2]))
+        elif command == "delete" and len(args) in (2, 3):
+            start = self._tk_offset(args[1])
+            end = self._tk_offset(args[2]) if len(args) == 3 else start + 1
+            if end > len(self.document):
+                # Tk never deletes the final newline; a range running into it
+                # eats the newline before a line-start index1 instead.
+                end = len(self.document)
+                if 0 < start and self.document.get(start - 1, start) == "\n":
+                    start -= 1
+            result = self._tk_call(*args)
+            if start < end:
+                self._apply_edit(start, end, "")
+        elif command == "replace" and len(args) >= 4:
+            start = self._tk_offset(args[1])
+            end = self._tk_offset(args[2])
+            result = self._tk_call(*args)
+            if end <= len(self.document):
+                self._apply_edit(start, end, "".join(args[3::2]))
+            else:
+                self.resync_document()
+        elif args[:2] in (("image", "create"), ("window", "create")):
+            offset = min(self._tk_offset(args[2]), len(self.document))
+            result = self._tk_call(*args)
+            self._apply_edit(offset, offset, OBJECT_CHAR)
+        elif args[:2] in (
+            ("edit", "undo"),
+            ("edit", "redo"),
+            ("edit", "separator"),
+            ("edit", "reset"),
+        ):
+            # Also reached from Tk's own <<Undo>> and <<Redo>> bindings
+            result = ""
+            self.edit_history(args[1])
+        elif command in ("insert", "delete"):
+            # Multi-range deletes change the text without telling us how;
+            # fall back to a full resync.
+            result = self._tk_call(*args)
+            self.resync_document()
+        elif command in ("configure", "config") and "-state" in args[1::2]:
+            result = self._tk_call(*args)
+            self._text_disabled = str(self._tk_call("cget", "-state")) == tk.DISABLED
+        else:
+            result = self._tk_call(*args)
+        return result
+
+    def _apply_edit(self, start, end, text):
+        if self._restoring:
+            return
+        removed = self.document.delete(start, end)
+        self.document.insert(start, text)
+        edit = TextEdit(start, removed, text)
+        for listener in self.edit_listeners:
+            listener(edit)
+
+    def record_undo(self, edit):
+        if not self._skip_undo:
+            self.tab.undo_history.record(edit)
+
+    def edit_history(self, action):
+        history = self.tab.undo_history
+        if action == "separator":
+            history.separator()
+            return
+        if action == "reset":
+            history.reset()
+            return
+        if self._text_disabled:
+            return  # loading or exporting; the edits would be ignored
+        edits = history.undo() if action == "undo" else history.redo()
+        if edits is None:
+            return
+        self._skip_undo = True
+        try:
+            for edit in edits:
+                self.text_widget.replace(
+                    "%d.%d" % self.document.position(edit.offset),
+                    "%d.%d" % self.document.position(edit.offset + len(edit.removed)),
+                    edit.inserted,
+                )
+        finally:
+            self._skip_undo = False
+        end = edit.offset + len(edit.inserted)
+        self.text_widget.mark_set(tk.INSERT, "%d.%d" % self.document.position(end))
+        self.text_widget.see(tk.INSERT)
+
+    def widget_text(self):
+        # Full copy of the widget contents with embedded objects as OBJECT_CHAR
+        parts = []
+        dump = self._tk_call("dump", "-text", "-image", "-window", "1.0", "end-1c")
+        dump = self.text_widget.tk.splitlist(dump)
+        for key, value in zip(dump[::3], dump[1::3]):
+            parts.append(value if key == "text" else OBJECT_CHAR)
+        return "".join(parts)
+
+    def resync_document(self):
+        removed = self.document.text()
+        version = self.document.version
+        self.document = Document(self.widget_text())
+        self.document.version = version + 1
+        edit = TextEdit(0, removed, self.document.text())
+        for listener in self.edit_listeners:
+            listener(edit)
 
     def create_format_bar(self):
         self.toolbar = ttk.Frame(self.master)
         self.toolbar.pack(side=tk.TOP, fill=tk.X)
 
-        self.fonts = font.families()
         self.font_family = tk.StringVar()
-        self.font_family.set("Arial")
+        self.font_family.set(self.settings["font_family"])
         self.font_size = tk.StringVar()
-        self.font_size.set("12")
+        self.font_size.set(str(self.settings["font_size"]))
 
-        font_dropdown = ttk.Combobox(
+        self.font_dropdown = ttk.Combobox(
             self.toolbar,
             textvariable=self.font_family,
-            values=self.fonts,
+            values=[self.font_family.get()],
             state="readonly",
+            postcommand=self.load_font_list,
+        )
+        self.font_dropdown.pack(side=tk.LEFT, padx=2, pady=2)
+        self.font_dropdown.bind(
+            "<<ComboboxSelected>>",
+            self.command_profiler.wrap("Format Bar > Font", self.change_font),
         )
-        font_dropdown.pack(side=tk.LEFT, padx=2, pady=2)
-        font_dropdown.bind("<<ComboboxSelected>>", self.change_font)
 
         size_dropdown = ttk.Combobox(
             self.toolbar,
@@ -163,24 +1425,35 @@ class WordLikeNotepad:
             state="readonly",
         )
         size_dropdown.pack(side=tk.LEFT, padx=2, pady=2)
-        size_dropdown.bind("<<ComboboxSelected>>", self.change_font)
+        size_dropdown.bind(
+            "<<ComboboxSelected>>",
+            self.command_profiler.wrap("Format Bar > Size", self.change_font),
+        )
+
+    def load_font_list(self):
+        if self.fonts is None:
+            self.fonts = cached_font_families(self.master)
+            self.font_dropdown.config(values=self.fonts)
 
     def create_menu(self):
         menubar = tk.Menu(self.master)
         self.master.config(menu=menubar)
 
         # File menu
-        file_menu = tk.Menu(menubar, tearoff=0)
+        file_menu = self.command_menu(menubar, "File")
         menubar.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="New", command=self.new_file)
         file_menu.add_command(label="Open", command=self.open_file)
         file_menu.add_command(label="Save", command=self.save_file)
         file_menu.add_command(label="Save As", command=self.save_as)
+        file_menu.add_command(label="Export to HTML...", command=self.export_html)
+        file_menu.add_command(label="Export to PDF...", command=self.export_pdf)
+        file_menu.add_command(label="Close Tab", command=self.close_tab)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.master.quit)
+        file_menu.add_command(label="Exit", command=self.on_close)
 
         # Edit menu
-        edit_menu = tk.Menu(menubar, tearoff=0)
+        edit_menu = self.command_menu(menubar, "Edit")
         menubar.add_cascade(label="Edit", menu=edit_menu)
         edit_menu.add_command(
             label="Undo", command=lambda: self.text_widget.edit_undo()
@@ -192,118 +1465,1209 @@ class WordLikeNotepad:
         edit_menu.add_command(label="Cut", command=self.cut)
         edit_menu.add_command(label="Copy", command=self.copy)
         edit_menu.add_command(label="Paste", command=self.paste)
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Go To Line...", command=self.go_to_line)
 
         # View menu
-        view_menu = tk.Menu(menubar, tearoff=0)
+        view_menu = self.command_menu(menubar, "View")
         menubar.add_cascade(label="View", menu=view_menu)
         view_menu.add_command(label="Toggle Dark Mode", command=self.toggle_dark_mode)
 
         # Insert menu
-        insert_menu = tk.Menu(menubar, tearoff=0)
+        insert_menu = self.command_menu(menubar, "Insert")
         menubar.add_cascade(label="Insert", menu=insert_menu)
         insert_menu.add_command(label="Image", command=self.insert_image)
         insert_menu.add_command(label="Table", command=self.insert_table)
+        insert_menu.add_command(label="Table from CSV...", command=self.import_table)
 
         # Format menu
-        format_menu = tk.Menu(menubar, tearoff=0)
+        format_menu = self.command_menu(menubar, "Format")
         menubar.add_cascade(label="Format", menu=format_menu)
         format_menu.add_command(label="Font", command=self.change_font)
         format_menu.add_command(label="Text Color", command=self.change_text_color)
         format_menu.add_command(label="Background Color", command=self.change_bg_color)
 
         # Tools menu
-        tools_menu = tk.Menu(menubar, tearoff=0)
+        tools_menu = self.command_menu(menubar, "Tools")
         menubar.add_cascade(label="Tools", menu=tools_menu)
         tools_menu.add_command(label="Word Count", command=self.word_count)
         tools_menu.add_command(label="Find and Replace", command=self.find_replace)
         tools_menu.add_command(label="Spell Check", command=self.spell_check)
+        tools_menu.add_command(
+            label="Style Statistics", command=self.show_style_statistics
+        )
+        tools_menu.add_command(label="Typing Latency", command=self.show_latency)
+        tools_menu.add_separator()
+        self.profiling_enabled = tk.BooleanVar(value=self.command_profiler.enabled)
+        tools_menu.add_checkbutton(
+            label="Profile Commands",
+            variable=self.profiling_enabled,
+            command=self.toggle_command_profiling,
+        )
+        tools_menu.add_command(
+            label="Command Timings", command=self.show_command_timings
+        )
+        tools_menu.add_command(
+            label="Save Slowest Calls...", command=self.save_command_profile
+        )
+
+    def command_menu(self, menubar, name):
+        return InstrumentedMenu(menubar, self.command_profiler, name, tearoff=0)
 
-    def insert_image(self):
-        file_path = filedialog.askopenfilename(
-            filetypes=[("Image files", "*.png *.jpg *.jpeg *.gif *.bmp")]
+    def toggle_command_profiling(self):
+        if self.profiling_enabled.get():
+            self.command_profiler.enable()
+            self.update_status("Profiling menu and toolbar commands")
+        else:
+            self.command_profiler.disable()
+            self.update_status("Command profiling off")
+
+    def show_command_timings(self):
+        messagebox.showinfo("Command Timings", self.command_profiler.summary())
+
+    def save_command_profile(self):
+        if not self.command_profiler.slowest:
+            messagebox.showinfo(
+                "Save Slowest Calls",
+                "No commands recorded yet. Turn on Tools > Profile Commands first.",
+            )
+            return
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".prof",
+            filetypes=[("cProfile Stats", "*.prof"), ("All Files", "*.*")],
         )
-        if file_path:
-            image = Image.open(file_path)
-            image = image.resize((300, 300))  # Resize image
-            photo = ImageTk.PhotoImage(image)
-            self.text_widget.image_create(tk.END, image=photo)
-            self.image = photo  # Keep a reference
+        if not file_path:
+            return
+        try:
+            count = self.command_profiler.dump(file_path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Unable to save profile: {e}")
+            return
+        self.update_status(f"Saved profiles of the {count} slowest commands")
+
+    def insert_image(self, file_path=None, index=tk.END):
+        if file_path is None:
+            file_path = filedialog.askopenfilename(
+                filetypes=[("Image files", "*.png *.jpg *.jpeg *.gif *.bmp")]
+            )
+        if not file_path:
+            return None
+        try:
+            key = image_key(file_path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Unable to open image: {e}")
+            return None
+
+        # Show a placeholder right away and swap the thumbnail in when ready
+        if self._placeholder is None:
+            self._placeholder = tk.PhotoImage(master=self.master, width=32, height=32)
+            self._placeholder.put("#d9d9d9", to=(0, 0, 32, 32))
+        name = self.text_widget.image_create(index, image=self._placeholder)
+        self.images[name] = {"path": file_path, "photo": None}
+
+        thumbnail = self.thumbnails.get(key)
+        if thumbnail is not None:
+            self._show_image(name, thumbnail)
+        else:
+            tab = self.tab
+            self.run_in_background(
+                decode_thumbnail,
+                file_path,
+                callback=lambda future: self._image_decoded(future, tab, name, key),
+                executor=self.image_executor,
+            )
+        return name
+
+    def _image_decoded(self, future, tab, name, key):
+        if tab is not self.tab:
+            # Hidden meanwhile; the image is shown again when the tab is
+            if future.exception() is None:
+                self.thumbnails.put(key, future.result())
+            return
+        error = future.exception()
+        if error is not None:
+            if name in self.text_widget.image_names():
+                self.text_widget.delete(name)
+            self.images.pop(name, None)
+            self.update_status(f"Unable to open image: {error}")
+            return
+        self.thumbnails.put(key, future.result())
+        self._show_image(name, future.result())
+
+    def _show_image(self, name, thumbnail):
+        if name not in self.images or name not in self.text_widget.image_names():
+            return  # removed while decoding
+        from PIL import ImageTk
+
+        photo = ImageTk.PhotoImage(thumbnail)
+        self.images[name]["photo"] = photo  # the widget does not keep a reference
+        self.text_widget.image_configure(name, image=photo)
+
+    def collect_images(self):
+        dump = self.text_widget.tk.splitlist(
+            self._tk_call("dump", "-image", "1.0", "end-1c")
+        )
+        return [
+            {"offset": self._index_offset(index), "path": self.images[name]["path"]}
+            for name, index in zip(dump[1::3], dump[2::3])
+            if name in self.images
+        ]
+
+    def restore_images(self, images):
+        # Each saved image sits on an OBJECT_CHAR in the text; swap it back in.
+        # Returns how many could not be, and were dropped from the text.
+        dropped = 0
+        for entry in sorted(images, key=lambda entry: entry["offset"], reverse=True):
+            index = "%d.%d" % self.document.position(entry["offset"])
+            if self.text_widget.get(index) != OBJECT_CHAR:
+                continue
+            self.text_widget.delete(index)
+            if not os.path.exists(entry["path"]) or not self.insert_image(
+                entry["path"], index
+            ):
+                dropped += 1
+        return dropped
 
     def create_status_bar(self):
-        self.status_bar = ttk.Label(self.master, text="Ready", anchor=tk.W)
-        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_frame = ttk.Frame(self.master)
+        self.status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.stats_label = ttk.Label(self.status_frame, anchor=tk.E)
+        self.stats_label.pack(side=tk.RIGHT, padx=5)
+        self.status_bar = ttk.Label(self.status_frame, text="Ready", anchor=tk.W)
+        self.status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
         # Ensure the status bar expands correctly
         self.status_bar.grid_columnconfigure(0, weight=1)
         self.status_bar.grid_rowconfigure(1, weight=0)
 
+    def show_progress(self, fraction, on_cancel=None):
+        if self.progress_frame is None:
+            # Built on first use; activate_tab hides it before the status
+            # bar exists
+            self.progress_frame = ttk.Frame(self.status_frame)
+            self.progress = ttk.Progressbar(
+                self.progress_frame, length=120, maximum=100
+            )
+            self.progress.pack(side=tk.LEFT, padx=5)
+            self.progress_cancel = ttk.Button(self.progress_frame, text="Cancel")
+            self.progress_cancel.pack(side=tk.LEFT)
+        self.progress["value"] = 100 * fraction
+        self.progress_cancel.config(
+            command=on_cancel or "",
+            state=tk.NORMAL if on_cancel else tk.DISABLED,
+        )
+        if not self.progress_frame.winfo_manager():
+            self.progress_frame.pack(side=tk.RIGHT, before=self.status_bar)
+
+    def hide_progress(self):
+        if self.progress_frame is not None:
+            self.progress_frame.pack_forget()
+
     def new_file(self):
-        self.filename = None
-        self.text_widget.delete(1.0, tk.END)
+        self.new_tab()
         self.update_status("New File")
 
-    def open_file(self):
-        file_path = filedialog.askopenfilename(
-            filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")]
-        )
+    def open_file(self, file_path=None):
+        if file_path is None:
+            file_path = filedialog.askopenfilename(
+                filetypes=[
+                    ("Text Files", "*.txt"),
+                    ("Word-like Notepad Documents", "*" + RICH_EXTENSION),
+                    ("All Files", "*.*"),
+                ]
+            )
         if file_path:
             try:
-                with open(file_path, "r") as file:
-                    content = file.read()
-                self.text_widget.delete(1.0, tk.END)
-                self.text_widget.insert(tk.END, content)
-                self.filename = file_path
-                self.update_status(f"Opened: {file_path}")
+                if file_path.endswith(RICH_EXTENSION):
+                    self.open_rich_file(file_path)
+                    return
+                encoding = sniff_file(file_path)[0]
+                if (
+                    os.path.getsize(file_path) >= LARGE_FILE_THRESHOLD
+                    and encoding in PAGEABLE_ENCODINGS
+                ):
+                    self.prepare_tab()
+                    self.open_large_file(file_path, encoding=encoding)
+                    return
+                self.load_file(file_path)
             except Exception as e:
                 messagebox.showerror("Error", f"Unable to open file: {str(e)}")
 
-    def save_file(self):
+    def load_file(self, file_path):
+        # Decoding happens on a thread; _pump_load feeds the widget in batches
+        loader = FileLoader(file_path)
+        stamp = file_stamp(file_path)
+        self.prepare_tab()
+        tab = self.tab
+        tab.loader = loader
+        tab.encoding, tab.bom = loader.encoding, loader.bom
+        tab.on_disk = (file_path, stamp)
+        self.filename = file_path
+        self.update_title()
+        threading.Thread(target=loader.run, daemon=True).start()
+        self._pump_load(tab, loader, stamp)
+
+    def _pump_load(self, tab, loader, stamp):
+        if tab.loader is not loader:
+            return  # cancelled, or the tab was closed
+        if tab is not self.tab:
+            # A hidden tab has no widget; the full queue holds the reader back
+            self.master.after(100, self._pump_load, tab, loader, stamp)
+            return
+        parts = []
+        restart = False
+        deadline = time.perf_counter() + LOAD_FRAME_MS / 1000
+        while time.perf_counter() < deadline:
+            try:
+                part = loader.chunks.get_nowait()
+            except queue.Empty:
+                break
+            if part is LOAD_RESTART:
+                # Not UTF-8 past the sniffed start; it is read again
+                restart = True
+                parts = []
+            else:
+                parts.append(part)
+
+        def append():
+            self.text_widget.config(state=tk.NORMAL)
+            if restart:
+                self.text_widget.delete("1.0", "end")
+            if parts:
+                self.text_widget.insert("end-1c", "".join(parts))
+            if not finished:
+                self.text_widget.config(state=tk.DISABLED)
+
+        finished = loader.done and loader.chunks.empty()
+        self._quiet_edit(append)
+        tab.encoding = loader.encoding
+        if loader.error is not None:
+            self.hide_progress()
+            messagebox.showerror("Error", f"Unable to open file: {loader.error}")
+            self.discard_tab(tab)
+        elif finished:
+            tab.loader = None
+            self.hide_progress()
+            self.reset_journal(loader.path, stamp)
+            self.update_status(f"Opened: {loader.path} ({loader.encoding})")
+        else:
+            name = os.path.basename(loader.path)
+            self.show_progress(loader.progress, lambda: self.discard_tab(tab))
+            self.update_status(f"Loading {name}: {int(100 * loader.progress)}%")
+            self.master.after(1 if parts else 20, self._pump_load, tab, loader, stamp)
+
+    def save_file(self, then=None):
+        if self.tab.loader is not None:
+            self.update_status("The file is still loading")
+            return None
         if self.filename:
             file_path = self.filename  # Use existing filename if set
         else:
             file_path = filedialog.asksaveasfilename(
                 defaultextension=".txt",
-                filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
+                filetypes=[
+                    ("Text files", "*.txt"),
+                    ("Word-like Notepad Documents", "*" + RICH_EXTENSION),
+                    ("All files", "*.*"),
+                ],
             )
             if not file_path:
-                return  # User cancelled save operation
+                return None  # User cancelled save operation
 
             self.filename = file_path  # Set filename for subsequent saves
-            self.master.title(f"Word-like Notepad - {os.path.basename(file_path)}")
+            self.update_title()
+
+        if self._save_future is not None and not self._save_future.done():
+            self.update_status("A save is already in progress")
+            return None
+        if self._export is not None:
+            # Saving a large file replaces the mapping the export reads
+            self.update_status("Wait for the export to finish, or cancel it")
+            return None
+
+        if self.changed_on_disk(self.tab) and not messagebox.askyesno(
+            "File Changed",
+            f"{self.tab.title} was changed by another program since it was "
+            "opened. Save over those changes?",
+        ):
+            return None
+
+        if self.large_view is not None:
+            return self.save_large_file(self.filename, then)
+
+        # Write a snapshot on a worker thread: temp file, fsync, rename
+        snapshot = self.document.snapshot()
+        tables = [
+            dict(entry, model=entry["model"].copy()) for entry in self.collect_tables()
+        ]
+        # Plain text drops the images and turns tables into markdown; such a
+        # file cannot be the base the journal's offsets count from
+        replayable = file_path.endswith(RICH_EXTENSION) or not any(
+            OBJECT_CHAR in chunk for chunk in snapshot.iter_chunks()
+        )
+        self.update_status("Saving...")
 
-        with open(self.filename, "w") as file:
-            file.write(self.text_widget.get(1.0, tk.END))
+        if file_path.endswith(RICH_EXTENSION):
+            styles = self.collect_styles()
 
-        self.content_saved = True
-        self.status_bar.config(text="Saved")
+            def write():
+                write_rich_document(file_path, snapshot, styles, tables)
+                return file_stamp(file_path)
+
+        else:
+            # Tables go into plain text as markdown
+            chunks = text_with_tables(
+                snapshot, [(entry["offset"], entry["model"]) for entry in tables]
+            )
+            # Written back in the encoding it was opened with
+            encoding = self.tab.encoding
+            if self.tab.bom:
+                chunks = chain(["\ufeff"], chunks)
+
+            def write():
+                atomic_write(
+                    file_path, chunks, encoding=encoding, errors=codec_errors(encoding)
+                )
+                return file_stamp(file_path)
+
+        tab = self.tab
+        self._save_future = self.run_in_background(
+            write,
+            callback=lambda future: self._save_finished(
+                future, tab, file_path, snapshot, replayable, then
+            ),
+        )
+        return self._save_future
+
+    def _save_finished(self, future, tab, file_path, snapshot, replayable, then=None):
+        # The tab may no longer be the selected one
+        tab._save_future = None
+        error = future.exception()
+        if error is not None:
+            # The journal still holds everything on its old base
+            if isinstance(error, UnicodeEncodeError):
+                self.offer_utf8(tab, then)
+                return
+            messagebox.showerror("Error", f"Unable to save file: {error}")
+            return
+        # Only now is the file there to rebase the journal on
+        base = (file_path, future.result()) if replayable else (None, None)
+        tab._journal_base = base
+        if tab.journal is not None:
+            tab.journal.rebase(*base, snapshot, tab.document)
+        elif not replayable and tab in self.tabs:
+            self.record_edit(TextEdit(0, "", tab.document.text()), tab=tab)
+        tab.on_disk = (file_path, future.result())
+        tab.external_change = False
+        if snapshot.version == tab.document.version:
+            tab.content_saved = True
+        self.update_status("Saved")
+        if then is not None:
+            then()
+
+    def open_rich_file(self, file_path):
+        stamp = file_stamp(file_path)
+        text, styles = read_rich_document(file_path)
+        self.prepare_tab()
+
+        def fill():
+            self.text_widget.insert(tk.END, text)
+            self.apply_styles(styles)
+            self.restore_images(styles.get("images", []))
+            self.restore_tables(styles.get("tables", []))
+
+        # Opening is not an edit: nothing to undo, save or journal
+        self._quiet_edit(fill)
+        self.filename = file_path
+        self.tab.on_disk = (file_path, stamp)
+        self.update_title()
+        self.reset_journal(file_path, stamp)
+        self.update_status(f"Opened: {file_path}")
+
+    def _index_offset(self, index):
+        line, column = str(index).split(".")
+        return self.document.offset_of(int(line), int(column))
+
+    def collect_styles(self):
+        # Each tag's ranges as run-length pairs: gap since the previous run,
+        # then run length
+        tags = []
+        for tag in self.text_widget.tag_names():
+            ranges = self.text_widget.tag_ranges(tag)
+            if tag in TRANSIENT_TAGS or not ranges:
+                continue
+            runs = []
+            previous = 0
+            for start, end in zip(ranges[::2], ranges[1::2]):
+                start, end = self._index_offset(start), self._index_offset(end)
+                runs += (start - previous, end - start)
+                previous = end
+            if self.styles.is_style_tag(tag):
+                style = self.styles.style_of(tag)
+                tags.append({"name": tag, "style": list(style), "runs": runs})
+                continue
+            options = {}
+            for option in STYLE_OPTIONS:
+                value = str(self.text_widget.tag_cget(tag, option))
+                if value:
+                    options[option] = value
+            tags.append({"name": tag, "options": options, "runs": runs})
+        return {"version": 1, "tags": tags, "images": self.collect_images()}
+
+    def apply_styles(self, styles):
+        # Tags come in priority order; each gets a single bulk tag_add
+        for entry in styles["tags"]:
+            tag = entry["name"]
+            if "style" not in entry:
+                self.text_widget.tag_configure(tag, **entry["options"])
+            runs = entry["runs"]
+            indices = []
+            offset = 0
+            for gap, length in zip(runs[::2], runs[1::2]):
+                start = offset + gap
+                offset = start + length
+                indices += (
+                    "%d.%d" % self.document.position(start),
+                    "%d.%d" % self.document.position(offset),
+                )
+            if "style" in entry:
+                tag = self.styles.adopt(Style(*entry["style"]), indices)
+            elif indices:
+                self.text_widget.tag_add(tag, *indices)
+            # Tags that already existed keep their old priority otherwise
+            self.text_widget.tag_raise(tag)
+        self.text_widget.tag_raise("sel")
+
+    def reset_journal(self, base_path, stamp=None, tab=None):
+        tab = tab or self.tab
+        tab._journal_base = (base_path, stamp)
+        if tab.journal is not None:
+            tab.journal.reset(base_path, stamp)
+
+    def record_edit(self, edit, tab=None):
+        tab = tab or self.tab
+        if tab.large_view is not None:
+            return  # paged files keep their edits in the page overlay
+        if tab.loader is not None or self._quiet:
+            return  # the journal is based on the file once it has loaded
+        if tab.journal is None:
+            name = f"journal-{os.getpid()}-{tab.number}.jsonl"
+            tab.journal = EditJournal(os.path.join(config_dir("recovery"), name))
+            tab.journal.reset(*tab._journal_base)
+        tab.journal.record(edit)
+
+    def flush_journal(self):
+        for tab in self.tabs:
+            if tab.journal is not None:
+                self.executor.submit(tab.journal.flush)
+        self.master.after(JOURNAL_INTERVAL_MS, self.flush_journal)
+
+    def watch_files(self):
+        paths = {tab.on_disk[0] for tab in self.tabs if tab.on_disk[0]}
+        changed = self.file_watcher.changed(paths)
+        for tab in self.tabs:
+            if tab.on_disk[0] in changed:
+                tab.disk_check = True
+        # Hidden tabs are checked when they are next activated
+        self.check_disk(self.tab)
+        self.master.after(WATCH_INTERVAL_MS, self.watch_files)
+
+    def check_disk(self, tab):
+        path, stamp = tab.on_disk
+        if not tab.disk_check or path is None or tab.loader or tab.reloading:
+            return
+        if tab._save_future is not None:
+            return  # our own save; _save_finished records the new stamp
+        if tab is self.tab and self._export is not None:
+            return  # the widget is read-only until the export is written
+        tab.disk_check = False
+        try:
+            current = file_stamp(path)
+        except OSError:
+            current = None
+        if current == stamp:
+            return
+        tab.on_disk = (path, current)
+        if current is None:
+            tab.external_change = True
+            self.update_status(f"{path} was deleted by another program")
+            return
+        if tab.large_view is not None or path.endswith(RICH_EXTENSION):
+            # Too big, or not plain text, to diff: only warn before saving
+            tab.external_change = True
+            self.update_status(f"{path} was changed by another program")
+            return
+        if not tab.content_saved and not messagebox.askyesno(
+            "File Changed",
+            f"{tab.title} was changed by another program. Reload it and lose "
+            "your unsaved changes?",
+        ):
+            tab.external_change = True
+            return
+        self.reload_file(tab)
+
+    def changed_on_disk(self, tab):
+        path, stamp = tab.on_disk
+        if path is None or path != tab.filename:
+            return False
+        if tab.external_change:
+            return True
+        try:
+            return file_stamp(path) != stamp
+        except OSError:
+            return False  # deleted; saving puts it back
+
+    def reload_file(self, tab):
+        # The diff runs on a worker; only the changed lines are replaced, so
+        # the cursor, scroll position and formatting elsewhere survive
+        tab.reloading = True
+        path = tab.on_disk[0]
+        snapshot = tab.document.snapshot()
+        encoding = tab.encoding
+
+        def diff():
+            text, encoding_read, bom = read_file(path, encoding)
+            return diff_hunks(snapshot.text(), text), encoding_read, bom
+
+        self.run_in_background(
+            diff, callback=lambda future: self._reload_ready(future, tab, snapshot)
+        )
+
+    def _reload_ready(self, future, tab, snapshot):
+        tab.reloading = False
+        error = future.exception()
+        if error is not None:
+            tab.external_change = True
+            self.update_status(f"Unable to reload {tab.title}: {error}")
+            return
+        if tab is not self.tab or tab.document.version != snapshot.version:
+            # Edited or hidden meanwhile: diff again when next checked
+            tab.on_disk = (tab.on_disk[0], None)
+            tab.disk_check = True
+            return
+        hunks, tab.encoding, tab.bom = future.result()
+        history = tab.undo_history
+        history.separator()
+        history.autoseparators = False
+        try:
+            for start, end, text in reversed(hunks):
+                self.text_widget.replace(
+                    "%d.%d" % self.document.position(start),
+                    "%d.%d" % self.document.position(end),
+                    text,
+                )
+        finally:
+            history.autoseparators = True
+            history.separator()
+        tab.external_change = False
+        self.reset_journal(*tab.on_disk)
+        self.master.after_idle(setattr, tab, "content_saved", True)
+        self.update_status(f"Reloaded {tab.title}: {len(hunks)} changed regions")
+
+    def offer_recovery(self):
+        directory = config_dir("recovery")
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not name.startswith("journal-") or journal_in_use(path):
+                continue
+            try:
+                base, text = EditJournal.replay(path)
+            except (OSError, ValueError, KeyError, IndexError) as e:
+                messagebox.showwarning(
+                    "Recovery", f"Could not recover unsaved changes: {e}"
+                )
+                os.remove(path)
+                continue
+            label = base or "an untitled document"
+            if messagebox.askyesno(
+                "Recovery",
+                f"Word-like Notepad did not close properly. Recover the unsaved "
+                f"changes to {label}?",
+            ):
+                self.prepare_tab()
+                self.text_widget.insert(tk.END, text)
+                self.filename = base
+                if base is not None:
+                    self.tab.on_disk = (base, file_stamp(base))
+                self.update_title()
+                self.reset_journal(None)
+                self.record_edit(TextEdit(0, "", text))
+                self.content_saved = False
+                self.update_status(f"Recovered: {label}")
+            os.remove(path)
+
+    def open_large_file(self, file_path, page=0, encoding=None):
+        self.close_large_view()
+        view = LargeFileView(file_path, encoding or sniff_file(file_path)[0])
+        # Where restore_tab pages it in if the tab is hidden before it shows
+        view.first_page = max(page - 1, 0)
+        self.large_view = view
+        self.tab.on_disk = (file_path, file_stamp(file_path))
+        self.filename = file_path
+        self.update_title()
+        self._quiet_edit(lambda: self.text_widget.delete(1.0, tk.END))
+        threading.Thread(target=view.build_index, daemon=True).start()
+        self._poll_large_index(view, page)
+
+    def _poll_large_index(self, view, page):
+        if view is not self.large_view:
+            return
+        if view.last_page < 0 and view.page_available(page):
+            self.show_pages(max(page - 1, 0))
+        if view.index_complete:
+            self.update_status(f"Opened: {view.path} ({view.line_count} lines)")
+            self.schedule_stats_update()
+        else:
+            percent = 100 * view.indexed_bytes // max(view.size, 1)
+            self.update_status(f"Indexing {os.path.basename(view.path)}: {percent}%")
+            self.master.after(100, self._poll_large_index, view, page)
+
+    def close_large_view(self):
+        if self.large_view is not None:
+            self.cancel_export()
+            self.wait_for_save(self.tab)
+            self.large_view.close()
+            self.large_view = None
+
+    def _quiet_edit(self, operation):
+        # Paging or loading text in is not a user edit: keep it out of the
+        # undo history and the journal, and leave the saved/unsaved state
+        # alone. Callers rebase the journal on the file the text came from.
+        tab = self.tab
+        saved = tab.content_saved
+        document, version = tab.document, tab.document.version
+        self._skip_undo = self._quiet = True
+        try:
+            operation()
+        finally:
+            self._skip_undo = self._quiet = False
+            if tab.document is not document or tab.document.version != version:
+                # The history's offsets no longer match the text
+                tab.undo_history.reset()
+        self.master.after_idle(setattr, tab, "content_saved", saved)
+
+    def _page_end(self, page):
+        if page < self.large_view.last_page:
+            return f"page_{page + 1}"
+        return "end-1c"
+
+    def store_pages(self):
+        view = self.large_view
+        for page in range(view.first_page, view.last_page + 1):
+            text = self.text_widget.get(f"page_{page}", self._page_end(page))
+            if page in view.overlay or text != view.page_text(page):
+                view.overlay[page] = text
+
+    def _append_page(self, page):
+        self.text_widget.mark_set(f"page_{page}", "end-1c")
+        self.text_widget.mark_gravity(f"page_{page}", tk.LEFT)
+        self.text_widget.insert("end-1c", self.large_view.page_text(page))
+        self.large_view.last_page = page
+
+    def show_pages(self, first):
+        view = self.large_view
+
+        def reload():
+            if view.last_page >= 0:
+                self.store_pages()
+            for page in range(view.first_page, view.last_page + 1):
+                self.text_widget.mark_unset(f"page_{page}")
+            self.text_widget.delete(1.0, tk.END)
+            view.first_page, view.last_page = first, first - 1
+            for page in range(first, first + LARGE_FILE_WINDOW_PAGES):
+                if not view.page_available(page):
+                    break
+                self._append_page(page)
+
+        self._quiet_edit(reload)
+
+    def _slide_pages(self, forward, view):
+        if view is not self.large_view or view.last_page < 0:
+            return  # another tab is showing now
+        self._paging_scheduled = False
+        self.text_widget.mark_set("view_top", "@0,0")
+
+        def slide():
+            self.store_pages()
+            full = view.last_page - view.first_page + 1 >= LARGE_FILE_WINDOW_PAGES
+            if forward:
+                if full:
+                    page = view.first_page
+                    self.text_widget.delete(f"page_{page}", f"page_{page + 1}")
+                    self.text_widget.mark_unset(f"page_{page}")
+                    view.first_page += 1
+                self._append_page(view.last_page + 1)
+            else:
+                if full:
+                    page = view.last_page
+                    self.text_widget.delete(f"page_{page}", "end-1c")
+                    self.text_widget.mark_unset(f"page_{page}")
+                    view.last_page -= 1
+                following = f"page_{view.first_page}"
+                view.first_page -= 1
+                previous = view.first_page
+                # Let the old first page's mark ride along with the insert
+                self.text_widget.mark_gravity(following, tk.RIGHT)
+                self.text_widget.insert("1.0", view.page_text(previous))
+                self.text_widget.mark_gravity(following, tk.LEFT)
+                self.text_widget.mark_set(f"page_{previous}", "1.0")
+                self.text_widget.mark_gravity(f"page_{previous}", tk.LEFT)
+
+        self._quiet_edit(slide)
+        self.text_widget.yview("view_top")
+
+    def _loaded_line_span(self):
+        view = self.large_view
+        first_line = view.first_page * LARGE_FILE_PAGE_LINES
+        loaded = int(self.text_widget.index("end-1c").split(".")[0])
+        return first_line, loaded
+
+    def on_text_scroll(self, first, last):
+        self.schedule_gutter_update()
+        view = self.large_view
+        if view is None or view.last_page < 0:
+            self.scrollbar.set(first, last)
+            return
+        # Map the widget's window onto the whole file for the scrollbar
+        first_line, loaded = self._loaded_line_span()
+        total = max(view.line_count, 1)
+        self.scrollbar.set(
+            (first_line + float(first) * loaded) / total,
+            (first_line + float(last) * loaded) / total,
+        )
+        if self._paging_scheduled:
+            return
+        if float(last) > 0.85 and view.page_available(view.last_page + 1):
+            self._paging_scheduled = True
+            self.master.after_idle(self._slide_pages, True, view)
+        elif float(first) < 0.15 and view.first_page > 0:
+            self._paging_scheduled = True
+            self.master.after_idle(self._slide_pages, False, view)
+
+    def on_scrollbar(self, *args):
+        view = self.large_view
+        if view is None or view.last_page < 0 or args[0] != "moveto":
+            self.text_widget.yview(*args)
+            return
+        self.show_file_line(int(float(args[1]) * view.line_count))
+
+    def show_file_line(self, target):
+        # Pages in line `target` (0-based) of a paged file, scrolls it to the
+        # top and returns its index in the widget
+        view = self.large_view
+        page = target // LARGE_FILE_PAGE_LINES
+        if not view.first_page <= page <= view.last_page:
+            while page > 0 and not view.page_available(page):
+                page -= 1
+            self.show_pages(max(page - 1, 0))
+        first_line, _ = self._loaded_line_span()
+        index = f"{target - first_line + 1}.0"
+        self.text_widget.yview(index)
+        return index
+
+    def track_gutter(self, edit):
+        if "\n" in edit.inserted or "\n" in edit.removed:
+            self.schedule_gutter_update()
+
+    def schedule_gutter_update(self, event=None):
+        if not self._gutter_scheduled:
+            self._gutter_scheduled = True
+            self.master.after_idle(self.update_gutter)
+
+    def update_gutter(self):
+        self._gutter_scheduled = False
+        if self.gutter is None:
+            return
+        view = self.large_view
+        if view is not None and view.last_page >= 0:
+            first_line, _ = self._loaded_line_span()
+            self.gutter.redraw(first_line, view.line_count)
+        else:
+            self.gutter.redraw(0, self.document.line_count)
+
+    def go_to_line(self, number=None):
+        view = self.large_view
+        paged = view is not None and view.last_page >= 0
+        total = view.line_count if paged else self.document.line_count
+        if number is None:
+            number = simpledialog.askinteger(
+                "Go To Line",
+                f"Line number (1-{total}):",
+                parent=self.master,
+                minvalue=1,
+                maxvalue=total,
+            )
+            if number is None:
+                return
+        number = max(1, min(number, total))
+        if paged:
+            index = self.show_file_line(number - 1)
+        else:
+            index = f"{number}.0"
+            self.text_widget.see(index)
+        self.text_widget.mark_set(tk.INSERT, index)
+        self.text_widget.focus_set()
+
+    def offer_utf8(self, tab, then=None):
+        # A save failed on text its encoding cannot store
+        if tab is not self.tab:
+            self.update_status(f"Unable to save {tab.title} in {tab.encoding}")
+            return
+        encoding = tab.large_view.encoding if tab.large_view else tab.encoding
+        if not messagebox.askyesno(
+            "Save",
+            f"{tab.title} contains characters that cannot be saved in "
+            f"{encoding}. Save it as UTF-8 instead?",
+        ):
+            self.update_status("Not saved")
+            return
+        if tab.large_view is not None:
+            self.save_large_file(self.filename, then, encoding="utf-8")
+            return
+        tab.encoding, tab.bom = "utf-8", False
+        self.save_file(then)
+
+    def save_large_file(self, file_path, then=None, encoding=None):
+        view = self.large_view
+        if not view.index_complete:
+            messagebox.showinfo(
+                "Save", "The file is still being indexed. Please try again shortly."
+            )
+            return None
+        self.store_pages()
+        # Scrolling keeps changing the overlay while the worker writes
+        overlay = dict(view.overlay)
+        encoding = encoding or view.encoding
+        self.update_status("Saving...")
+        tab = self.tab
+        self._save_future = self.run_in_background(
+            write_temp_file,
+            file_path,
+            lambda file: file.writelines(view.iter_chunks(overlay, encoding)),
+            True,
+            callback=lambda future: self._large_save_finished(
+                future, tab, view, file_path, then, encoding
+            ),
+        )
+        return self._save_future
+
+    @staticmethod
+    def wait_for_save(tab):
+        # A save still reading a large file's mapping must finish before
+        # the mapping is closed
+        if tab._save_future is not None:
+            tab._save_future.exception()  # blocks until it is done
+
+    def _large_save_finished(
+        self, future, tab, view, file_path, then=None, encoding=None
+    ):
+        tab._save_future = None
+        error = future.exception()
+        if isinstance(error, UnicodeEncodeError):
+            self.offer_utf8(tab, then)
+            return
+        if error is not None:
+            messagebox.showerror("Error", f"Unable to save file: {error}")
+            return
+        reopen = view is tab.large_view and tab in self.tabs
+        if reopen:
+            # The mapping has to be released before the file can be replaced
+            view.close()
+            tab.large_view = None
+        replace_file(future.result(), file_path)
+        tab.on_disk = (file_path, file_stamp(file_path))
+        tab.external_change = False
+        tab.content_saved = True
+        self.update_status("Saved")
+        # The tab must be paged again before then() runs: without a view its
+        # document holds only the pages that were loaded, and the next save
+        # would write just those over the file
+        if reopen and tab is self.tab:
+            self.open_large_file(file_path, view.first_page + 1, encoding)
+        elif reopen:
+            # Saved from a tab that is hidden now; restore_tab pages it in
+            tab.large_view = view.reopened(file_path, encoding)
+            threading.Thread(target=tab.large_view.build_index, daemon=True).start()
+        if then is not None:
+            then()
 
     def save_as(self):
         file_path = filedialog.asksaveasfilename(
             defaultextension=".txt",
-            filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")],
+            filetypes=[
+                ("Text Files", "*.txt"),
+                ("Word-like Notepad Documents", "*" + RICH_EXTENSION),
+                ("All Files", "*.*"),
+            ],
         )
         if file_path:
             self.filename = file_path
             self.save_file()
 
+    def export_html(self):
+        self.export_document(".html")
+
+    def export_pdf(self):
+        self.export_document(".pdf")
+
+    def export_document(self, extension):
+        if self._export is not None:
+            self.update_status("An export is already running")
+            return
+        if self.tab.loader is not None:
+            self.update_status("The file is still loading")
+            return
+        view = self.large_view
+        if view is not None and not view.index_complete:
+            messagebox.showinfo(
+                "Export", "The file is still being indexed. Please try again shortly."
+            )
+            return
+        kind = "HTML" if extension == ".html" else "PDF"
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=extension,
+            initialfile=os.path.splitext(self.tab.title)[0] + extension,
+            filetypes=[(f"{kind} files", "*" + extension), ("All files", "*.*")],
+        )
+        if not file_path:
+            return
+        try:
+            job = ExportJob(file_path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Unable to export: {e}")
+            return
+        base = self.export_base_style()
+        if view is None:
+            items = self.iter_export_items(job, base)
+        else:
+            # Pages scrolled through during the export must not change it
+            self.store_pages()
+            items = iter_large_export_items(job, base, view, dict(view.overlay))
+        if extension == ".html":
+            chunks = iter_html(items, base, self.tab.title)
+            job.chunks = (chunk.encode("utf-8") for chunk in chunks)
+        else:
+            job.chunks = PdfWriter(self.pdf_measure(), base).write(items)
+        self._export = job
+        if view is None:
+            # The dump walks the widget by line number
+            self.text_widget.config(state=tk.DISABLED)
+        self._pump_export(job)
+
+    def _pump_export(self, job):
+        if job is not self._export:
+            return  # cancelled
+        try:
+            finished = job.step(time.perf_counter() + EXPORT_FRAME_MS / 1000)
+        except Exception as e:
+            self.cancel_export()
+            messagebox.showerror("Error", f"Unable to export: {e}")
+            return
+        if not finished:
+            name = os.path.basename(job.path)
+            self.show_progress(job.progress, self.cancel_export)
+            self.update_status(f"Exporting {name}: {int(100 * job.progress)}%")
+            self.master.after(1, self._pump_export, job)
+            return
+        self._export = None
+        self.text_widget.config(state=tk.NORMAL)
+        self.hide_progress()
+        try:
+            job.finish()
+        except OSError as e:
+            messagebox.showerror("Error", f"Unable to export: {e}")
+            return
+        self.update_status(f"Exported: {job.path}")
+
+    def cancel_export(self):
+        job, self._export = self._export, None
+        if job is None:
+            return
+        job.cancel()
+        self.text_widget.config(state=tk.NORMAL)
+        self.hide_progress()
+        self.update_status("Export cancelled")
+
+    def export_base_style(self):
+        actual = font.Font(font=self.text_widget.cget("font")).actual()
+        fields = self._font_fields(actual)
+        return ExportStyle(foreground=None, background=None, **fields)
+
+    @staticmethod
+    def _font_fields(actual):
+        # Font.actual() as ExportStyle fields; Tk sizes below zero are pixels
+        size = actual["size"]
+        return {
+            "family": actual["family"],
+            "size": size if size > 0 else -size * 0.75,
+            "bold": actual["weight"] == "bold",
+            "italic": actual["slant"] == "italic",
+            "underline": bool(actual["underline"]),
+            "overstrike": bool(actual["overstrike"]),
+        }
+
+    def export_color(self, color):
+        if not color:
+            return None
+        red, green, blue = self.text_widget.winfo_rgb(color)
+        return "#%02x%02x%02x" % (red // 257, green // 257, blue // 257)
+
+    def export_style(self, tags, base, priority):
+        # The formatting of text carrying tags; higher-priority tags win
+        style = base
+        for tag in sorted(tags, key=lambda tag: priority.get(tag, len(priority))):
+            if self.styles.is_style_tag(tag):
+                registered = self.styles.style_of(tag)
+                size = registered.size or style.size
+                style = style._replace(
+                    family=registered.family or style.family,
+                    size=size if size > 0 else -size * 0.75,
+                    bold=registered.bold,
+                    italic=registered.italic,
+                    underline=registered.underline,
+                    foreground=self.export_color(registered.foreground)
+                    or style.foreground,
+                    background=self.export_color(registered.background)
+                    or style.background,
+                )
+                continue
+            options = {
+                option: str(self.text_widget.tag_cget(tag, option))
+                for option in STYLE_OPTIONS
+            }
+            if options["font"]:
+                actual = font.Font(font=options["font"]).actual()
+                style = style._replace(**self._font_fields(actual))
+            for option in ("underline", "overstrike"):
+                if options[option]:
+                    value = self.text_widget.tk.getboolean(options[option])
+                    style = style._replace(**{option: value})
+            style = style._replace(
+                foreground=self.export_color(options["foreground"]) or style.foreground,
+                background=self.export_color(options["background"]) or style.background,
+            )
+        return style
+
+    def iter_export_items(self, job, base):
+        # ("text", text, ExportStyle), ("image", path, (width, height)) and
+        # ("table", TableModel), dumped a few hundred lines at a time
+        priority = {tag: n for n, tag in enumerate(self.text_widget.tag_names())}
+        styles = {}  # frozenset of tags -> ExportStyle
+        active = set()
+        total = self.document.line_count
+        line = 1
+        while line <= total:
+            end = line + EXPORT_DUMP_LINES
+            dump = self.text_widget.tk.splitlist(
+                self._tk_call(
+                    "dump",
+                    "-text",
+                    "-tag",
+                    "-image",
+                    "-window",
+                    f"{line}.0",
+                    f"{end}.0" if end <= total else "end-1c",
+                )
+            )
+            for key, value, _ in zip(dump[::3], dump[1::3], dump[2::3]):
+                if key == "text":
+                    tags = frozenset(active)
+                    style = styles.get(tags)
+                    if style is None:
+                        style = styles[tags] = self.export_style(tags, base, priority)
+                    yield "text", value, style
+                elif key == "tagon":
+                    if value not in TRANSIENT_TAGS:
+                        active.add(value)
+                elif key == "tagoff":
+                    active.discard(value)
+                elif key == "image" and value in self.images:
+                    entry = self.images[value]
+                    photo = entry["photo"]
+                    size = (photo.width(), photo.height()) if photo else IMAGE_MAX_SIZE
+                    yield "image", entry["path"], size
+                elif key == "window" and value in self.tables:
+                    yield "table", self.tables[value].model
+            line = end
+            job.progress = min(line - 1, total) / total
+
+    def pdf_measure(self):
+        # Widths of PDF_FONTS text at size 1, from the matching Tk fonts,
+        # cached per character
+        fonts = [
+            font.Font(
+                family=PDF_FONT_FAMILIES[index // 4],
+                size=-100,
+                weight="bold" if index % 2 else "normal",
+                slant="italic" if index % 4 >= 2 else "roman",
+            )
+            for index, _ in enumerate(PDF_FONTS)
+        ]
+        widths = [{} for _ in PDF_FONTS]
+
+        def measure(font_index, text):
+            cache = widths[font_index]
+            total = 0
+            for char in text:
+                width = cache.get(char)
+                if width is None:
+                    width = cache[char] = fonts[font_index].measure(char) / 100
+                total += width
+            return total
+
+        return measure
+
     def on_content_modified(self, event=None):
         self.content_saved = False
         self.text_widget.edit_modified(0)
+        self.schedule_spell_check()
+
+    def run_in_background(self, func, *args, callback=None, poll_ms=50, executor=None):
+        # Tk is not thread safe: the worker never touches widgets, and the
+        # callback gets the finished future back on the UI thread.
+        future = (executor or self.executor).submit(func, *args)
+
+        def poll():
+            if not future.done():
+                self.master.after(poll_ms, poll)
+            elif callback is not None:
+                callback(future)
+
+        self.master.after(poll_ms, poll)
+        return future
 
     def on_close(self):
-        if not self.content_saved:
+        unsaved = [tab for tab in self.tabs if not tab.content_saved]
+        if unsaved:
             response = messagebox.askyesnocancel(
                 "Unsaved Changes",
                 "You have unsaved changes. Do you want to save before exiting?",
             )
             if response:  # Save and exit
-                self.save_file()
-                self.master.destroy()
+                self.save_tabs(unsaved, then=self.shutdown)
             elif response is False:  # Discard and exit
-                self.master.destroy()
+                self.shutdown()
             # If response is None (Cancel), do nothing
         else:
-            self.master.destroy()
+            self.shutdown()
+
+    def shutdown(self):
+        self.cancel_export()
+        self.settings.flush()
+        self.file_watcher.close()
+        for tab in self.tabs:
+            if tab.loader is not None:
+                tab.loader.cancel()
+            if tab.large_view is not None:
+                self.wait_for_save(tab)
+                tab.large_view.close()
+                tab.large_view = None
+            if tab.journal is not None:
+                tab.journal.discard()
+                tab.journal = None
+        self.executor.shutdown(wait=False)
+        self.image_executor.shutdown(wait=False, cancel_futures=True)
+        self.master.destroy()
 
     def cut(self):
         self.text_widget.event_generate("<<Cut>>")
@@ -325,18 +2689,63 @@ class WordLikeNotepad:
             self.text_widget.config(
                 bg="#1e1e1e", fg="#ffffff", insertbackground="white"
             )
+            self.gutter.set_colors("#252526", "#858585")
         else:
             self.text_widget.config(
                 bg="#ffffff", fg="#000000", insertbackground="black"
             )
+            self.gutter.set_colors("#f3f3f3", "#808080")
         self.settings["theme"] = theme
-        self.save_settings()
+
+    def track_stats(self, edit):
+        self.stats.apply(self.document, edit)
+        self.schedule_stats_update()
+
+    def schedule_stats_update(self, event=None):
+        if not self._stats_scheduled:
+            self._stats_scheduled = True
+            self.master.after_idle(self.update_stats)
+
+    def update_stats(self):
+        self._stats_scheduled = False
+        view = self.large_view
+        if view is None:
+            text = (
+                f"Words: {self.stats.words}  Chars: {len(self.document)}  "
+                f"Lines: {self.document.line_count}"
+            )
+        else:
+            # Only the pages in the widget are counted; the line index is
+            # the one total known for the whole file
+            lines = view.line_count if view.index_complete else "indexing"
+            text = (
+                f"Loaded pages: {self.stats.words} words, "
+                f"{len(self.document)} chars  |  File: {lines} lines"
+            )
+        selection = self.text_widget.tag_ranges("sel")
+        if selection:
+            selected = self.document.get(
+                self._tk_offset(selection[0]), self._tk_offset(selection[1])
+            )
+            text = (
+                f"Selected: {count_words(selected)} words, {len(selected)} chars  |  "
+                + text
+            )
+        self.stats_label.config(text=text)
 
     def word_count(self):
-        content = self.text_widget.get(1.0, tk.END)
-        words = len(content.split())
-        chars = len(content)
-        lines = int(self.text_widget.index("end-1c").split(".")[0])
+        words = self.stats.words
+        chars = len(self.document)
+        view = self.large_view
+        if view is not None:
+            lines = view.line_count if view.index_complete else "still indexing"
+            messagebox.showinfo(
+                "Word Count",
+                f"Loaded pages only: {words} words, {chars} characters\n"
+                f"Whole file: {lines} lines, {view.size} bytes",
+            )
+            return
+        lines = self.document.line_count
         messagebox.showinfo(
             "Word Count", f"Words: {words}\nCharacters: {chars}\nLines: {lines}"
         )
@@ -344,114 +2753,231 @@ class WordLikeNotepad:
     def find_replace(self):
         top = tk.Toplevel(self.master)
         top.title("Find and Replace")
-        top.geometry("300x150")
+        top.geometry("340x170")
 
         ttk.Label(top, text="Find:").grid(row=0, column=0, padx=5, pady=5)
         find_entry = ttk.Entry(top, width=30)
-        find_entry.grid(row=0, column=1, padx=5, pady=5)
+        find_entry.grid(row=0, column=1, columnspan=2, padx=5, pady=5)
 
         ttk.Label(top, text="Replace:").grid(row=1, column=0, padx=5, pady=5)
         replace_entry = ttk.Entry(top, width=30)
-        replace_entry.grid(row=1, column=1, padx=5, pady=5)
+        replace_entry.grid(row=1, column=1, columnspan=2, padx=5, pady=5)
 
-        ttk.Button(
-            top, text="Find", command=lambda: self.find_text(find_entry.get())
-        ).grid(row=2, column=0, padx=5, pady=5)
+        match_case = tk.BooleanVar(top, False)
+        whole_word = tk.BooleanVar(top, False)
+        regex = tk.BooleanVar(top, False)
+        ttk.Checkbutton(top, text="Match case", variable=match_case).grid(
+            row=2, column=0, padx=5
+        )
+        ttk.Checkbutton(top, text="Whole word", variable=whole_word).grid(
+            row=2, column=1, padx=5
+        )
+        ttk.Checkbutton(top, text="Regex", variable=regex).grid(row=2, column=2, padx=5)
+
+        def search(incremental=False):
+            self.find_text(
+                find_entry.get(),
+                match_case=match_case.get(),
+                whole_word=whole_word.get(),
+                regex=regex.get(),
+                incremental=incremental,
+            )
+
+        # As-you-type search, restarted on every keystroke
+        pending = []
+
+        def on_query_changed(event=None):
+            if pending:
+                top.after_cancel(pending.pop())
+            pending.append(top.after(150, search, True))
+
+        find_entry.bind("<KeyRelease>", on_query_changed)
+        for variable in (match_case, whole_word, regex):
+            variable.trace_add("write", lambda *args: on_query_changed())
+        top.bind("<Destroy>", lambda event: self.cancel_search())
+
+        ttk.Button(top, text="Find", command=search).grid(
+            row=3, column=0, padx=5, pady=5
+        )
         ttk.Button(
             top,
-            text="Replace",
-            command=lambda: self.replace_text(find_entry.get(), replace_entry.get()),
-        ).grid(row=2, column=1, padx=5, pady=5)
+            text="Replace All",
+            command=lambda: self.replace_text(
+                find_entry.get(),
+                replace_entry.get(),
+                match_case=match_case.get(),
+                whole_word=whole_word.get(),
+                regex=regex.get(),
+            ),
+        ).grid(row=3, column=1, padx=5, pady=5)
 
-    def find_text(self, query):
+    def find_text(
+        self, query, match_case=False, whole_word=False, regex=False, incremental=False
+    ):
+        self.cancel_search()
         self.text_widget.tag_remove("found", "1.0", tk.END)
-        if query:
-            idx = "1.0"
-            while True:
-                idx = self.text_widget.search(query, idx, nocase=1, stopindex=tk.END)
-                if not idx:
-                    break
-                lastidx = f"{idx}+{len(query)}c"
-                self.text_widget.tag_add("found", idx, lastidx)
-                idx = lastidx
-            self.text_widget.tag_config("found", foreground="red", background="yellow")
-
-    def replace_text(self, find_query, replace_query):
+        self.text_widget.tag_config("found", foreground="red", background="yellow")
+        self.text_widget.tag_raise("found")
+        if not query:
+            return 0
+        try:
+            pattern = compile_search(query, match_case, whole_word, regex)
+        except re.error as e:
+            self.update_status(f"Invalid pattern: {e}")
+            return 0
+        job = self._highlight_matches(pattern)
+        if incremental:
+            self._run_search_step(job, self.document.version)
+            return None
+        for count, _ in job:
+            pass
+        return count
+
+    def _highlight_matches(self, pattern):
+        # Yields (matches so far, whether the search is finished)
+        count = 0
+        ranges = []
+        for start, end in iter_match_indices(self.document.text(), pattern):
+            ranges += (start, end)
+            count += 1
+            if count % FIND_BATCH == 0:
+                self.text_widget.tag_add("found", *ranges)
+                ranges = []
+                yield count, False
+        if ranges:
+            self.text_widget.tag_add("found", *ranges)
+        self.update_status(f"{count} matches")
+        yield count, True
+
+    def _run_search_step(self, job, version):
+        self._search_job = None
+        if version != self.document.version:
+            return  # the text changed under the search; the next query restarts it
+        count, finished = next(job)
+        if finished:
+            return  # _highlight_matches has shown the total
+        self.update_status(f"Searching... {count} matches")
+        self._search_job = self.master.after(1, self._run_search_step, job, version)
+
+    def cancel_search(self):
+        if self._search_job is not None:
+            self.master.after_cancel(self._search_job)
+            self._search_job = None
+
+    def replace_text(
+        self, find_query, replace_query, match_case=False, whole_word=False, regex=False
+    ):
+        self.cancel_search()
         self.text_widget.tag_remove("found", "1.0", tk.END)
-        if find_query and replace_query:
-            idx = "1.0"
-            while True:
-                idx = self.text_widget.search(
-                    find_query, idx, nocase=1, stopindex=tk.END
+        if not find_query:
+            return 0
+        try:
+            pattern = compile_search(find_query, match_case, whole_word, regex)
+        except re.error as e:
+            self.update_status(f"Invalid pattern: {e}")
+            return 0
+        started = time.perf_counter()
+        try:
+            regions, spans = plan_replacements(
+                self.document.text(), pattern, replace_query, regex
+            )
+        except (re.error, IndexError) as e:
+            self.update_status(f"Invalid replacement: {e}")
+            return 0
+        if not spans:
+            self.update_status("No matches")
+            return 0
+
+        # Back to front, so earlier offsets stay valid, as one undo step
+        history = self.tab.undo_history
+        history.separator()
+        history.autoseparators = False
+        try:
+            for start, end, new in reversed(regions):
+                self.text_widget.replace(
+                    "%d.%d" % self.document.position(start),
+                    "%d.%d" % self.document.position(end),
+                    new,
                 )
-                if not idx:
-                    break
-                lastidx = f"{idx}+{len(find_query)}c"
-                self.text_widget.delete(idx, lastidx)
-                self.text_widget.insert(idx, replace_query)
-                lastidx = f"{idx}+{len(replace_query)}c"
-                self.text_widget.tag_add("found", idx, lastidx)
-                idx = lastidx
-            self.text_widget.tag_config(
-                "found", foreground="green", background="yellow"
+        finally:
+            history.autoseparators = True
+            history.separator()
+
+        ranges = []
+        for start, end in spans:
+            ranges += (
+                "%d.%d" % self.document.position(start),
+                "%d.%d" % self.document.position(end),
             )
+            if len(ranges) >= 2 * FIND_BATCH:
+                self.text_widget.tag_add("found", *ranges)
+                ranges = []
+        if ranges:
+            self.text_widget.tag_add("found", *ranges)
+        self.text_widget.tag_config("found", foreground="green", background="yellow")
+        self.text_widget.tag_raise("found")
+
+        elapsed = time.perf_counter() - started
+        self.update_status(
+            f"Replaced {len(spans)} occurrences in {elapsed * 1000:.0f} ms"
+        )
+        return len(spans)
 
     def on_key_press(self, event=None):
+        self._key_started = time.perf_counter()
         self.update_status("Editing")
 
-    def update_status(self, message):
-        self.status_bar.config(
-            text=f"{message} | {datetime.now().strftime('%H:%M:%S')}"
-        )
+    def install_latency_probe(self, widget):
+        # Bindings on this tag run after the Text class bindings have edited
+        # the text, so an idle callback queued here runs after the redraw.
+        tags = widget.bindtags()
+        widget.bindtags(tags[:2] + ("LatencyProbe",) + tags[2:])
+        widget.bind_class("LatencyProbe", "<KeyPress>", self._on_key_handled)
+
+    def _on_key_handled(self, event=None):
+        started, self._key_started = self._key_started, None
+        if started is not None:
+            self.master.after_idle(
+                lambda: self.latency.add(time.perf_counter() - started)
+            )
 
-    def load_settings(self):
-        try:
-            with open("settings.json", "r") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {}
+    def show_latency(self):
+        messagebox.showinfo("Typing Latency", self.latency.summary())
+
+    def update_status(self, message):
+        # Coalesced: however often this is called, the label is repainted at
+        # most once per frame, and only when its text changes.
+        self._status_message = message
+        if not self._status_scheduled:
+            self._status_scheduled = True
+            self.master.after_idle(self._paint_status)
+
+    def _paint_status(self):
+        wait = self._status_painted + STATUS_FRAME_MS / 1000 - time.perf_counter()
+        if wait > 0:
+            self.master.after(int(wait * 1000) + 1, self._paint_status)
+            return
+        self._status_scheduled = False
+        self._status_painted = time.perf_counter()
+        text = f"{self._status_message} | {datetime.now().strftime('%H:%M:%S')}"
+        if text != self._status_text:
+            self._status_text = text
+            self.status_bar.config(text=text)
 
     def change_font(self, event=None):
         font_family = self.font_family.get()
         font_size = int(self.font_size.get())
 
-        # Determine current tags on selected text
         if self.text_widget.tag_ranges("sel"):
-            start, end = self.text_widget.tag_ranges("sel")
-            current_tags = self.text_widget.tag_names(start)
-        else:
-            return  # No selected text, do nothing
-
-        # Update font style based on dropdown selections
-        font_style = ""
-        if "bold" in current_tags:
-            font_style += " bold"
-        if "italic" in current_tags:
-            font_style += " italic"
-        if "underline" in current_tags:
-            font_style += " underline"
-
-        # Create or update font tag for selected text
-        font_tag = f"{font_family}_{font_size}_{font_style}"
-        self.text_widget.tag_configure(
-            font_tag, font=(font_family, font_size, font_style.strip())
-        )
-
-        # Apply tag to selected text
-        self.text_widget.tag_add(font_tag, start, end)
-
-        # Remove previous font tags from selected text
-        for tag in current_tags:
-            if (
-                tag.startswith(("Arial_", "12_", "bold", "italic", "underline"))
-                and tag != font_tag
-            ):
-                self.text_widget.tag_remove(tag, start, end)
+            self.styles.restyle(
+                "sel.first",
+                "sel.last",
+                lambda style: style._replace(family=font_family, size=font_size),
+            )
 
         # Save font settings (optional)
         self.settings["font_family"] = font_family
         self.settings["font_size"] = font_size
-        self.save_settings()
 
     def toggle_theme(self):
         if self.settings["theme"] == "light":
@@ -459,66 +2985,67 @@ class WordLikeNotepad:
         else:
             self.settings["theme"] = "light"
         self.apply_theme(self.settings["theme"])
-        self.save_settings()
+
+    def _style_target(self):
+        if self.text_widget.tag_ranges("sel"):
+            return "sel.first", "sel.last"
+        return "insert", "insert+1c"
 
     def change_text_color(self):
         color = askcolor(title="Choose text color")[1]
         if color:
-            current_tags = self.text_widget.tag_names("sel.first")
-            self.text_widget.tag_configure(f"color_{color}", foreground=color)
-            if "sel" in self.text_widget.tag_names():
-                self.text_widget.tag_add(f"color_{color}", "sel.first", "sel.last")
-            else:
-                self.text_widget.tag_add(f"color_{color}", "insert")
-            for tag in current_tags:
-                if tag.startswith("color_"):
-                    self.text_widget.tag_remove(tag, "sel.first", "sel.last")
+            self.styles.restyle(
+                *self._style_target(), lambda style: style._replace(foreground=color)
+            )
 
     def change_bg_color(self):
         color = askcolor(title="Choose background color")[1]
         if color:
-            current_tags = self.text_widget.tag_names("sel.first")
-            self.text_widget.tag_configure(f"bg_{color}", background=color)
-            if "sel" in self.text_widget.tag_names():
-                self.text_widget.tag_add(f"bg_{color}", "sel.first", "sel.last")
-            else:
-                self.text_widget.tag_add(f"bg_{color}", "insert")
-            for tag in current_tags:
-                if tag.startswith("bg_"):
-                    self.text_widget.tag_remove(tag, "sel.first", "sel.last")
+            self.styles.restyle(
+                *self._style_target(), lambda style: style._replace(background=color)
+            )
 
-    def toggle_bold(self):
+    def _toggle_style(self, field):
         if self.text_widget.tag_ranges("sel"):
-            current_tags = self.text_widget.tag_names("sel.first")
-            if "bold" in current_tags:
-                self.text_widget.tag_remove("bold", "sel.first", "sel.last")
-            else:
-                self.text_widget.tag_add("bold", "sel.first", "sel.last")
+            enabled = not getattr(self.styles.style_at("sel.first"), field)
+            self.styles.restyle(
+                "sel.first",
+                "sel.last",
+                lambda style: style._replace(**{field: enabled}),
+            )
 
-            # Update font with current settings
-            self.change_font()
+    def toggle_bold(self):
+        self._toggle_style("bold")
 
     def toggle_italic(self):
-        if self.text_widget.tag_ranges("sel"):
-            current_tags = self.text_widget.tag_names("sel.first")
-            if "italic" in current_tags:
-                self.text_widget.tag_remove("italic", "sel.first", "sel.last")
-            else:
-                self.text_widget.tag_add("italic", "sel.first", "sel.last")
-
-            # Update font with current settings
-            self.change_font()
+        self._toggle_style("italic")
 
     def toggle_underline(self):
-        if self.text_widget.tag_ranges("sel"):
-            current_tags = self.text_widget.tag_names("sel.first")
-            if "underline" in current_tags:
-                self.text_widget.tag_remove("underline", "sel.first", "sel.last")
-            else:
-                self.text_widget.tag_add("underline", "sel.first", "sel.last")
+        self._toggle_style("underline")
+
+    def track_style_tags(self, edit):
+        # Deleted text takes its tag ranges with it; free the style tags
+        # that are left without any once the deleting is over
+        if not edit.removed:
+            return
+        if self._style_collect_job is not None:
+            self.master.after_cancel(self._style_collect_job)
+        self._style_collect_job = self.master.after(
+            STYLE_COLLECT_MS, self.collect_style_tags
+        )
 
-            # Update font with current settings
-            self.change_font()
+    def collect_style_tags(self):
+        self._style_collect_job = None
+        if self.tab is not None:
+            self.styles.collect()
+
+    def show_style_statistics(self):
+        self.styles.collect()
+        tags, style_tags, ranges = self.styles.statistics()
+        messagebox.showinfo(
+            "Style Statistics",
+            f"Tags: {tags}\nStyle tags: {style_tags}\nTagged ranges: {ranges}",
+        )
 
     def insert_table(self):
         top = tk.Toplevel(self.master)
@@ -542,40 +3069,196 @@ class WordLikeNotepad:
         ).grid(row=2, column=0, columnspan=2, pady=10)
 
     def create_table(self, rows, cols):
-        table = "|"
-        for _ in range(cols):
-            table += " Column |"
-        table += "\n|"
-        for _ in range(cols):
-            table += "---------|"
-        table += "\n"
-        for _ in range(rows):
-            table += "|"
-            for _ in range(cols):
-                table += "         |"
-            table += "\n"
-        self.text_widget.insert(tk.END, table)
+        return self.insert_table_model(TableModel.blank(rows, cols))
 
-    def spell_check(self):
-        # This is a simplified spell check. For a real application, you'd want to use a proper spell checking library.
-        words = self.text_widget.get("1.0", tk.END).split()
-        misspelled = []
-        for word in words:
-            if not self.is_word(word):
-                misspelled.append(word)
-        if misspelled:
-            messagebox.showinfo(
-                "Spell Check", f"Potentially misspelled words: {', '.join(misspelled)}"
+    def insert_table_model(self, model, index=tk.INSERT):
+        view = TableView(self.text_widget, model, on_change=self.on_table_changed)
+        self.text_widget.window_create(index, window=view)
+        self.tables[str(view)] = view
+        return view
+
+    def on_table_changed(self):
+        self.content_saved = False
+
+    def import_table(self, file_path=None):
+        if file_path is None:
+            file_path = filedialog.askopenfilename(
+                filetypes=[
+                    ("CSV and TSV Files", "*.csv *.tsv *.tab"),
+                    ("All Files", "*.*"),
+                ]
             )
+        if not file_path:
+            return None
+        try:
+            file, rows = open_delimited(file_path)
+            header = next(rows, None)
+        except (OSError, csv.Error) as e:
+            messagebox.showerror("Error", f"Unable to import table: {e}")
+            return None
+        if not header:
+            file.close()
+            messagebox.showinfo("Import Table", f"{file_path} is empty.")
+            return None
+        # The header shows right away; the rows stream in on a worker thread
+        model = TableModel(header)
+        model.loading = True
+        view = self.insert_table_model(model)
+        threading.Thread(target=model.load_rows, args=(file, rows), daemon=True).start()
+        self._poll_table_import(model, os.path.basename(file_path))
+        return view
+
+    def _poll_table_import(self, model, name):
+        for view in self.tables.values():
+            if view.model is model:
+                view.refresh()
+        if model.error is not None:
+            self.update_status(f"Import of {name} stopped: {model.error}")
+        elif model.loading:
+            self.update_status(f"Importing {name}: {model.rows} rows")
+            self.master.after(100, self._poll_table_import, model, name)
         else:
-            messagebox.showinfo("Spell Check", "No spelling errors found.")
+            self.update_status(f"Imported {name}: {model.rows} rows")
+
+    def collect_tables(self):
+        dump = self.text_widget.tk.splitlist(
+            self._tk_call("dump", "-window", "1.0", "end-1c")
+        )
+        return [
+            {"offset": self._index_offset(index), "model": self.tables[name].model}
+            for name, index in zip(dump[1::3], dump[2::3])
+            if name in self.tables
+        ]
+
+    def restore_tables(self, tables):
+        # Like restore_images: each table replaces its OBJECT_CHAR
+        for entry in sorted(tables, key=lambda entry: entry["offset"], reverse=True):
+            index = "%d.%d" % self.document.position(entry["offset"])
+            if self.text_widget.get(index) != OBJECT_CHAR:
+                continue
+            self.text_widget.delete(index)
+            self.insert_table_model(entry["model"], index)
+
+    def spell_check(self):
+        # Check the whole document now and keep checking edited lines
+        self.spell_enabled = True
+        self.text_widget.tag_config("misspelled", underline=True, foreground="#c00000")
+        self._spell_dirty = None
+        self.schedule_spell_check(delay=0)
 
     def is_word(self, word):
-        # This is a very basic check. In a real application, you'd use a dictionary or language model.
-        return word.isalpha()
+        if self.spell_checker is None:
+            return word.isalpha()
+        return self.spell_checker.is_word(word)
+
+    def track_spell_lines(self, edit):
+        if not self.spell_enabled or self._spell_dirty is None:
+            return
+        # Shift the pending and in-flight lines past the edit, then add the
+        # lines it touched
+        line = self.document.position(edit.offset)[0]
+        removed = edit.removed.count("\n")
+        inserted = edit.inserted.count("\n")
+
+        def shift(numbers):
+            return {
+                number if number < line else number + inserted - removed
+                for number in numbers
+                if number < line or number > line + removed
+            }
+
+        self._spell_dirty = shift(self._spell_dirty)
+        self._spell_checking = shift(self._spell_checking)
+        self._spell_dirty.update(range(line, line + inserted + 1))
+
+    def schedule_spell_check(self, delay=500):
+        if not self.spell_enabled:
+            return
+        if self._spell_job is not None:
+            self.master.after_cancel(self._spell_job)
+        self._spell_job = self.master.after(delay, self._start_spell_check)
+
+    def _start_spell_check(self):
+        self._spell_job = None
+        if self._spell_running:
+            self.schedule_spell_check()
+            return
+        if self._spell_dirty is not None and not self._spell_dirty:
+            return
+        lines = None if self._spell_dirty is None else sorted(self._spell_dirty)
+        self._spell_checking = set(lines or ())
+        self._spell_dirty = set()
+        self._spell_running = True
+        snapshot = self.document.snapshot()
+
+        def check():
+            if self.spell_checker is None:
+                self.spell_checker = SpellChecker.load()
+            return self.spell_checker.check_document(snapshot, lines)
+
+        document = self.document
+        self.run_in_background(
+            check,
+            callback=lambda future: self._apply_spell_results(
+                future, document, snapshot, lines
+            ),
+        )
+
+    def _apply_spell_results(self, future, document, snapshot, lines):
+        self._spell_running = False
+        error = future.exception()
+        if error is not None:
+            self.update_status(f"Spell check failed: {error}")
+        if document is not self.document:
+            return  # another tab is showing; it gets a full check of its own
+        if error is not None or snapshot.version != self.document.version:
+            # The lines are checked again: after a failure on the next edit,
+            # after an edit right away. track_spell_lines has moved them to
+            # where they are now.
+            if lines is None or self._spell_dirty is None:
+                self._spell_dirty = None
+            else:
+                self._spell_dirty.update(self._spell_checking)
+            self._spell_checking = set()
+            if error is None:
+                self.schedule_spell_check()
+            return
+        results = future.result()[1]
+        if lines is None:
+            self.text_widget.tag_remove("misspelled", "1.0", tk.END)
+        else:
+            for number in lines:
+                self.text_widget.tag_remove(
+                    "misspelled", f"{number}.0", f"{number}.end"
+                )
+        ranges = []
+        for number, spans in results.items():
+            for start, end in spans:
+                ranges += (f"{number}.{start}", f"{number}.{end}")
+            if len(ranges) >= 2 * FIND_BATCH:
+                self.text_widget.tag_add("misspelled", *ranges)
+                ranges = []
+        if ranges:
+            self.text_widget.tag_add("misspelled", *ranges)
+        if lines is None:
+            count = sum(len(spans) for spans in results.values())
+            if not self.spell_checker.words:
+                self.update_status("Spell check: no dictionary found")
+            else:
+                self.update_status(f"Spell check: {count} possible misspellings")
 
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["batch"]:
+        import notepad_core
+
+        sys.exit(notepad_core.main(sys.argv[2:]))
+    profiler = None
+    if "--startup-profile" in sys.argv:
+        profiler = StartupProfiler()
+        profiler.mark("imports")
     root = tk.Tk()
-    app = WordLikeNotepad(root)
+    if profiler is not None:
+        profiler.mark("Tk init")
+    app = WordLikeNotepad(root, profiler, profile_commands="--profile" in sys.argv)
     root.mainloop()
@@ -0,0 +1,274 @@
+"""Times the editor's hot paths on generated documents.
+
+Runs the real WordLikeNotepad under the current display, or under a private
+Xvfb server when there is none, and writes the timings as JSON. With a
+baseline file present the run is compared against it and exits with status 1
+when any operation got slower than the allowed threshold.
+
+    python benchmarks/bench_editor.py --sizes 10KB 1MB 10MB 100MB
+    python benchmarks/bench_editor.py --update-baseline
+"""
+
+import argparse
+import atexit
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+EDITOR = os.path.join(HERE, os.pardir, "Word-like-notepad.py")
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+DEFAULT_SIZES = ("10KB", "1MB", "10MB", "100MB")
+UNITS = {"KB": 1024, "MB": 1024 * 1024}
+WORDS = (
+    "the quick brown fox jumps over lazy dog editor notepad document "
+    "paragraph table image format style colour font size search replace "
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do tempor"
+).split()
+NEEDLE = "needle"
+
+
+def parse_size(text):
+    for unit, factor in UNITS.items():
+        if text.upper().endswith(unit):
+            return int(float(text[: -len(unit)]) * factor)
+    return int(text)
+
+
+def ensure_display():
+    # Starts a private Xvfb server when there is no display to draw on
+    if os.name == "nt" or sys.platform == "darwin" or os.environ.get("DISPLAY"):
+        return
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        sys.exit("No DISPLAY set and Xvfb is not installed.")
+    for number in range(99, 200):
+        if not os.path.exists(f"/tmp/.X11-unix/X{number}"):
+            break
+    server = subprocess.Popen(
+        [xvfb, f":{number}", "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    atexit.register(server.terminate)
+    deadline = time.monotonic() + 10
+    while not os.path.exists(f"/tmp/.X11-unix/X{number}"):
+        if server.poll() is not None or time.monotonic() > deadline:
+            sys.exit("Xvfb did not start.")
+        time.sleep(0.05)
+    os.environ["DISPLAY"] = f":{number}"
+
+
+def load_editor():
+    sys.path.insert(0, os.path.dirname(EDITOR))  # for notepad_core
+    spec = importlib.util.spec_from_file_location("word_like_notepad", EDITOR)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_document(path, size, seed=0):
+    rng = random.Random(seed)
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < size:
+            words = [rng.choice(WORDS) for _ in range(12)]
+            if rng.random() < 0.05:
+                words[rng.randrange(len(words))] = NEEDLE
+            line = " ".join(words) + "\n"
+            f.write(line)
+            written += len(line)
+
+
+def pump_until(root, done, timeout=600):
+    deadline = time.monotonic() + timeout
+    while not done():
+        if time.monotonic() > deadline:
+            raise TimeoutError("operation did not finish in time")
+        root.update()
+        time.sleep(0.001)
+    root.update()
+
+
+def timed(root, action, wait=None, repeat=1):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        action()
+        if wait is not None:
+            pump_until(root, wait)
+        else:
+            root.update_idletasks()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def quiet_dialogs(editor):
+    # Benchmarks must never block on a modal dialog
+    def fail(title, message, **options):
+        raise RuntimeError(f"{title}: {message}")
+
+    editor.messagebox.showinfo = lambda *args, **kwargs: "ok"
+    editor.messagebox.showwarning = lambda *args, **kwargs: "ok"
+    editor.messagebox.showerror = fail
+    editor.messagebox.askyesno = lambda *args, **kwargs: False
+    editor.messagebox.askyesnocancel = lambda *args, **kwargs: False
+
+
+def bench_size(root, app, label, size, workdir, repeat):
+    source = os.path.join(workdir, f"doc-{label}.txt")
+    target = os.path.join(workdir, f"saved-{label}.txt")
+    write_document(source, size)
+    results = {}
+
+    def opened():
+        view = app.large_view
+        return view is None or (view.index_complete and view.last_page >= 0)
+
+    results["open_file"] = timed(root, lambda: app.open_file(source), wait=opened)
+
+    state = {}
+
+    def save():
+        app.filename = target
+        state["saved"] = False
+        state["view"] = app.large_view
+        app.save_file(then=lambda: state.update(saved=True))
+
+    def saved():
+        if state["view"] is None:
+            return state["saved"]
+        # Paged files come back in a fresh view of the saved file
+        return (
+            state["saved"] and app.large_view not in (None, state["view"]) and opened()
+        )
+
+    results["save_file"] = timed(root, save, wait=saved, repeat=repeat)
+    results["find_text"] = timed(root, lambda: app.find_text(NEEDLE), repeat=repeat)
+    results["word_count"] = timed(root, app.word_count, repeat=repeat)
+
+    def select_all_and_restyle():
+        app.text_widget.tag_add("sel", "1.0", "end-1c")
+        app.font_size.set(str(14 if app.font_size.get() == "12" else 12))
+        app.change_font()
+
+    results["change_font"] = timed(root, select_all_and_restyle, repeat=repeat)
+    results["spell_check"] = timed(
+        root,
+        app.spell_check,
+        wait=lambda: not app._spell_running
+        and app._spell_job is None
+        and app._spell_dirty == set(),
+    )
+    # Replace last: it changes the document the other steps read
+    results["replace_text"] = timed(root, lambda: app.replace_text(NEEDLE, "pin"))
+    results["create_table"] = timed(
+        root, lambda: app.create_table(100, 10), repeat=repeat
+    )
+    app.close_tab()
+    root.update()
+    os.remove(source)
+    if os.path.exists(target):
+        os.remove(target)
+    return {f"{name}/{label}": seconds for name, seconds in results.items()}
+
+
+def compare(results, baseline, threshold, floor):
+    regressions = []
+    print(f"{'operation':<28}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, seconds in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<28}{'-':>12}{seconds * 1000:>10.1f}ms{'new':>10}")
+            continue
+        change = (seconds - before) / before if before else 0.0
+        flag = ""
+        if change > threshold and seconds - before > floor:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            f"{name:<28}{before * 1000:>10.1f}ms{seconds * 1000:>10.1f}ms"
+            f"{change:>+9.0%}{flag}"
+        )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="allowed slowdown as a fraction of the baseline (default 0.25)",
+    )
+    parser.add_argument(
+        "--floor",
+        type=float,
+        default=0.005,
+        help="ignore slowdowns smaller than this many seconds (default 0.005)",
+    )
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="wln-bench-")
+    atexit.register(shutil.rmtree, workdir, True)
+    # Keep settings, caches and recovery journals out of the user's profile
+    os.environ["XDG_CONFIG_HOME"] = os.environ["APPDATA"] = workdir
+    ensure_display()
+
+    editor = load_editor()
+    quiet_dialogs(editor)
+    root = editor.tk.Tk()
+    app = editor.WordLikeNotepad(root)
+    root.update()
+
+    results = {}
+    for label in args.sizes:
+        print(f"Benchmarking {label}...", file=sys.stderr)
+        size = parse_size(label)
+        results.update(bench_size(root, app, label, size, workdir, args.repeat))
+    app.shutdown()
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "tk": editor.tk.TkVersion,
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; results written to {args.output}")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold, args.floor)
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
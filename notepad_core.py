@@ -0,0 +1,1977 @@
+"""Tk-free engines shared by the editor and its batch mode.
+
+The document model, find and replace, spell checking, statistics, style
+interning, embedded tables, paged views of large files, encoding-aware file
+reading, the .wln format, the recovery journal, the settings store and HTML
+and PDF export live here so they can run without a display.
+Run as a script (or as ``Word-like-notepad.py batch``) to apply them to many
+files at once:
+
+    python notepad_core.py --replace foo=bar --spell --stats *.txt
+"""
+
+import argparse
+import base64
+import codecs
+import csv
+import difflib
+import glob
+import html
+import io
+import json
+import mimetypes
+import mmap
+import os
+import queue
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import accumulate, islice
+
+if os.name != "nt":
+    import fcntl
+
+# Where the program lives; dictionary.txt is looked for here
+if getattr(sys, "frozen", False):
+    APP_DIR = os.path.dirname(sys.executable)
+else:
+    APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# Stands in for embedded images and windows, which take up one index in Tk
+OBJECT_CHAR = "\ufffc"
+
+TextEdit = namedtuple("TextEdit", "offset removed inserted")
+
+
+def compile_search(query, match_case=False, whole_word=False, regex=False):
+    pattern = query if regex else re.escape(query)
+    if whole_word:
+        pattern = rf"\b(?:{pattern})\b"
+    return re.compile(pattern, 0 if match_case else re.IGNORECASE)
+
+
+# Replacements closer together than this are applied as one widget edit
+REPLACE_MERGE_GAP = 64
+REPLACE_MAX_REGIONS = 2000
+
+
+def plan_replacements(text, pattern, replacement, regex=False):
+    # Returns the edit regions as (start, end, new_text) in offsets of the
+    # original text, and the (start, end) of every replacement in the result.
+    regions = []
+    spans = []
+    delta = 0
+    for match in pattern.finditer(text):
+        start, end = match.span()
+        if start == end:
+            continue
+        new = match.expand(replacement) if regex else replacement
+        spans.append((start + delta, start + delta + len(new)))
+        delta += len(new) - (end - start)
+        if regions and start - regions[-1][1] <= REPLACE_MERGE_GAP:
+            region_start, region_end, parts = regions[-1]
+            parts += (text[region_end:start], new)
+            regions[-1] = (region_start, end, parts)
+        else:
+            regions.append((start, end, [new]))
+    if len(regions) > REPLACE_MAX_REGIONS:
+        # Too scattered to be worth separate edits; swap in one block
+        parts = []
+        for index, (start, end, region_parts) in enumerate(regions):
+            if index:
+                parts.append(text[regions[index - 1][1] : start])
+            parts += region_parts
+        regions = [(regions[0][0], regions[-1][1], parts)]
+    return [(start, end, "".join(parts)) for start, end, parts in regions], spans
+
+
+# How much of a file is looked at to guess its encoding
+LOAD_SNIFF_BYTES = 64 * 1024
+# Bytes read and decoded per step, and decoded chunks the reader may run ahead
+LOAD_CHUNK_BYTES = 256 * 1024
+LOAD_QUEUE_CHUNKS = 8
+# Longest first, since the UTF-32-LE mark starts with the UTF-16-LE one
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+
+# Bytes Windows-1252 leaves undefined. They are decoded to the C1 controls
+# with the same numbers, as Windows does, and encoded back, so such files
+# survive a round trip through the editor.
+CP1252_UNDEFINED = frozenset(b"\x81\x8d\x8f\x90\x9d")
+
+
+def _cp1252_passthrough(error):
+    if isinstance(error, UnicodeDecodeError):
+        data = error.object[error.start : error.end]
+        if all(byte in CP1252_UNDEFINED for byte in data):
+            return "".join(map(chr, data)), error.end
+    elif isinstance(error, UnicodeEncodeError):
+        text = error.object[error.start : error.end]
+        if all(ord(char) in CP1252_UNDEFINED for char in text):
+            return bytes(map(ord, text)), error.end
+    raise error
+
+
+codecs.register_error("cp1252-passthrough", _cp1252_passthrough)
+
+
+def codec_errors(encoding):
+    # The error handler text in this encoding is read and written with
+    if codecs.lookup(encoding).name == "cp1252":
+        return "cp1252-passthrough"
+    return "replace"
+
+
+def sniff_encoding(head):
+    # (encoding, BOM length) for a file starting with the bytes in head.
+    # Files that are not valid UTF-8 are taken to be Windows-1252. Only
+    # head is looked at, so readers of the rest of a file sniffed as UTF-8
+    # decode strictly and fall back to Windows-1252 themselves.
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+    if head.count(b"\0") > len(head) // 4:
+        # BOM-less UTF-16: ASCII text has a zero in every other byte
+        odd_zeros = head[1::2].count(b"\0")
+        return ("utf-16-le" if odd_zeros > head[::2].count(b"\0") else "utf-16-be"), 0
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError:
+        return "cp1252", 0
+    return "utf-8", 0
+
+
+def sniff_file(path):
+    with open(path, "rb") as file:
+        return sniff_encoding(file.read(LOAD_SNIFF_BYTES))
+
+
+def diff_hunks(old, new):
+    # Line-level differences as (start, end, new_text), in offsets of old
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    old_starts = list(accumulate(map(len, old_lines), initial=0))
+    hunks = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            hunks.append((old_starts[i1], old_starts[i2], "".join(new_lines[j1:j2])))
+    return hunks
+
+
+def iter_decoded(
+    file, encoding, chunk_bytes=LOAD_CHUNK_BYTES, errors=None, translate=True
+):
+    # Decoded text from a binary file, a chunk at a time, with line endings
+    # normalised to "\n" as reading in text mode would unless translate is
+    # false
+    decoder = codecs.getincrementaldecoder(encoding)(
+        errors=errors or codec_errors(encoding)
+    )
+    pending = ""  # a trailing "\r" that may be half of a "\r\n"
+    while True:
+        data = file.read(chunk_bytes)
+        final = not data
+        text = pending + decoder.decode(data, final=final)
+        pending = ""
+        if translate:
+            if text.endswith("\r") and not final:
+                text, pending = text[:-1], "\r"
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        if text:
+            yield text
+        if final:
+            return
+
+
+def decode_strictly(encoding, bom):
+    # Error handler for decoding a sniffed file: BOM-less UTF-8 was only
+    # checked as far as the sniff went, so it raises on bad bytes later on
+    return "strict" if encoding == "utf-8" and not bom else codec_errors(encoding)
+
+
+def read_file(path, prefer=None):
+    # (text, encoding, whether it has a BOM) for the whole file, decoded the
+    # way FileLoader decodes it. Reloading passes the encoding the file was
+    # opened with as prefer, so a Windows-1252 file that another program
+    # rewrote as plain ASCII stays Windows-1252 instead of becoming UTF-8.
+    with open(path, "rb") as file:
+        data = file.read()
+    encoding, bom = sniff_encoding(data[:LOAD_SNIFF_BYTES])
+    if prefer == "cp1252" and encoding == "utf-8" and data.isascii():
+        encoding = prefer  # reads the same either way
+    try:
+        text = data[bom:].decode(encoding, decode_strictly(encoding, bom))
+    except UnicodeDecodeError:
+        encoding = "cp1252"
+        text = data.decode(encoding, codec_errors(encoding))
+    return text.replace("\r\n", "\n").replace("\r", "\n"), encoding, bom > 0
+
+
+def read_text(path):
+    return read_file(path)[0]
+
+
+# Put in FileLoader.chunks when the file turns out not to be UTF-8 after
+# all: the text queued before it is to be thrown away
+LOAD_RESTART = object()
+
+
+class FileLoader:
+    """Reads and decodes a text file on a worker thread.
+
+    Decoded text goes through a bounded queue, so a busy UI holds the
+    reader back instead of the whole file piling up in memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.encoding, self._bom = sniff_file(path)
+        self.bom = self._bom > 0
+        self.chunks = queue.Queue(LOAD_QUEUE_CHUNKS)
+        self.read_bytes = 0
+        self.done = False
+        self.error = None
+        self._cancelled = False
+
+    def run(self):
+        try:
+            with open(self.path, "rb") as file:
+                try:
+                    self._read(file, decode_strictly(self.encoding, self._bom))
+                except UnicodeDecodeError:
+                    self.encoding = "cp1252"
+                    self._put(LOAD_RESTART)
+                    self._read(file, codec_errors(self.encoding))
+        except OSError as e:
+            self.error = e
+        finally:
+            self.done = True
+
+    def _read(self, file, errors):
+        file.seek(self._bom)
+        for text in iter_decoded(file, self.encoding, errors=errors):
+            self.read_bytes = file.tell()
+            self._put(text)
+            if self._cancelled:
+                break
+        self.read_bytes = file.tell()
+
+    def _put(self, text):
+        while not self._cancelled:
+            try:
+                self.chunks.put(text, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def cancel(self):
+        self._cancelled = True
+
+    @property
+    def progress(self):
+        return self.read_bytes / max(self.size, 1)
+
+
+# Lines per page of a LargeFileView
+LARGE_FILE_PAGE_LINES = 2000
+
+
+class LargeFileView:
+    """Paged, memory-mapped view of a file too large to load into the widget."""
+
+    def __init__(self, path, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.line_starts = array("q", [0])
+        self.indexed_bytes = 0
+        self.index_complete = False
+        self.overlay = {}  # page number -> edited text of that page
+        self.first_page = 0
+        self.last_page = -1  # nothing loaded into the widget yet
+        self._closed = False
+
+    def build_index(self):
+        # Runs on a worker thread; the UI only ever reads the published prefix.
+        find = self.mm.find
+        size = self.size
+        batch = array("q")
+        try:
+            pos = find(b"\n")
+            while pos != -1 and not self._closed:
+                if pos + 1 < size:
+                    batch.append(pos + 1)
+                if len(batch) >= 65536:
+                    self.line_starts.extend(batch)
+                    self.indexed_bytes = pos + 1
+                    batch = array("q")
+                pos = find(b"\n", pos + 1)
+        except ValueError:
+            return  # mapping closed underneath us
+        self.line_starts.extend(batch)
+        self.indexed_bytes = size
+        self.index_complete = True
+
+    @property
+    def line_count(self):
+        if self.index_complete:
+            return len(self.line_starts)
+        # Extrapolate from the indexed prefix so the scrollbar stays sensible
+        done = max(self.indexed_bytes, 1)
+        return max(len(self.line_starts), len(self.line_starts) * self.size // done)
+
+    def page_bounds(self, page):
+        first = page * LARGE_FILE_PAGE_LINES
+        last = first + LARGE_FILE_PAGE_LINES
+        starts = self.line_starts
+        if page < 0 or first >= len(starts):
+            return None
+        if last < len(starts):
+            return starts[first], starts[last]
+        if self.index_complete:
+            return starts[first], self.size
+        return None
+
+    def page_available(self, page):
+        return self.page_bounds(page) is not None
+
+    def page_text(self, page):
+        if page in self.overlay:
+            return self.overlay[page]
+        start, end = self.page_bounds(page)
+        return self.mm[start:end].decode(self.encoding, codec_errors(self.encoding))
+
+    def iter_chunks(self, overlay=None, encoding=None):
+        # Untouched pages are copied straight from the mapping, edited ones
+        # come from the overlay (or a copy of it taken by the caller). Pages
+        # are re-encoded when written out in another encoding.
+        if overlay is None:
+            overlay = self.overlay
+        encoding = encoding or self.encoding
+        errors = codec_errors(encoding)
+        page = 0
+        while True:
+            bounds = self.page_bounds(page)
+            if bounds is None:
+                return
+            if page in overlay:
+                yield overlay[page].encode(encoding, errors)
+            elif encoding != self.encoding:
+                yield self.page_text(page).encode(encoding, errors)
+            else:
+                yield self.mm[bounds[0] : bounds[1]]
+            page += 1
+
+    def reopened(self, path=None, encoding=None):
+        # A fresh view of the file once a save has replaced it, at the same
+        # page; this view must be closed before the file is replaced
+        view = LargeFileView(path or self.path, encoding or self.encoding)
+        view.first_page = self.first_page
+        return view
+
+    def close(self):
+        self._closed = True
+        self.mm.close()
+        self._file.close()
+
+
+class Document:
+    """Piece table mirroring the contents of the Text widget.
+
+    Offsets are character offsets; lines and columns follow Tk (lines start
+    at 1, columns at 0). Buffers are immutable strings, so snapshots only
+    copy the piece list.
+    """
+
+    MAX_PIECES = 4096
+    COALESCE_LIMIT = 4096
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, text=""):
+        self._pieces = []
+        self._newline_cache = {}  # id(buffer) -> (buffer, newline positions)
+        self._stale = True
+        self.version = 0
+        if text:
+            self._pieces.append(self._make_piece(text, 0, len(text)))
+
+    # Bookkeeping
+
+    def _newline_positions(self, buffer):
+        cached = self._newline_cache.get(id(buffer))
+        if cached is None or cached[0] is not buffer:
+            positions = array("q", (m.start() for m in re.finditer("\n", buffer)))
+            cached = self._newline_cache[id(buffer)] = (buffer, positions)
+        return cached[1]
+
+    def _count_newlines(self, buffer, start, end):
+        if len(buffer) > 65536:
+            positions = self._newline_positions(buffer)
+            return bisect_left(positions, end) - bisect_left(positions, start)
+        return buffer.count("\n", start, end)
+
+    def _make_piece(self, buffer, start, length):
+        return (
+            buffer,
+            start,
+            length,
+            self._count_newlines(buffer, start, start + length),
+        )
+
+    def _reindex(self):
+        if self._stale:
+            self._starts = [0]
+            self._starts.extend(accumulate(piece[2] for piece in self._pieces))
+            self._lines = [0]
+            self._lines.extend(accumulate(piece[3] for piece in self._pieces))
+            self._stale = False
+
+    def _split(self, offset):
+        # Returns the index of the first piece that starts at offset
+        self._reindex()
+        index = bisect_right(self._starts, offset) - 1
+        if index >= len(self._pieces):
+            return len(self._pieces)
+        buffer, start, length, _ = self._pieces[index]
+        inner = offset - self._starts[index]
+        if inner == 0:
+            return index
+        self._pieces[index : index + 1] = [
+            self._make_piece(buffer, start, inner),
+            self._make_piece(buffer, start + inner, length - inner),
+        ]
+        self._stale = True
+        return index + 1
+
+    def _changed(self):
+        self._stale = True
+        self.version += 1
+        if len(self._pieces) > self.MAX_PIECES:
+            text = self.text()
+            self._pieces = [self._make_piece(text, 0, len(text))]
+            self._newline_cache.clear()
+            self._stale = True  # text() indexed the pieces it flattened
+
+    # Editing
+
+    def insert(self, offset, text):
+        if not text:
+            return
+        offset = min(max(offset, 0), len(self))
+        self._reindex()
+        # Typing appends to the piece it just created instead of adding one
+        # piece per keystroke.
+        index = bisect_left(self._starts, offset) - 1
+        if 0 <= index < len(self._pieces) and self._starts[index + 1] == offset:
+            buffer, start, length, newlines = self._pieces[index]
+            if start == 0 and length == len(buffer) < self.COALESCE_LIMIT:
+                buffer += text
+                self._pieces[index] = (
+                    buffer,
+                    0,
+                    len(buffer),
+                    newlines + text.count("\n"),
+                )
+                self._changed()
+                return
+        index = self._split(offset)
+        self._pieces.insert(index, self._make_piece(text, 0, len(text)))
+        self._changed()
+
+    def delete(self, start, end):
+        start = max(start, 0)
+        end = min(end, len(self))
+        if start >= end:
+            return ""
+        removed = self.get(start, end)
+        first = self._split(start)
+        last = self._split(end)
+        del self._pieces[first:last]
+        self._changed()
+        return removed
+
+    # Reading
+
+    def __len__(self):
+        self._reindex()
+        return self._starts[-1]
+
+    @property
+    def line_count(self):
+        self._reindex()
+        return self._lines[-1] + 1
+
+    def snapshot(self):
+        copy = Document()
+        copy._pieces = list(self._pieces)
+        copy._newline_cache = self._newline_cache
+        copy.version = self.version
+        return copy
+
+    def iter_chunks(self, start=0, end=None):
+        self._reindex()
+        end = len(self) if end is None else min(end, len(self))
+        index = max(bisect_right(self._starts, start) - 1, 0)
+        while index < len(self._pieces) and self._starts[index] < end:
+            buffer, piece_start, length, _ = self._pieces[index]
+            lo = piece_start + max(start - self._starts[index], 0)
+            hi = piece_start + min(end - self._starts[index], length)
+            for chunk_start in range(lo, hi, self.CHUNK_SIZE):
+                yield buffer[chunk_start : min(chunk_start + self.CHUNK_SIZE, hi)]
+            index += 1
+
+    def get(self, start=0, end=None):
+        return "".join(self.iter_chunks(start, end))
+
+    def text(self):
+        return self.get()
+
+    def iter_lines(self, start=0):
+        pending = []
+        for chunk in self.iter_chunks(start):
+            parts = chunk.split("\n")
+            if len(parts) > 1:
+                pending.append(parts[0])
+                yield "".join(pending)
+                yield from parts[1:-1]
+                pending = []
+            pending.append(parts[-1])
+        yield "".join(pending)
+
+    def line(self, number):
+        start = self.offset_of(number, 0)
+        if number >= self.line_count:
+            return self.get(start)
+        return self.get(start, self.offset_of(number + 1, 0) - 1)
+
+    def offset_of(self, line, column=0):
+        self._reindex()
+        wanted = line - 1  # newlines before the start of the line
+        if wanted <= 0:
+            return max(column, 0) if wanted == 0 else 0
+        if wanted > self._lines[-1]:
+            return len(self) + 1  # Tk's index for the dummy line after "end-1c"
+        index = bisect_left(self._lines, wanted) - 1
+        buffer, start, length, _ = self._pieces[index]
+        skip = wanted - self._lines[index]
+        if len(buffer) > 65536:
+            positions = self._newline_positions(buffer)
+            newline = positions[bisect_left(positions, start) + skip - 1]
+        else:
+            newline = start - 1
+            for _ in range(skip):
+                newline = buffer.index("\n", newline + 1)
+        return self._starts[index] + newline - start + 1 + column
+
+    def position(self, offset):
+        self._reindex()
+        offset = min(max(offset, 0), len(self))
+        index = min(bisect_right(self._starts, offset) - 1, len(self._pieces) - 1)
+        if index < 0:
+            return 1, offset
+        buffer, start, _, _ = self._pieces[index]
+        inner = offset - self._starts[index]
+        line = (
+            self._lines[index] + self._count_newlines(buffer, start, start + inner) + 1
+        )
+        return line, offset - self.offset_of(line, 0)
+
+
+def count_words(text):
+    if OBJECT_CHAR in text:
+        text = text.replace(OBJECT_CHAR, " ")
+    return len(text.split())
+
+
+class DocumentStats:
+    """Word count kept current from edit deltas; chars and lines come from
+    the document itself."""
+
+    def __init__(self):
+        self.words = 0
+
+    def apply(self, document, edit):
+        # Only the lines touched by the edit are recounted. Line breaks are
+        # word breaks, so the rest of the document cannot change.
+        end = edit.offset + len(edit.inserted)
+        start = document.offset_of(document.position(edit.offset)[0], 0)
+        last_line = document.position(end)[0]
+        if last_line >= document.line_count:
+            stop = len(document)
+        else:
+            stop = document.offset_of(last_line + 1, 0) - 1
+        prefix = document.get(start, edit.offset)
+        suffix = document.get(end, stop)
+        self.words += count_words(document.get(start, stop)) - count_words(
+            prefix + edit.removed + suffix
+        )
+
+
+Style = namedtuple("Style", "family size bold italic underline foreground background")
+PLAIN_STYLE = Style(None, None, False, False, False, None, None)
+
+
+class StyleTable:
+    """Gives each style combination in use one name (style_<n>).
+
+    A name is never handed out twice, so a style that is forgotten and
+    comes back gets a fresh one.
+    """
+
+    def __init__(self):
+        self._tags = {}  # Style -> tag name
+        self._styles = {}  # tag name -> Style
+        self._next = 0
+
+    def __len__(self):
+        return len(self._styles)
+
+    def intern(self, style):
+        tag = self._tags.get(style)
+        if tag is None:
+            tag = f"style_{self._next}"
+            self._next += 1
+            self._tags[style] = tag
+            self._styles[tag] = style
+        return tag
+
+    def forget(self, tag):
+        del self._tags[self._styles.pop(tag)]
+
+    def is_style_tag(self, tag):
+        return tag in self._styles
+
+    def style_of(self, tag):
+        return self._styles[tag]
+
+
+# The newest undo steps stay as plain edits; older ones are compressed
+UNDO_PLAIN_STEPS = 50
+# Rough bytes of bookkeeping per edit, on top of its text
+UNDO_EDIT_OVERHEAD = 100
+WORD_CHAR = re.compile(r"\w")
+
+
+def edits_size(edits):
+    return sum(
+        len(edit.removed) + len(edit.inserted) + UNDO_EDIT_OVERHEAD for edit in edits
+    )
+
+
+class UndoHistory:
+    """Bounded undo and redo for one document.
+
+    A step is a list of TextEdits. Typing and deleting run on into the same
+    step until a new word starts, as long as autoseparators is set; otherwise
+    only separator() ends a step. At most max_steps are kept. Past
+    memory_limit bytes the oldest compressed steps go to a temp file when
+    spill is set and are dropped when it is not. Redo steps are kept as they
+    are until the next edit clears them.
+    """
+
+    def __init__(self, max_steps=1000, memory_limit=32 * 1024 * 1024, spill=False):
+        self.max_steps = max(max_steps, 1)
+        self.memory_limit = memory_limit
+        self.spill = spill
+        self.autoseparators = True
+        self._recent = deque()  # plain steps, oldest first
+        self._old = deque()  # compressed steps: bytes, or (offset, length) spilled
+        self._spilled = 0  # the first _spilled entries of _old are on disk
+        self._spill_file = None
+        self._spill_live = 0  # bytes of the spill file those entries use
+        self._redo = []
+        self._memory = 0
+        self._open = False  # whether the newest step takes further edits
+
+    def __len__(self):
+        return len(self._old) + len(self._recent)
+
+    def record(self, edit):
+        if OBJECT_CHAR in edit.removed or OBJECT_CHAR in edit.inserted:
+            # Images and tables cannot be put back from their text
+            self.reset()
+            return
+        self._redo.clear()
+        if self._open and (
+            not self.autoseparators or self._continues(self._recent[-1][-1], edit)
+        ):
+            self._recent[-1].append(edit)
+        else:
+            self._recent.append([edit])
+        self._open = True
+        self._memory += edits_size([edit])
+        self._trim()
+
+    @staticmethod
+    def _continues(last, edit):
+        if not last.removed and not edit.removed and len(edit.inserted) == 1:
+            # Typing: a step ends where a new word starts
+            starts_word = WORD_CHAR.match(edit.inserted) and not WORD_CHAR.match(
+                last.inserted
+            )
+            return (
+                len(last.inserted) == 1
+                and edit.offset == last.offset + 1
+                and not starts_word
+            )
+        if not last.inserted and not edit.inserted and len(edit.removed) == 1:
+            # Backspace or Delete held down
+            return edit.offset in (last.offset, last.offset - 1)
+        # Typing over a selection
+        return not edit.removed and len(last.removed) > 1 and edit.offset == last.offset
+
+    def separator(self):
+        self._open = False
+
+    def undo(self):
+        # The edits that take back the newest step, in the order to apply
+        # them, or None when there is nothing to undo
+        edits = self._pop()
+        if edits is None:
+            return None
+        self._redo.append(edits)
+        return [TextEdit(e.offset, e.inserted, e.removed) for e in reversed(edits)]
+
+    def redo(self):
+        if not self._redo:
+            return None
+        edits = self._redo.pop()
+        self._recent.append(edits)
+        self._memory += edits_size(edits)
+        self._open = False
+        self._trim()
+        return edits
+
+    def reset(self):
+        self._recent.clear()
+        self._old.clear()
+        self._redo.clear()
+        self._spilled = 0
+        self._spill_live = 0
+        self._memory = 0
+        self._open = False
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def _pop(self):
+        self._open = False
+        if self._recent:
+            edits = self._recent.pop()
+            self._memory -= edits_size(edits)
+            return edits
+        if not self._old:
+            return None
+        entry = self._old.pop()
+        if len(self._old) < self._spilled:
+            # The newest spilled step is the last one in the file
+            offset, length = entry
+            self._spilled -= 1
+            self._spill_live -= length
+            self._spill_file.seek(offset)
+            entry = self._spill_file.read(length)
+            self._spill_file.truncate(offset)
+        else:
+            self._memory -= len(entry)
+        return [TextEdit(*edit) for edit in json.loads(zlib.decompress(entry))]
+
+    def _drop_oldest(self):
+        if self._old:
+            entry = self._old.popleft()
+            if self._spilled:
+                self._spilled -= 1
+                self._spill_live -= entry[1]
+                self._compact_spill()
+            else:
+                self._memory -= len(entry)
+        else:
+            self._memory -= edits_size(self._recent.popleft())
+
+    def _compress_oldest(self):
+        edits = self._recent.popleft()
+        data = zlib.compress(json.dumps(edits).encode("utf-8"))
+        self._memory += len(data) - edits_size(edits)
+        self._old.append(data)
+
+    def _trim(self):
+        while len(self._recent) > UNDO_PLAIN_STEPS:
+            self._compress_oldest()
+        while len(self) > self.max_steps:
+            self._drop_oldest()
+        if self.spill:
+            # Spilled steps cost no memory, so none are dropped for it: the
+            # compressed steps go to disk, then plain ones are compressed to
+            # follow them. Only the newest step is left in memory regardless.
+            while self._memory > self.memory_limit:
+                if self._spilled < len(self._old):
+                    self._spill(self._spilled)
+                elif len(self._recent) > 1:
+                    self._compress_oldest()
+                else:
+                    break
+            return
+        while self._memory > self.memory_limit and len(self) > 1:
+            self._drop_oldest()
+
+    def _spill(self, index):
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(prefix="wln-undo-")
+        data = self._old[index]
+        offset = self._spill_file.seek(0, os.SEEK_END)
+        self._spill_file.write(data)
+        self._old[index] = (offset, len(data))
+        self._spilled += 1
+        self._spill_live += len(data)
+        self._memory -= len(data)
+
+    def _compact_spill(self):
+        # Dropped steps leave their bytes at the start of the file; once
+        # those outweigh the steps still in it, the file is rewritten
+        size = self._spill_file.seek(0, os.SEEK_END)
+        if size - self._spill_live <= self._spill_live:
+            return
+        old, self._spill_file = self._spill_file, tempfile.TemporaryFile(
+            prefix="wln-undo-"
+        )
+        with old:
+            for index in range(self._spilled):
+                offset, length = self._old[index]
+                old.seek(offset)
+                self._old[index] = (self._spill_file.tell(), length)
+                self._spill_file.write(old.read(length))
+
+
+def _umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# What open() would create a new file with; mkstemp files are owner-only
+NEW_FILE_MODE = 0o666 & ~_umask()
+
+
+def write_temp_file(
+    path, write, binary=False, encoding=None, errors=None, newline=None
+):
+    # Calls write(file) on a temp file next to path and fsyncs it; returns
+    # the temp file path
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".~", suffix=".tmp", dir=directory)
+    try:
+        mode = "wb" if binary else "w"
+        with os.fdopen(
+            fd, mode, encoding=encoding, errors=errors, newline=newline
+        ) as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return temp_path
+
+
+def replace_file(temp_path, path):
+    if os.path.exists(path):
+        shutil.copymode(path, temp_path)
+    else:
+        os.chmod(temp_path, NEW_FILE_MODE)
+    os.replace(temp_path, path)
+    if os.name == "posix":
+        # Make the rename itself durable
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def atomic_write(path, chunks, binary=False, encoding=None, errors=None):
+    temp_path = write_temp_file(
+        path, lambda file: file.writelines(chunks), binary, encoding, errors
+    )
+    replace_file(temp_path, path)
+
+
+class TableModel:
+    """Cells of a table, stored column by column.
+
+    Rows may be appended from a worker thread while the table is on screen;
+    `rows` only counts rows that are complete in every column.
+    """
+
+    def __init__(self, header):
+        self.header = list(header)
+        self.columns = [[] for _ in self.header]
+        self.rows = 0
+        self.loading = False
+        self.error = None
+
+    @classmethod
+    def blank(cls, rows, cols):
+        model = cls(f"Column {number + 1}" for number in range(cols))
+        model.columns = [[""] * rows for _ in range(cols)]
+        model.rows = rows
+        return model
+
+    def append(self, row):
+        width = len(self.columns)
+        row = list(row[:width]) + [""] * (width - len(row))
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        self.rows += 1
+
+    def load_rows(self, file, rows):
+        # Runs on a worker thread and closes file when done
+        try:
+            with file:
+                for row in rows:
+                    self.append(row)
+        except (OSError, ValueError, csv.Error) as e:
+            self.error = e
+        finally:
+            self.loading = False
+
+    def cell(self, row, column):
+        # Row -1 is the header
+        if row < 0:
+            return self.header[column]
+        return self.columns[column][row]
+
+    def set_cell(self, row, column, value):
+        if row < 0:
+            self.header[column] = value
+        else:
+            self.columns[column][row] = value
+
+    def copy(self):
+        # For saving on a worker thread while the table stays editable
+        model = TableModel(self.header)
+        model.columns = [column[: self.rows] for column in self.columns]
+        model.rows = self.rows
+        return model
+
+    def iter_rows(self, limit=None):
+        count = self.rows if limit is None else min(limit, self.rows)
+        return islice(zip(*self.columns), count)
+
+    def iter_markdown(self):
+        def line(cells):
+            cells = (str(cell).replace("|", "\\|").replace("\n", " ") for cell in cells)
+            return "| " + " | ".join(cells) + " |\n"
+
+        yield line(self.header)
+        yield "|" + " --- |" * len(self.header) + "\n"
+        for row in self.iter_rows():
+            yield line(row)
+
+    def write_csv(self, file, delimiter=","):
+        writer = csv.writer(file, delimiter=delimiter, lineterminator="\n")
+        writer.writerow(self.header)
+        writer.writerows(self.iter_rows())
+
+
+def open_delimited(path):
+    # Returns the open file and a csv reader over it. TSV files go by their
+    # extension; anything else has its delimiter sniffed from the start.
+    file = open(path, newline="", encoding="utf-8-sig", errors="replace")
+    if path.lower().endswith((".tsv", ".tab")):
+        delimiter = "\t"
+    else:
+        sample = file.read(64 * 1024)
+        file.seek(0)
+        try:
+            delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+        except csv.Error:
+            delimiter = ","
+    return file, csv.reader(file, delimiter=delimiter)
+
+
+def text_with_tables(snapshot, tables):
+    # The document's text with each table, given as (offset, TableModel),
+    # written out as markdown in place of its OBJECT_CHAR
+    position = 0
+    for offset, table in sorted(tables, key=lambda entry: entry[0]):
+        for chunk in snapshot.iter_chunks(position, offset):
+            yield chunk.replace(OBJECT_CHAR, "")
+        yield from table.iter_markdown()
+        position = offset + 1
+    for chunk in snapshot.iter_chunks(position):
+        yield chunk.replace(OBJECT_CHAR, "")
+
+
+def config_dir(*parts):
+    # Per-user directory for settings, caches and recovery journals
+    if os.name == "nt":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    else:
+        base = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    path = os.path.join(base, "word-like-notepad", *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# Native format: a zip holding the plain text and a table of style runs
+RICH_EXTENSION = ".wln"
+
+
+def write_rich_document(path, snapshot, styles, tables=()):
+    # tables are {"offset", "model"} entries; each model is stored as CSV
+    styles = dict(
+        styles,
+        tables=[
+            {"offset": entry["offset"], "file": f"tables/{number}.csv"}
+            for number, entry in enumerate(tables)
+        ],
+    )
+
+    def write(file):
+        with zipfile.ZipFile(file, "w", zipfile.ZIP_DEFLATED) as archive:
+            with archive.open("text.txt", "w") as member:
+                for chunk in snapshot.iter_chunks():
+                    member.write(chunk.encode("utf-8"))
+            for entry, saved in zip(tables, styles["tables"]):
+                with archive.open(saved["file"], "w") as member:
+                    with io.TextIOWrapper(member, "utf-8", newline="") as text:
+                        entry["model"].write_csv(text)
+            archive.writestr("styles.json", json.dumps(styles, separators=(",", ":")))
+
+    replace_file(write_temp_file(path, write, binary=True), path)
+
+
+def read_rich_document(path):
+    with zipfile.ZipFile(path) as archive:
+        text = archive.read("text.txt").decode("utf-8")
+        styles = json.loads(archive.read("styles.json"))
+        for entry in styles.get("tables", []):
+            with archive.open(entry["file"]) as member:
+                rows = csv.reader(io.TextIOWrapper(member, "utf-8", newline=""))
+                entry["model"] = TableModel(next(rows, []))
+                for row in rows:
+                    entry["model"].append(row)
+    return text, styles
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class EditJournal:
+    """Append-only log of the edits made since the document was last loaded
+    or saved, replayed on the next start if the editor dies.
+
+    The first line names the base file and its stamp; each following line
+    is an edit as [offset, removed length, inserted text].
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8")
+        if os.name != "nt":
+            # Held until the journal is closed, or the process dies
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def reset(self, base_path, stamp=None):
+        with self._lock:
+            self._pending = []
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.write(json.dumps({"base": base_path, "stamp": stamp}) + "\n")
+            self._file.flush()
+
+    def record(self, edit):
+        self._pending.append([edit.offset, len(edit.removed), edit.inserted])
+
+    def rebase(self, base_path, stamp, saved, current):
+        # Starts over from a file just written from the snapshot saved,
+        # carrying over what was edited in current since. A base of None
+        # means the file cannot be replayed onto, so the whole text goes in.
+        self.reset(base_path, stamp)
+        if base_path is None:
+            self.record(TextEdit(0, "", current.text()))
+        elif current.version != saved.version:
+            old = saved.text()
+            for start, end, text in reversed(diff_hunks(old, current.text())):
+                self.record(TextEdit(start, old[start:end], text))
+        self.flush()
+
+    def flush(self):
+        # Safe to call from a worker thread
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if pending:
+                self._file.write("".join(json.dumps(entry) + "\n" for entry in pending))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def discard(self):
+        with self._lock:
+            self._file.close()
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def replay(path):
+        # Returns (base path, recovered text); raises ValueError if the base
+        # file no longer matches what the journal was written against.
+        with open(path, encoding="utf-8") as file:
+            header = json.loads(file.readline())
+            base, stamp = header["base"], header["stamp"]
+            edits = []
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # torn final write
+                if isinstance(entry, dict):
+                    stamp = entry["stamp"]  # saved-at records of older versions
+                else:
+                    edits.append(entry)
+        if base is None:
+            document = Document()
+        elif stamp is None or not os.path.exists(base) or file_stamp(base) != stamp:
+            raise ValueError(f"{base} has changed since the journal was written")
+        elif base.endswith(RICH_EXTENSION):
+            document = Document(read_rich_document(base)[0])
+        else:
+            document = Document(read_text(base))
+        for offset, removed, inserted in edits:
+            document.delete(offset, offset + removed)
+            document.insert(offset, inserted)
+        return base, document.text()
+
+
+def journal_in_use(path):
+    # Asks the journal itself rather than whether the process that wrote
+    # it is alive: its PID may belong to another process by now
+    if os.name == "nt":
+        # A running editor keeps its journal open, which blocks renaming it
+        try:
+            os.rename(path, path + ".check")
+            os.rename(path + ".check", path)
+            return False
+        except OSError:
+            return True
+    try:
+        with open(path, "rb") as file:
+            fcntl.flock(file.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True  # an editor holds the lock EditJournal takes
+    except OSError:
+        return True  # gone or unreadable: nothing to recover from it
+    return False
+
+
+SETTINGS_DEFAULTS = {
+    "font_family": "Arial",
+    "font_size": 12,
+    "theme": "light",
+    # Undo history per tab; spilling keeps old steps in a temp file instead
+    # of dropping them once the memory cap is reached
+    "undo_steps": 1000,
+    "undo_memory_mb": 32,
+    "undo_spill": False,
+}
+SETTINGS_DEBOUNCE_MS = 1000
+# Where older versions kept settings, relative to the working directory
+LEGACY_SETTINGS_FILES = ("settings.json", "word_like_notepad_settings.json")
+
+
+class SettingsStore:
+    """Settings loaded once and kept in memory.
+
+    Changes are written back after SETTINGS_DEBOUNCE_MS of quiet, so a burst
+    of font or theme changes costs a single atomic write.
+    """
+
+    def __init__(self, master, executor=None, path=None):
+        self.master = master
+        self.executor = executor
+        self.path = path or os.path.join(config_dir(), "settings.json")
+        self._values = dict(SETTINGS_DEFAULTS)
+        self._values.update(self._read())
+        self._pending = None
+        # Writes run on the executor and may overlap; each snapshot gets a
+        # version so an older one never replaces a newer one on disk
+        self._version = 0
+        self._written = 0
+        self._write_lock = threading.Lock()
+
+    def _read(self):
+        candidates = [self.path]
+        if not os.path.exists(self.path):
+            candidates += LEGACY_SETTINGS_FILES
+        for path in candidates:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    values = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if isinstance(values, dict):
+                return values
+        return {}
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __setitem__(self, key, value):
+        if self._values.get(key) != value:
+            self._values[key] = value
+            self.schedule_save()
+
+    def schedule_save(self):
+        if self._pending is not None:
+            self.master.after_cancel(self._pending)
+        self._pending = self.master.after(SETTINGS_DEBOUNCE_MS, self._save)
+
+    def _save(self, background=True):
+        self._pending = None
+        self._version += 1
+        data = json.dumps(self._values, indent=2)
+        if background and self.executor is not None:
+            self.executor.submit(self._write, data, self._version)
+        else:
+            self._write(data, self._version)
+
+    def _write(self, data, version):
+        with self._write_lock:
+            if version < self._written:
+                return
+            self._written = version
+            try:
+                atomic_write(self.path, [data], encoding="utf-8")
+            except OSError as e:
+                print(f"Unable to save settings: {e}")
+
+    def flush(self):
+        # Waits for a write already running on the executor, then writes
+        # the current values
+        if self._pending is not None:
+            self.master.after_cancel(self._pending)
+            self._save(background=False)
+
+
+# Images are shown, and exported to PDF, no bigger than this
+IMAGE_MAX_SIZE = (300, 300)
+
+
+def decode_thumbnail(path, size=IMAGE_MAX_SIZE):
+    # Runs on a worker thread. draft() lets JPEG decode at a reduced scale,
+    # so big photos are never decoded at full resolution.
+    from PIL import Image
+
+    image = Image.open(path)
+    image.draft("RGB", size)
+    image.thumbnail(size)
+    return image
+
+
+# Bytes of an image base64-encoded per piece of HTML; a multiple of 3
+EXPORT_IMAGE_BLOCK = 3 * 16 * 1024
+
+ExportStyle = namedtuple(
+    "ExportStyle",
+    "family size bold italic underline overstrike foreground background",
+)
+
+
+class ExportJob:
+    """An export streamed into a temp file and renamed into place when done.
+
+    chunks is the generator of output bytes; step() writes from it until a
+    deadline, so the UI thread can do the work in slices.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, self.temp_path = tempfile.mkstemp(prefix=".~", suffix=".tmp", dir=directory)
+        self.file = os.fdopen(fd, "wb")
+        self.chunks = None
+        self.progress = 0.0
+
+    def step(self, deadline):
+        # True once everything has been written
+        for chunk in self.chunks:
+            self.file.write(chunk)
+            if time.perf_counter() >= deadline:
+                return False
+        return True
+
+    def finish(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        replace_file(self.temp_path, self.path)
+
+    def cancel(self):
+        if self.chunks is not None:
+            self.chunks.close()
+        self.file.close()
+        os.unlink(self.temp_path)
+
+
+def css_for(style):
+    family = style.family.replace("'", "").replace('"', "")
+    rules = [f"font-family: '{family}'", f"font-size: {style.size:g}pt"]
+    if style.bold:
+        rules.append("font-weight: bold")
+    if style.italic:
+        rules.append("font-style: italic")
+    decorations = [
+        name
+        for name, enabled in (
+            ("underline", style.underline),
+            ("line-through", style.overstrike),
+        )
+        if enabled
+    ]
+    if decorations:
+        rules.append("text-decoration: " + " ".join(decorations))
+    if style.foreground:
+        rules.append(f"color: {style.foreground}")
+    if style.background:
+        rules.append(f"background-color: {style.background}")
+    return "; ".join(rules)
+
+
+def iter_html(items, base, title):
+    # The document as pieces of HTML: one span per run of a style, images
+    # inlined as data URIs and tables as HTML tables
+    yield (
+        '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+        f"<title>{html.escape(title)}</title>\n</head>\n<body>\n"
+        f'<div style="white-space: pre-wrap; {css_for(base)}">'
+    )
+    current = base
+    for item in items:
+        if item[0] == "text":
+            style = item[2]
+            if style != current:
+                if current != base:
+                    yield "</span>"
+                if style != base:
+                    yield f'<span style="{css_for(style)}">'
+                current = style
+            yield html.escape(item[1], quote=False)
+        elif item[0] == "image":
+            yield from iter_html_image(*item[1:])
+        elif item[0] == "table":
+            if current != base:
+                yield "</span>"
+                current = base
+            yield from iter_html_table(item[1])
+    if current != base:
+        yield "</span>"
+    yield "</div>\n</body>\n</html>\n"
+
+
+def iter_html_image(path, size):
+    try:
+        file = open(path, "rb")
+    except OSError:
+        return  # the image file is gone; leave it out
+    with file:
+        mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        yield (
+            f'<img width="{size[0]}" height="{size[1]}" alt="" '
+            f'src="data:{mime};base64,'
+        )
+        while True:
+            data = file.read(EXPORT_IMAGE_BLOCK)
+            if not data:
+                break
+            yield base64.b64encode(data).decode("ascii")
+    yield '">'
+
+
+def iter_html_table(model):
+    def row(tag, cells):
+        cells = "".join(f"<{tag}>{html.escape(str(cell))}</{tag}>" for cell in cells)
+        return f"<tr>{cells}</tr>\n"
+
+    yield '<table border="1" style="border-collapse: collapse; white-space: normal">\n'
+    yield row("th", model.header)
+    for cells in model.iter_rows():
+        yield row("td", cells)
+    yield "</table>"
+
+
+def iter_large_export_items(job, base, view, overlay):
+    # Paged files carry no formatting; their text comes from the view,
+    # with the edited pages from a copy of its overlay
+    decoder = codecs.getincrementaldecoder(view.encoding)(
+        errors=codec_errors(view.encoding)
+    )
+    pending = ""  # a trailing "\r" that may be half of a "\r\n"
+    done = 0
+    for data in view.iter_chunks(overlay):
+        done += len(data)
+        text = pending + decoder.decode(data)
+        pending = ""
+        if text.endswith("\r"):
+            text, pending = text[:-1], "\r"
+        yield "text", text.replace("\r\n", "\n").replace("\r", "\n"), base
+        job.progress = min(done / max(view.size, 1), 1)
+    if pending:
+        yield "text", "\n", base
+
+
+PDF_PAGE_SIZE = (612, 792)  # US Letter, in points
+PDF_MARGIN = 54
+# The 14 standard fonts need no embedding; each family comes as regular,
+# bold, italic and bold italic
+PDF_FONTS = (
+    "Helvetica",
+    "Helvetica-Bold",
+    "Helvetica-Oblique",
+    "Helvetica-BoldOblique",
+    "Times-Roman",
+    "Times-Bold",
+    "Times-Italic",
+    "Times-BoldItalic",
+    "Courier",
+    "Courier-Bold",
+    "Courier-Oblique",
+    "Courier-BoldOblique",
+)
+PDF_FONT_FAMILIES = ("Helvetica", "Times", "Courier")
+SERIF_HINTS = ("times", "serif", "georgia", "garamond", "cambria", "book")
+MONO_HINTS = ("courier", "mono", "consol", "fixed", "typewriter")
+PDF_WORD = re.compile(r"\S+\s*|\s+")
+
+
+def pdf_font(style):
+    # Index into PDF_FONTS of the standard font closest to style
+    family = style.family.lower()
+    if any(hint in family for hint in MONO_HINTS):
+        first = 8
+    elif any(hint in family for hint in SERIF_HINTS) and "sans" not in family:
+        first = 4
+    else:
+        first = 0
+    return first + style.bold + 2 * style.italic
+
+
+def pdf_string(text):
+    data = text.encode("cp1252", "replace").replace(b"\\", b"\\\\")
+    data = data.replace(b"(", b"\\(").replace(b")", b"\\)")
+    return b"(" + data.replace(b"\r", b"\\r") + b")"
+
+
+def pdf_color(color):
+    red, green, blue = (int(color[i : i + 2], 16) / 255 for i in (1, 3, 5))
+    return b"%.3f %.3f %.3f" % (red, green, blue)
+
+
+class PdfWriter:
+    """Lays export items out on pages and yields the PDF file piece by piece.
+
+    Each page is written out as soon as it is full, so only the current page
+    is held in memory. measure(font, text) gives the width of text set in
+    PDF_FONTS[font] at size 1. Text outside Windows-1252, the encoding of the
+    standard fonts, comes out as "?".
+    """
+
+    LINE_SPACING = 1.2
+
+    def __init__(self, measure, base):
+        self.measure = measure
+        self.base = base
+        self.width = PDF_PAGE_SIZE[0] - 2 * PDF_MARGIN
+        self.offsets = {}  # object number -> byte offset in the file
+        self.position = 0
+        # 1 is the catalog, 2 the page tree, then one object per font
+        self.next_object = 3 + len(PDF_FONTS)
+        self.pages = []
+        self.line = []  # boxes waiting to be set on the current line
+        self.x = 0
+
+    def _object(self, number, body, stream=None):
+        self.offsets[number] = self.position
+        data = b"%d 0 obj\n%s" % (number, body)
+        if stream is not None:
+            data += b"\nstream\n" + stream + b"\nendstream"
+        data += b"\nendobj\n"
+        self.position += len(data)
+        return data
+
+    def _new_object(self):
+        self.next_object += 1
+        return self.next_object - 1
+
+    def write(self, items):
+        header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        self.position = len(header)
+        yield header
+        for number, name in enumerate(PDF_FONTS, 3):
+            yield self._object(
+                number,
+                b"<< /Type /Font /Subtype /Type1 /BaseFont /%s "
+                b"/Encoding /WinAnsiEncoding >>" % name.encode("ascii"),
+            )
+        self._start_page()
+        table_style = self.base._replace(
+            family="Courier",
+            bold=False,
+            italic=False,
+            underline=False,
+            overstrike=False,
+            foreground=None,
+            background=None,
+        )
+        for item in items:
+            if item[0] == "text":
+                yield from self._add_text(item[1], item[2])
+            elif item[0] == "image":
+                yield from self._add_image(*item[1:])
+            elif item[0] == "table":
+                # Set as its markdown, in a fixed-width font
+                for line in item[1].iter_markdown():
+                    yield from self._add_text(line, table_style)
+        if self.line:
+            yield from self._end_line()
+        yield from self._finish_page()
+
+        kids = b" ".join(b"%d 0 R" % number for number in self.pages)
+        yield self._object(
+            2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.pages))
+        )
+        yield self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self.position
+        yield b"xref\n0 %d\n0000000000 65535 f \n" % self.next_object
+        for number in range(1, self.next_object):
+            yield b"%010d 00000 n \n" % self.offsets[number]
+        yield b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            self.next_object,
+            xref,
+        )
+
+    def _start_page(self):
+        self.ops = []
+        self.page_images = {}  # resource name -> object number
+        self.y = PDF_PAGE_SIZE[1] - PDF_MARGIN
+
+    def _finish_page(self):
+        content = zlib.compress(b"".join(self.ops))
+        contents = self._new_object()
+        yield self._object(
+            contents, b"<< /Length %d /Filter /FlateDecode >>" % len(content), content
+        )
+        fonts = b" ".join(
+            b"/F%d %d 0 R" % (index, number)
+            for index, number in enumerate(range(3, 3 + len(PDF_FONTS)))
+        )
+        images = b" ".join(
+            b"/%s %d 0 R" % (name.encode("ascii"), number)
+            for name, number in self.page_images.items()
+        )
+        page = self._new_object()
+        yield self._object(
+            page,
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << %s >> /XObject << %s >> >> /Contents %d 0 R >>"
+            % (*PDF_PAGE_SIZE, fonts, images, contents),
+        )
+        self.pages.append(page)
+
+    def _add_text(self, text, style):
+        font_index = pdf_font(style)
+        size = style.size
+        for number, part in enumerate(text.replace("\t", "    ").split("\n")):
+            if number:
+                yield from self._end_line()
+            for word in PDF_WORD.findall(part):
+                if self.x + self._width(word.rstrip(), style) > self.width:
+                    if self.line:
+                        yield from self._end_line()
+                for piece in self._split_long(word, font_index, size):
+                    if self.line and self.x + self._width(piece, style) > self.width:
+                        yield from self._end_line()
+                    self._place_text(piece, style)
+
+    def _width(self, text, style):
+        return self.measure(pdf_font(style), text) * style.size
+
+    def _split_long(self, word, font_index, size):
+        # A word wider than a line is broken wherever it has to be
+        if self.measure(font_index, word) * size <= self.width:
+            return [word]
+        pieces, current, width = [], "", 0
+        for char in word:
+            char_width = self.measure(font_index, char) * size
+            if current and width + char_width > self.width:
+                pieces.append(current)
+                current, width = "", 0
+            current += char
+            width += char_width
+        pieces.append(current)
+        return pieces
+
+    def _place_text(self, text, style):
+        width = self._width(text, style)
+        if self.line and self.line[-1][0] == "text" and self.line[-1][2] == style:
+            _, previous, _, previous_width = self.line[-1]
+            self.line[-1] = ("text", previous + text, style, previous_width + width)
+        else:
+            self.line.append(("text", text, style, width))
+        self.x += width
+
+    def _add_image(self, path, size):
+        try:
+            image = decode_thumbnail(path, size).convert("RGB")
+        except (ImportError, OSError):
+            return  # no PIL, or the file is gone: leave the image out
+        number = self._new_object()
+        data = zlib.compress(image.tobytes())
+        yield self._object(
+            number,
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d "
+            b"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode "
+            b"/Length %d >>" % (*image.size, len(data)),
+            data,
+        )
+        # Screen pixels at 96 dpi, shrunk to fit the page if need be
+        width, height = image.size[0] * 0.75, image.size[1] * 0.75
+        fit = min(1, self.width / width, (PDF_PAGE_SIZE[1] - 2 * PDF_MARGIN) / height)
+        width, height = width * fit, height * fit
+        if self.line and self.x + width > self.width:
+            yield from self._end_line()
+        self.line.append(("image", number, width, height))
+        self.x += width
+
+    def _end_line(self):
+        sizes = [box[2].size for box in self.line if box[0] == "text"]
+        images = [box[3] for box in self.line if box[0] == "image"]
+        if not sizes and not images:
+            sizes = [self.base.size]
+        ascent = max([size * 0.9 for size in sizes] + images)
+        descent = max(sizes, default=0) * (self.LINE_SPACING - 0.9)
+        if self.y - ascent - descent < PDF_MARGIN and self.ops:
+            yield from self._finish_page()
+            self._start_page()
+        baseline = self.y - ascent
+        x = PDF_MARGIN
+        for box in self.line:
+            if box[0] == "image":
+                _, number, width, height = box
+                name = f"Im{number}"
+                self.page_images[name] = number
+                self.ops.append(
+                    b"q %.2f 0 0 %.2f %.2f %.2f cm /%s Do Q\n"
+                    % (width, height, x, baseline, name.encode("ascii"))
+                )
+            else:
+                self._draw_text(box, x, baseline)
+            x += box[-1] if box[0] == "text" else box[2]
+        self.y = baseline - descent
+        self.line = []
+        self.x = 0
+
+    def _draw_text(self, box, x, baseline):
+        _, text, style, width = box
+        size = style.size
+        if style.background:
+            self.ops.append(
+                b"%s rg %.2f %.2f %.2f %.2f re f\n"
+                % (
+                    pdf_color(style.background),
+                    x,
+                    baseline - size * 0.25,
+                    width,
+                    size * 1.15,
+                )
+            )
+        color = pdf_color(style.foreground) if style.foreground else b"0 0 0"
+        self.ops.append(
+            b"BT /F%d %.2f Tf %s rg %.2f %.2f Td %s Tj ET\n"
+            % (pdf_font(style), size, color, x, baseline, pdf_string(text))
+        )
+        for enabled, offset in ((style.underline, -0.1), (style.overstrike, 0.3)):
+            if enabled:
+                y = baseline + size * offset
+                self.ops.append(
+                    b"%s RG %.2f w %.2f %.2f m %.2f %.2f l S\n"
+                    % (color, size * 0.05, x, y, x + width, y)
+                )
+
+
+# Word-list files tried in order; the first one found is used
+DICTIONARY_PATHS = (
+    os.path.join(APP_DIR, "dictionary.txt"),
+    "/usr/share/dict/words",
+    "/usr/share/dict/american-english",
+    "/usr/share/dict/british-english",
+)
+SPELL_WORD = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)*")
+
+
+class SpellChecker:
+    """Dictionary lookups with results cached per line."""
+
+    CACHE_SIZE = 100000
+
+    def __init__(self, words=(), path=None):
+        self.words = frozenset(words)
+        self.path = path
+        self._cache = {}
+
+    @classmethod
+    def load(cls, paths=DICTIONARY_PATHS):
+        for path in paths:
+            if os.path.exists(path):
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    return cls((line.strip().lower() for line in f), path)
+        return cls()
+
+    def is_word(self, word):
+        if not self.words:
+            return word.isalpha()
+        word = word.lower()
+        if word in self.words:
+            return True
+        return word.endswith("'s") and word[:-2] in self.words
+
+    def check_line(self, line):
+        # Returns the (start, end) columns of the misspelled words
+        spans = self._cache.get(line)
+        if spans is None:
+            spans = tuple(
+                match.span()
+                for match in SPELL_WORD.finditer(line)
+                if not self.is_word(match.group())
+            )
+            if len(self._cache) >= self.CACHE_SIZE:
+                self._cache.clear()
+            self._cache[line] = spans
+        return spans
+
+    def check_document(self, snapshot, lines=None):
+        # Runs on a worker thread. lines=None checks the whole document.
+        results = {}
+        if lines is None:
+            for number, line in enumerate(snapshot.iter_lines(), 1):
+                spans = self.check_line(line)
+                if spans:
+                    results[number] = spans
+        else:
+            for number in lines:
+                spans = self.check_line(snapshot.line(number))
+                if spans:
+                    results[number] = spans
+        return lines, results
+
+
+# Batch mode: the editor's tools over many files, one process per core
+
+BatchOptions = namedtuple(
+    "BatchOptions", "find replace match_case whole_word regex spell stats"
+)
+
+_spell_checker = None  # loaded once per worker process
+
+
+def _init_worker(spell):
+    global _spell_checker
+    if spell:
+        _spell_checker = SpellChecker.load()
+
+
+def iter_chunk_lines(chunks):
+    # Lines with their "\n", from text chunks that split lines anywhere
+    pending = ""
+    for chunk in chunks:
+        lines = (pending + chunk).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    if pending:
+        yield pending
+
+
+def process_file(path, options):
+    # Runs in a worker process; returns one JSON-ready result
+    encoding, bom = sniff_file(path)
+    try:
+        return _process_file(path, options, encoding, bom, strict=True)
+    except UnicodeDecodeError:
+        # Not UTF-8 past the sniffed start, as FileLoader finds out too
+        return _process_file(path, options, "cp1252", 0)
+
+
+def _process_file(path, options, encoding, bom, strict=False):
+    result = {"path": path, "encoding": encoding}
+    errors = decode_strictly(encoding, bom) if strict else codec_errors(encoding)
+    flags = (options.match_case, options.whole_word, options.regex)
+    find = replace = None
+    if options.find is not None:
+        find = compile_search(options.find, *flags)
+    if options.replace is not None:
+        old, new = options.replace
+        replace = compile_search(old, *flags)
+    misspelled = []
+    matches = replacements = words = chars = newlines = 0
+
+    def expand(match):
+        nonlocal replacements
+        if match.start() == match.end():
+            return ""  # empty matches are skipped, as in the editor
+        replacements += 1
+        return match.expand(new) if options.regex else new
+
+    def scan(lines, out=None):
+        # Lines keep their own line endings so replacing leaves them be; the
+        # other tools see them as "\n", as the editor does
+        nonlocal matches, words, chars, newlines
+        if out is not None and bom:
+            out.write("\ufeff")
+        for number, line in enumerate(lines, 1):
+            if replace is not None:
+                line = replace.sub(expand, line)
+                out.write(line)
+            if "\r" in line:
+                line = line.replace("\r\n", "\n").replace("\r", "\n")
+            if find is not None:
+                matches += sum(1 for match in find.finditer(line) if match.group())
+            if options.spell:
+                for start, end in _spell_checker.check_line(line):
+                    misspelled.append([number, start, line[start:end]])
+            if options.stats:
+                words += count_words(line)
+                chars += len(line)
+                newlines += line.count("\n")
+
+    temp_path = None
+    with open(path, "rb") as file:
+        file.seek(bom)
+        chunks = iter_decoded(file, encoding, errors=errors, translate=False)
+        lines = iter_chunk_lines(chunks)
+        if replace is None:
+            scan(lines)
+        else:
+            # Streamed into a temp file that replaces the original, once it
+            # is closed, only if something changed
+            temp_path = write_temp_file(
+                path,
+                lambda out: scan(lines, out),
+                encoding=encoding,
+                errors=codec_errors(encoding),
+                newline="",
+            )
+    if temp_path is not None:
+        if replacements:
+            replace_file(temp_path, path)
+        else:
+            os.unlink(temp_path)
+    if find is not None:
+        result["matches"] = matches
+    if replace is not None:
+        result["replacements"] = replacements
+    if options.spell:
+        result["misspelled"] = misspelled
+    if options.stats:
+        result["words"] = words
+        result["chars"] = chars
+        result["lines"] = newlines + 1
+    return result
+
+
+def expand_paths(patterns):
+    # Shells on Windows leave wildcards to the program
+    paths = []
+    for pattern in patterns:
+        paths += sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+    return paths
+
+
+def parse_replacement(text):
+    old, separator, new = text.partition("=")
+    if not separator or not old:
+        raise argparse.ArgumentTypeError("expected OLD=NEW")
+    return old, new
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="word-like-notepad batch",
+        description="Run Word Count, Find/Replace and Spell Check over files "
+        "and print one JSON result per line.",
+    )
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--find", metavar="TEXT", help="count matches")
+    parser.add_argument(
+        "--replace",
+        metavar="OLD=NEW",
+        type=parse_replacement,
+        help="replace in place, keeping each file's encoding",
+    )
+    parser.add_argument("--match-case", action="store_true")
+    parser.add_argument("--whole-word", action="store_true")
+    parser.add_argument("--regex", action="store_true")
+    parser.add_argument("--spell", action="store_true", help="list misspelled words")
+    parser.add_argument("--stats", action="store_true", help="count words and lines")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+    options = BatchOptions(
+        args.find,
+        args.replace,
+        args.match_case,
+        args.whole_word,
+        args.regex,
+        args.spell,
+        args.stats,
+    )
+
+    failed = False
+    with ProcessPoolExecutor(
+        args.jobs, initializer=_init_worker, initargs=(args.spell,)
+    ) as executor:
+        futures = {
+            executor.submit(process_file, path, options): path
+            for path in expand_paths(args.files)
+        }
+        # Results are printed as files finish, not in argument order
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except (OSError, ValueError, re.error) as e:
+                # ValueError covers text the file's encoding cannot store
+                result = {"path": futures[future], "error": str(e)}
+                failed = True
+            print(json.dumps(result), flush=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
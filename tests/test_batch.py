@@ -0,0 +1,63 @@
+import codecs
+
+import pytest
+
+from notepad_core import BatchOptions, process_file
+
+
+def replace_options(old, new, **flags):
+    options = dict(
+        find=None,
+        replace=(old, new),
+        match_case=False,
+        whole_word=False,
+        regex=False,
+        spell=False,
+        stats=False,
+    )
+    options.update(flags)
+    return BatchOptions(**options)
+
+
+def test_process_file_keeps_crlf(tmp_path):
+    path = tmp_path / "crlf.txt"
+    path.write_bytes(b"foo one\r\nfoo two\r\n")
+    result = process_file(str(path), replace_options("foo", "bar", stats=True))
+    assert result["replacements"] == 2
+    assert result["lines"] == 3
+    assert result["chars"] == len("bar one\nbar two\n")
+    assert path.read_bytes() == b"bar one\r\nbar two\r\n"
+
+
+def test_process_file_keeps_bom(tmp_path):
+    path = tmp_path / "bom.txt"
+    path.write_bytes(codecs.BOM_UTF16_LE + "foo\n".encode("utf-16-le"))
+    result = process_file(str(path), replace_options("foo", "bär"))
+    assert result["encoding"] == "utf-16-le"
+    assert path.read_bytes() == codecs.BOM_UTF16_LE + "bär\n".encode("utf-16-le")
+
+
+def test_process_file_keeps_cp1252_bytes(tmp_path):
+    path = tmp_path / "cp1252.txt"
+    path.write_bytes(b"foo caf\xe9 \x81\n")
+    result = process_file(str(path), replace_options("foo", "bar"))
+    assert result["encoding"] == "cp1252"
+    assert path.read_bytes() == b"bar caf\xe9 \x81\n"
+
+
+def test_process_file_late_invalid_utf8(tmp_path):
+    path = tmp_path / "late.txt"
+    data = b"foo\n" * 20000 + b"caf\xe9\n"
+    path.write_bytes(data)
+    result = process_file(str(path), replace_options("foo", "bar"))
+    assert result["encoding"] == "cp1252"
+    assert path.read_bytes() == data.replace(b"foo", b"bar")
+
+
+def test_process_file_unencodable_replacement(tmp_path):
+    path = tmp_path / "cp1252.txt"
+    path.write_bytes(b"foo caf\xe9\n")
+    with pytest.raises(UnicodeEncodeError):
+        process_file(str(path), replace_options("foo", "日本"))
+    assert path.read_bytes() == b"foo caf\xe9\n"
+    assert [p.name for p in tmp_path.iterdir()] == ["cp1252.txt"]
@@ -0,0 +1,21 @@
+import pytest
+
+from notepad_core import diff_hunks
+
+
+@pytest.mark.parametrize(
+    "old, new",
+    [
+        ("a\nb\nc\n", "a\nB\nc\n"),
+        ("a\nb\nc\n", "a\nc\n"),
+        ("a\nc", "a\nb\nc\nd"),
+        ("", "new\n"),
+        ("old\n", ""),
+        ("same\n", "same\n"),
+    ],
+)
+def test_diff_hunks_round_trip(old, new):
+    text = old
+    for start, end, replacement in reversed(diff_hunks(old, new)):
+        text = text[:start] + replacement + text[end:]
+    assert text == new
@@ -0,0 +1,59 @@
+from notepad_core import Document
+
+
+def test_document_insert_delete_and_text():
+    document = Document("hello world")
+    document.insert(5, ",")
+    document.insert(len(document), "!")
+    assert document.text() == "hello, world!"
+    assert document.delete(0, 7) == "hello, "
+    assert document.text() == "world!"
+    assert len(document) == 6
+
+
+def test_document_typing_coalesces():
+    document = Document()
+    for offset, char in enumerate("typed\ntext"):
+        document.insert(offset, char)
+    assert document.text() == "typed\ntext"
+    assert document.line_count == 2
+
+
+def test_document_positions_match_tk():
+    text = "first\nsecond line\n\nlast"
+    document = Document()
+    document.insert(0, text[:9])
+    document.insert(9, text[9:])
+    for offset in range(len(text) + 1):
+        line = text.count("\n", 0, offset) + 1
+        column = offset - (text.rfind("\n", 0, offset) + 1)
+        assert document.position(offset) == (line, column)
+        assert document.offset_of(line, column) == offset
+    assert document.line_count == 4
+    assert document.line(2) == "second line"
+    assert document.line(3) == ""
+    assert document.line(4) == "last"
+
+
+def test_document_iter_lines_and_snapshot():
+    document = Document("a\nb")
+    snapshot = document.snapshot()
+    document.insert(3, "\nc")
+    assert list(document.iter_lines()) == ["a", "b", "c"]
+    assert snapshot.text() == "a\nb"
+
+
+def test_document_many_edits_stay_consistent():
+    document = Document()
+    text = ""
+    for step in range(Document.MAX_PIECES + 50):
+        offset = (step * 7919) % (len(text) + 1)
+        piece = f"{step}\n" if step % 3 else "x"
+        document.insert(offset, piece)
+        text = text[:offset] + piece + text[offset:]
+        if step % 5 == 0:
+            end = min(offset + 3, len(text))
+            document.delete(offset, end)
+            text = text[:offset] + text[end:]
+    assert document.text() == text
+    assert document.line_count == text.count("\n") + 1
@@ -0,0 +1,136 @@
+import os
+import re
+import zlib
+
+import notepad_core
+from notepad_core import (
+    NEW_FILE_MODE,
+    ExportJob,
+    ExportStyle,
+    LargeFileView,
+    PdfWriter,
+    TableModel,
+    iter_html,
+    iter_large_export_items,
+)
+
+BASE = ExportStyle("Helvetica", 12, False, False, False, False, None, None)
+
+
+def measure(font, text):
+    return 0.5 * len(text)
+
+
+def write_pdf(items):
+    return b"".join(PdfWriter(measure, BASE).write(items))
+
+
+def test_pdf_xref_offsets_point_at_their_objects():
+    bold = BASE._replace(family="Times New Roman", bold=True, foreground="#ff0000")
+    data = write_pdf([("text", "plain (text) \\ here\n", BASE), ("text", "bold", bold)])
+    xref = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", data).group(1))
+    assert data[xref:].startswith(b"xref\n")
+    count = int(re.match(rb"xref\n0 (\d+)\n", data[xref:]).group(1))
+    entries = re.findall(rb"(\d{10}) 00000 n \n", data[xref:])
+    assert len(entries) == count - 1
+    for number, offset in enumerate(entries, 1):
+        assert data[int(offset) :].startswith(b"%d 0 obj\n" % number)
+
+
+def page_contents(data):
+    streams = re.findall(rb"/FlateDecode >>\nstream\n(.*?)\nendstream", data, re.S)
+    return [zlib.decompress(stream) for stream in streams]
+
+
+def test_pdf_breaks_lines_and_pages():
+    words = " ".join(f"word{number}" for number in range(3000))
+    data = write_pdf([("text", words, BASE)])
+    pages = int(re.search(rb"/Type /Pages /Kids \[[^]]*\] /Count (\d+)", data).group(1))
+    assert pages > 1
+    contents = b"".join(page_contents(data))
+    assert contents.count(b" Tj ET") > pages
+    assert b"word2999)" in contents
+
+
+def test_pdf_escapes_and_picks_fonts():
+    italic = BASE._replace(family="Courier New", italic=True)
+    (content,) = page_contents(write_pdf([("text", "a(b)\\", italic)]))
+    # Courier-Oblique is the tenth standard font
+    assert b"/F10 12.00 Tf" in content
+    assert b"(a\\(b\\)\\\\)" in content
+
+
+def test_pdf_sets_tables_as_markdown():
+    model = TableModel(["h"])
+    model.append(["cell"])
+    (content,) = page_contents(write_pdf([("table", model)]))
+    assert b"/F8 " in content  # Courier
+    assert b"(| cell |)" in content
+
+
+def test_html_spans_and_escaping():
+    bold = BASE._replace(bold=True)
+    html = "".join(
+        iter_html(
+            [("text", "a < b ", BASE), ("text", "bold", bold), ("text", " & c", BASE)],
+            BASE,
+            "<title>",
+        )
+    )
+    assert "<title>&lt;title&gt;</title>" in html
+    assert 'a &lt; b <span style="' in html
+    assert "font-weight: bold" in html
+    assert "bold</span> &amp; c</div>" in html
+
+
+def test_html_tables_and_missing_images(tmp_path):
+    model = TableModel(["<h>"])
+    model.append(["v"])
+    items = [("image", str(tmp_path / "gone.png"), (10, 10)), ("table", model)]
+    html = "".join(iter_html(items, BASE, "t"))
+    assert "<img" not in html
+    assert "<tr><th>&lt;h&gt;</th></tr>\n<tr><td>v</td></tr>" in html
+
+
+def test_html_inlines_images(tmp_path):
+    path = tmp_path / "pixel.png"
+    path.write_bytes(b"\x89PNG fake")
+    html = "".join(iter_html([("image", str(path), (1, 2))], BASE, "t"))
+    assert 'width="1" height="2"' in html
+    assert "data:image/png;base64,iVBORyBmYWtl" in html
+
+
+def test_export_job_writes_in_steps(tmp_path):
+    path = str(tmp_path / "out.html")
+    job = ExportJob(path)
+    job.chunks = iter([b"one", b"two"])
+    while not job.step(0):  # a deadline already past: one chunk per step
+        pass
+    job.finish()
+    with open(path, "rb") as file:
+        assert file.read() == b"onetwo"
+    assert os.stat(path).st_mode & 0o777 == NEW_FILE_MODE
+    assert os.listdir(tmp_path) == ["out.html"]
+
+
+def test_export_job_cancel_leaves_nothing(tmp_path):
+    job = ExportJob(str(tmp_path / "out.pdf"))
+    job.chunks = (chunk for chunk in [b"partial", b"rest"])
+    job.step(0)
+    job.cancel()
+    assert os.listdir(tmp_path) == []
+
+
+def test_large_export_items_normalise_line_endings_across_pages(tmp_path, monkeypatch):
+    monkeypatch.setattr(notepad_core, "LARGE_FILE_PAGE_LINES", 1)
+    path = tmp_path / "big.txt"
+    path.write_bytes(b"one\r\ntwo\r\nthree\r")
+    view = LargeFileView(str(path))
+    view.build_index()
+    job = ExportJob(str(tmp_path / "out.html"))
+    # An edited page may end in a bare "\r"
+    overlay = {0: "ONE\r"}
+    items = list(iter_large_export_items(job, BASE, view, overlay))
+    view.close()
+    job.cancel()
+    assert "".join(item[1] for item in items) == "ONE\ntwo\nthree\n"
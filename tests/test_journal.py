@@ -0,0 +1,132 @@
+import os
+
+import pytest
+
+from notepad_core import (
+    OBJECT_CHAR,
+    Document,
+    EditJournal,
+    TableModel,
+    TextEdit,
+    file_stamp,
+    journal_in_use,
+    read_rich_document,
+    write_rich_document,
+    write_temp_file,
+)
+
+
+def record(journal, document, offset, removed_length, inserted):
+    removed = document.delete(offset, offset + removed_length)
+    document.insert(offset, inserted)
+    journal.record(TextEdit(offset, removed, inserted))
+
+
+def test_replay_an_untitled_document(tmp_path):
+    journal = EditJournal(str(tmp_path / "journal.jsonl"))
+    journal.reset(None)
+    document = Document()
+    record(journal, document, 0, 0, "hello world")
+    record(journal, document, 5, 6, ", there")
+    journal.flush()
+    assert EditJournal.replay(journal.path) == (None, "hello, there")
+
+
+def test_replay_on_top_of_the_saved_file(tmp_path):
+    base = tmp_path / "doc.txt"
+    base.write_text("one\ntwo\n", encoding="utf-8")
+    journal = EditJournal(str(tmp_path / "journal.jsonl"))
+    journal.reset(str(base), file_stamp(str(base)))
+    document = Document("one\ntwo\n")
+    record(journal, document, 4, 3, "2")
+    journal.flush()
+    assert EditJournal.replay(journal.path) == (str(base), "one\n2\n")
+
+
+def test_replay_ignores_a_torn_last_line(tmp_path):
+    journal = EditJournal(str(tmp_path / "journal.jsonl"))
+    journal.reset(None)
+    record(journal, Document(), 0, 0, "kept")
+    journal.flush()
+    with open(journal.path, "a", encoding="utf-8") as file:
+        file.write('[4, 0, "lo')
+    assert EditJournal.replay(journal.path) == (None, "kept")
+
+
+def test_replay_refuses_a_changed_base(tmp_path):
+    base = tmp_path / "doc.txt"
+    base.write_text("original", encoding="utf-8")
+    journal = EditJournal(str(tmp_path / "journal.jsonl"))
+    journal.reset(str(base), file_stamp(str(base)))
+    journal.flush()
+    base.write_text("changed elsewhere", encoding="utf-8")
+    with pytest.raises(ValueError):
+        EditJournal.replay(journal.path)
+
+
+def test_discard_removes_the_file(tmp_path):
+    journal = EditJournal(str(tmp_path / "journal.jsonl"))
+    journal.reset(None)
+    journal.discard()
+    assert not os.path.exists(journal.path)
+
+
+def test_rich_document_round_trip(tmp_path):
+    path = str(tmp_path / "doc.wln")
+    model = TableModel(["a", "b"])
+    model.append(["1", "2"])
+    styles = {"runs": [{"style": [None, 14, True], "ranges": [0, 3]}]}
+    write_rich_document(
+        path, Document("bold\n").snapshot(), styles, [{"offset": 5, "model": model}]
+    )
+    text, loaded = read_rich_document(path)
+    assert text == "bold\n"
+    assert loaded["runs"] == styles["runs"]
+    (table,) = loaded["tables"]
+    assert table["offset"] == 5
+    assert list(table["model"].iter_rows()) == [("1", "2")]
+
+
+def test_a_crash_mid_save_leaves_the_journal_replayable(tmp_path):
+    base = tmp_path / "doc.txt"
+    base.write_text("one\n", encoding="utf-8")
+    journal = EditJournal(str(tmp_path / "journal.jsonl"))
+    journal.reset(str(base), file_stamp(str(base)))
+    document = Document("one\n")
+    record(journal, document, 4, 0, "two\n")
+    journal.flush()
+    # The save got as far as its temp file before the editor died
+    write_temp_file(str(base), lambda file: file.write(document.text()))
+    assert EditJournal.replay(journal.path) == (str(base), "one\ntwo\n")
+
+
+def test_rebase_carries_over_edits_made_while_saving(tmp_path):
+    base = tmp_path / "doc.txt"
+    journal = EditJournal(str(tmp_path / "journal.jsonl"))
+    journal.reset(None)
+    document = Document()
+    record(journal, document, 0, 0, "a\nb\nc\n")
+    snapshot = document.snapshot()
+    base.write_text(snapshot.text(), encoding="utf-8")
+    record(journal, document, 2, 1, "B")
+    record(journal, document, 6, 0, "d\n")
+    journal.rebase(str(base), file_stamp(str(base)), snapshot, document)
+    assert EditJournal.replay(journal.path) == (str(base), "a\nB\nc\nd\n")
+
+
+def test_rebase_without_a_usable_base_keeps_the_whole_text(tmp_path):
+    journal = EditJournal(str(tmp_path / "journal.jsonl"))
+    document = Document(f"text with an object {OBJECT_CHAR}")
+    journal.rebase(None, None, document.snapshot(), document)
+    assert EditJournal.replay(journal.path) == (None, document.text())
+
+
+def test_journal_in_use_only_while_open(tmp_path):
+    # Named after a PID that is alive but did not write the journal
+    path = str(tmp_path / "journal-1-0.jsonl")
+    journal = EditJournal(path)
+    journal.reset(None)
+    journal.flush()
+    assert journal_in_use(path)
+    journal._file.close()  # as if the editor had died
+    assert not journal_in_use(path)
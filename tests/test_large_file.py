@@ -0,0 +1,77 @@
+import pytest
+
+import notepad_core
+from notepad_core import LargeFileView, replace_file, write_temp_file
+
+
+@pytest.fixture
+def small_pages(monkeypatch):
+    monkeypatch.setattr(notepad_core, "LARGE_FILE_PAGE_LINES", 2)
+
+
+def open_view(path, data, encoding="utf-8"):
+    path.write_bytes(data)
+    view = LargeFileView(str(path), encoding)
+    view.build_index()
+    return view
+
+
+def test_index_and_pages(tmp_path, small_pages):
+    view = open_view(tmp_path / "big.txt", b"1\n2\n3\n4\n5")
+    try:
+        assert view.index_complete
+        assert view.line_count == 5
+        assert [view.page_text(page) for page in range(3)] == ["1\n2\n", "3\n4\n", "5"]
+        assert not view.page_available(3)
+    finally:
+        view.close()
+
+
+def test_iter_chunks_uses_overlay_pages(tmp_path, small_pages):
+    view = open_view(tmp_path / "big.txt", b"1\n2\n3\n4\n5\n")
+    try:
+        view.overlay[1] = "three\n"
+        assert b"".join(view.iter_chunks()) == b"1\n2\nthree\n5\n"
+        # A copy taken earlier is not affected by later paging
+        snapshot = dict(view.overlay)
+        view.overlay[0] = "changed\n"
+        assert b"".join(view.iter_chunks(snapshot)) == b"1\n2\nthree\n5\n"
+    finally:
+        view.close()
+
+
+def test_iter_chunks_reencodes(tmp_path, small_pages):
+    view = open_view(tmp_path / "big.txt", b"caf\xe9\n\x81\n", "cp1252")
+    try:
+        view.overlay[0] = "café\n\x81\n"
+        assert b"".join(view.iter_chunks()) == b"caf\xe9\n\x81\n"
+        assert b"".join(view.iter_chunks(encoding="utf-8")) == "café\n\x81\n".encode()
+    finally:
+        view.close()
+
+
+def save_view(view, path):
+    overlay = dict(view.overlay)
+    temp = write_temp_file(
+        path, lambda file: file.writelines(view.iter_chunks(overlay)), True
+    )
+    view.close()
+    replace_file(temp, path)
+    return view.reopened(path)
+
+
+def test_save_then_keep_editing(tmp_path, small_pages):
+    path = tmp_path / "big.txt"
+    view = open_view(path, b"1\n2\n3\n4\n5\n6\n")
+    view.first_page = 1
+    view.overlay[1] = "three\nfour\n"
+    view = save_view(view, str(path))
+    view.build_index()
+    assert view.first_page == 1
+    assert view.overlay == {}
+    assert path.read_bytes() == b"1\n2\nthree\nfour\n5\n6\n"
+    # The reopened view still covers the whole file, so the next save
+    # writes every page, not just the ones that were edited
+    view.overlay[2] = "five\n6\n"
+    save_view(view, str(path)).close()
+    assert path.read_bytes() == b"1\n2\nthree\nfour\nfive\n6\n"
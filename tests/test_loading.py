@@ -0,0 +1,117 @@
+import codecs
+import io
+
+import pytest
+
+from notepad_core import (
+    LOAD_RESTART,
+    FileLoader,
+    codec_errors,
+    iter_decoded,
+    read_file,
+    read_text,
+    sniff_encoding,
+)
+
+# sniff_encoding
+
+
+@pytest.mark.parametrize(
+    "bom, encoding",
+    [
+        (codecs.BOM_UTF8, "utf-8"),
+        (codecs.BOM_UTF16_LE, "utf-16-le"),
+        (codecs.BOM_UTF16_BE, "utf-16-be"),
+        (codecs.BOM_UTF32_LE, "utf-32-le"),
+        (codecs.BOM_UTF32_BE, "utf-32-be"),
+    ],
+)
+def test_sniff_encoding_bom(bom, encoding):
+    assert sniff_encoding(bom + "hi".encode(encoding)) == (encoding, len(bom))
+
+
+def test_sniff_encoding_utf16_without_bom():
+    assert sniff_encoding("hello".encode("utf-16-le")) == ("utf-16-le", 0)
+    assert sniff_encoding("hello".encode("utf-16-be")) == ("utf-16-be", 0)
+
+
+def test_sniff_encoding_utf8_and_cp1252():
+    assert sniff_encoding("café".encode("utf-8")) == ("utf-8", 0)
+    assert sniff_encoding(b"") == ("utf-8", 0)
+    assert sniff_encoding("café au lait".encode("cp1252")) == ("cp1252", 0)
+
+
+def test_sniff_encoding_allows_a_character_cut_at_the_end():
+    assert sniff_encoding("café".encode("utf-8")[:-1]) == ("utf-8", 0)
+
+
+# iter_decoded
+
+
+def test_iter_decoded_normalises_line_endings_across_chunks():
+    data = b"one\r\ntwo\rthree\n"
+    for size in range(1, len(data) + 1):
+        text = "".join(iter_decoded(io.BytesIO(data), "utf-8", chunk_bytes=size))
+        assert text == "one\ntwo\nthree\n"
+
+
+def test_iter_decoded_without_translating():
+    data = b"one\r\ntwo\r"
+    text = "".join(iter_decoded(io.BytesIO(data), "utf-8", 3, translate=False))
+    assert text == "one\r\ntwo\r"
+
+
+def test_iter_decoded_multibyte_split_across_chunks():
+    data = "añb€c".encode("utf-8")
+    assert "".join(iter_decoded(io.BytesIO(data), "utf-8", chunk_bytes=1)) == "añb€c"
+
+
+def test_iter_decoded_keeps_undefined_cp1252_bytes():
+    data = b"caf\xe9 \x81\x8d\x8f\x90\x9d"
+    text = "".join(iter_decoded(io.BytesIO(data), "cp1252"))
+    assert text == "café \x81\x8d\x8f\x90\x9d"
+    assert text.encode("cp1252", codec_errors("cp1252")) == data
+
+
+def test_iter_decoded_strict_raises():
+    with pytest.raises(UnicodeDecodeError):
+        list(iter_decoded(io.BytesIO(b"ok \xe9 not utf-8"), "utf-8", errors="strict"))
+
+
+# Loading files sniffed as UTF-8 that are not
+
+
+def test_read_text_falls_back_past_the_sniffed_start(tmp_path):
+    path = tmp_path / "late.txt"
+    path.write_bytes(b"a" * 70000 + b"\ncaf\xe9\r\n")
+    assert read_text(str(path)).endswith("\ncafé\n")
+
+
+def test_file_loader_restarts_as_cp1252(tmp_path):
+    path = tmp_path / "late.txt"
+    path.write_bytes(b"a" * 300000 + b"\ncaf\xe9\n")
+    loader = FileLoader(str(path))
+    assert loader.encoding == "utf-8"
+    loader.run()
+    parts = []
+    while not loader.chunks.empty():
+        part = loader.chunks.get()
+        parts = [] if part is LOAD_RESTART else parts + [part]
+    assert loader.encoding == "cp1252"
+    assert "".join(parts) == "a" * 300000 + "\ncafé\n"
+
+
+def test_read_file_prefers_the_encoding_it_was_opened_with(tmp_path):
+    path = tmp_path / "reload.txt"
+    path.write_bytes(b"plain\n")
+    assert read_file(str(path), "cp1252") == ("plain\n", "cp1252", False)
+    assert read_file(str(path)) == ("plain\n", "utf-8", False)
+    path.write_bytes("utf-16\n".encode("utf-16-le"))
+    assert read_file(str(path), "cp1252") == ("utf-16\n", "utf-16-le", False)
+    path.write_bytes(b"caf\xc3\xa9\n")
+    assert read_file(str(path), "cp1252") == ("café\n", "utf-8", False)
+    assert read_file(str(path), "utf-16-le") == ("café\n", "utf-8", False)
+    path.write_bytes(b"caf\xe9\n")
+    assert read_file(str(path), "utf-8") == ("café\n", "cp1252", False)
+    path.write_bytes(codecs.BOM_UTF8 + b"bom\n")
+    assert read_file(str(path), "cp1252") == ("bom\n", "utf-8", True)
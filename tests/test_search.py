@@ -0,0 +1,64 @@
+from notepad_core import (
+    REPLACE_MAX_REGIONS,
+    REPLACE_MERGE_GAP,
+    compile_search,
+    plan_replacements,
+)
+
+
+def test_compile_search_is_literal_and_ignores_case():
+    pattern = compile_search("a.b (c)")
+    assert pattern.findall("A.B (C) axb (c)") == ["A.B (C)"]
+
+
+def test_compile_search_match_case():
+    assert compile_search("Word", match_case=True).findall("word Word") == ["Word"]
+
+
+def test_compile_search_whole_word():
+    pattern = compile_search("cat", whole_word=True)
+    assert [m.start() for m in pattern.finditer("cat concat cats cat.")] == [0, 16]
+
+
+def test_compile_search_regex_alternatives_stay_whole_words():
+    pattern = compile_search("a|b", whole_word=True, regex=True)
+    assert pattern.findall("a ab b ba") == ["a", "b"]
+
+
+def apply_regions(text, regions):
+    for start, end, new in reversed(regions):
+        text = text[:start] + new + text[end:]
+    return text
+
+
+def test_plan_replacements_matches_sub():
+    text = "foo bar foo " * 50 + "x" * 200 + "foo"
+    pattern = compile_search("foo")
+    regions, spans = plan_replacements(text, pattern, "quux")
+    result = apply_regions(text, regions)
+    assert result == text.replace("foo", "quux")
+    assert len(spans) == text.count("foo")
+    assert all(result[start:end] == "quux" for start, end in spans)
+
+
+def test_plan_replacements_merges_nearby_matches():
+    text = (
+        "foo" + " " * REPLACE_MERGE_GAP + "foo" + " " * (REPLACE_MERGE_GAP + 1) + "foo"
+    )
+    regions, _ = plan_replacements(text, compile_search("foo"), "x")
+    assert len(regions) == 2
+    assert apply_regions(text, regions) == text.replace("foo", "x")
+
+
+def test_plan_replacements_expands_groups():
+    pattern = compile_search(r"(\w+)@(\w+)", regex=True)
+    regions, _ = plan_replacements("a@b c@d", pattern, r"\2@\1", regex=True)
+    assert apply_regions("a@b c@d", regions) == "b@a d@c"
+
+
+def test_plan_replacements_scattered_matches_become_one_edit():
+    text = ("foo" + " " * (REPLACE_MERGE_GAP + 1)) * (REPLACE_MAX_REGIONS + 1)
+    regions, spans = plan_replacements(text, compile_search("foo"), "bar")
+    assert len(regions) == 1
+    assert len(spans) == REPLACE_MAX_REGIONS + 1
+    assert apply_regions(text, regions) == text.replace("foo", "bar")
@@ -0,0 +1,75 @@
+import json
+
+from notepad_core import SETTINGS_DEFAULTS, SettingsStore
+
+
+class Scheduler:
+    """Stands in for the Tk root: runs nothing until told to."""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def after(self, ms, callback, *args):
+        job = len(self.jobs) + 1
+        self.jobs[job] = (callback, args)
+        return job
+
+    def after_cancel(self, job):
+        del self.jobs[job]
+
+    def run(self):
+        jobs, self.jobs = self.jobs, {}
+        for callback, args in jobs.values():
+            callback(*args)
+
+
+def test_defaults_without_a_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = SettingsStore(Scheduler(), path=str(tmp_path / "settings.json"))
+    assert store["font_size"] == SETTINGS_DEFAULTS["font_size"]
+    assert store.get("missing", 1) == 1
+
+
+def test_legacy_settings_move_to_the_new_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "word_like_notepad_settings.json").write_text(
+        json.dumps({"theme": "dark"}), encoding="utf-8"
+    )
+    path = tmp_path / "config" / "settings.json"
+    path.parent.mkdir()
+    store = SettingsStore(Scheduler(), path=str(path))
+    assert store["theme"] == "dark"
+    store["font_size"] = 14
+    store.flush()
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert saved["theme"] == "dark" and saved["font_size"] == 14
+
+
+def test_the_new_file_wins_over_legacy_ones(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "settings.json").write_text('{"theme": "dark"}', encoding="utf-8")
+    path = tmp_path / "config.json"
+    path.write_text('{"font_size": 20}', encoding="utf-8")
+    store = SettingsStore(Scheduler(), path=str(path))
+    assert store["theme"] == "light"
+    assert store["font_size"] == 20
+
+
+def test_writes_are_debounced(tmp_path):
+    master = Scheduler()
+    path = tmp_path / "settings.json"
+    store = SettingsStore(master, path=str(path))
+    store["font_size"] = 13
+    store["font_size"] = 14
+    store["font_size"] = 14  # unchanged: nothing new to write
+    assert len(master.jobs) == 1 and not path.exists()
+    master.run()
+    assert json.loads(path.read_text(encoding="utf-8"))["font_size"] == 14
+
+
+def test_an_older_write_never_replaces_a_newer_one(tmp_path):
+    path = tmp_path / "settings.json"
+    store = SettingsStore(Scheduler(), path=str(path))
+    store._write('{"font_size": 2}', 2)
+    store._write('{"font_size": 1}', 1)
+    assert json.loads(path.read_text(encoding="utf-8")) == {"font_size": 2}
@@ -0,0 +1,26 @@
+from notepad_core import Document, SpellChecker
+
+
+def test_check_line_finds_unknown_words():
+    checker = SpellChecker(["the", "cat", "sat"])
+    assert checker.check_line("The cat szt on 3 mats") == ((8, 11), (12, 14), (17, 21))
+
+
+def test_check_line_accepts_possessives_and_apostrophes():
+    checker = SpellChecker(["cat", "don't"])
+    assert checker.check_line("cat's don't") == ()
+
+
+def test_check_line_caches_by_text():
+    checker = SpellChecker(["ab"])
+    # Same length, different words: each line gets its own result
+    assert checker.check_line("ab") == ()
+    assert checker.check_line("cd") == ((0, 2),)
+    assert checker.check_line("ab") == ()
+
+
+def test_check_document_whole_or_some_lines():
+    checker = SpellChecker(["good"])
+    snapshot = Document("good\nbadd good\ngood\nzzz").snapshot()
+    assert checker.check_document(snapshot) == (None, {2: ((0, 4),), 4: ((0, 3),)})
+    assert checker.check_document(snapshot, [1, 2]) == ([1, 2], {2: ((0, 4),)})
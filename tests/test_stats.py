@@ -0,0 +1,25 @@
+from notepad_core import OBJECT_CHAR, Document, DocumentStats, TextEdit, count_words
+
+
+def edit(document, stats, offset, removed_length, inserted):
+    removed = document.delete(offset, offset + removed_length)
+    document.insert(offset, inserted)
+    stats.apply(document, TextEdit(offset, removed, inserted))
+
+
+def test_count_words_treats_objects_as_breaks():
+    assert count_words(f"one{OBJECT_CHAR}two  three\n") == 3
+
+
+def test_document_stats_follow_edits():
+    document = Document()
+    stats = DocumentStats()
+    edit(document, stats, 0, 0, "hello world\nsecond line")
+    assert stats.words == 4
+    edit(document, stats, 5, 1, "")  # joins "hello" and "world"
+    assert stats.words == 3
+    edit(document, stats, 10, 1, " ")  # splits the lines into one
+    assert stats.words == 3
+    edit(document, stats, 0, 0, "a b c\n")
+    edit(document, stats, len(document), 0, " end")
+    assert stats.words == count_words(document.text()) == 7
@@ -0,0 +1,21 @@
+from notepad_core import PLAIN_STYLE, StyleTable
+
+
+def test_equal_styles_share_a_name():
+    table = StyleTable()
+    bold = PLAIN_STYLE._replace(bold=True)
+    tag = table.intern(bold)
+    assert table.intern(PLAIN_STYLE._replace(bold=True)) == tag
+    assert table.intern(PLAIN_STYLE._replace(italic=True)) != tag
+    assert table.is_style_tag(tag) and table.style_of(tag) == bold
+    assert len(table) == 2
+
+
+def test_forgotten_names_are_not_reused():
+    table = StyleTable()
+    bold = PLAIN_STYLE._replace(bold=True)
+    tag = table.intern(bold)
+    table.forget(tag)
+    assert not table.is_style_tag(tag)
+    assert len(table) == 0
+    assert table.intern(bold) != tag
@@ -0,0 +1,75 @@
+import io
+
+from notepad_core import (
+    OBJECT_CHAR,
+    Document,
+    TableModel,
+    open_delimited,
+    text_with_tables,
+)
+
+
+def test_append_pads_and_truncates_rows():
+    model = TableModel(["a", "b"])
+    model.append(["1"])
+    model.append(["2", "3", "extra"])
+    assert list(model.iter_rows()) == [("1", ""), ("2", "3")]
+    assert model.cell(-1, 1) == "b"
+
+
+def test_copy_is_independent():
+    model = TableModel.blank(2, 2)
+    copy = model.copy()
+    model.set_cell(0, 0, "changed")
+    assert copy.cell(0, 0) == ""
+    assert copy.rows == 2
+
+
+def test_markdown_escapes_pipes_and_newlines():
+    model = TableModel(["name", "note"])
+    model.append(["a|b", "two\nlines"])
+    assert "".join(model.iter_markdown()) == (
+        "| name | note |\n| --- | --- |\n| a\\|b | two lines |\n"
+    )
+
+
+def test_csv_round_trip(tmp_path):
+    model = TableModel(["x", "y"])
+    model.append(["1", "with, comma"])
+    buffer = io.StringIO()
+    model.write_csv(buffer)
+    path = tmp_path / "table.csv"
+    path.write_text(buffer.getvalue(), encoding="utf-8")
+    file, rows = open_delimited(str(path))
+    with file:
+        assert list(rows) == [["x", "y"], ["1", "with, comma"]]
+
+
+def test_open_delimited_sniffs_semicolons(tmp_path):
+    path = tmp_path / "table.txt"
+    path.write_text("a;b;c\n1;2;3\n4;5;6\n", encoding="utf-8")
+    file, rows = open_delimited(str(path))
+    with file:
+        assert next(rows) == ["a", "b", "c"]
+
+
+def test_load_rows_records_the_error():
+    model = TableModel(["a"])
+    model.loading = True
+
+    def rows():
+        yield ["1"]
+        raise ValueError("bad row")
+
+    model.load_rows(io.StringIO(), rows())
+    assert model.rows == 1
+    assert isinstance(model.error, ValueError)
+    assert not model.loading
+
+
+def test_text_with_tables_replaces_object_chars():
+    model = TableModel(["h"])
+    model.append(["v"])
+    snapshot = Document(f"before\n{OBJECT_CHAR}\nafter").snapshot()
+    text = "".join(text_with_tables(snapshot, [(7, model)]))
+    assert text == "before\n| h |\n| --- |\n| v |\n\nafter"
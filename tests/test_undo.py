@@ -0,0 +1,129 @@
+import json
+import os
+import zlib
+
+from notepad_core import OBJECT_CHAR, TextEdit, UndoHistory
+
+
+def apply_edits(text, edits):
+    for edit in edits:
+        end = edit.offset + len(edit.removed)
+        assert text[edit.offset : end] == edit.removed
+        text = text[: edit.offset] + edit.inserted + text[end:]
+    return text
+
+
+def type_text(history, text, offset=0):
+    for index, char in enumerate(text):
+        history.record(TextEdit(offset + index, "", char))
+
+
+def test_undo_typing_is_undone_a_word_at_a_time():
+    history = UndoHistory()
+    type_text(history, "one two")
+    text = "one two"
+    text = apply_edits(text, history.undo())
+    assert text == "one "
+    text = apply_edits(text, history.undo())
+    assert text == ""
+    assert history.undo() is None
+    text = apply_edits(text, history.redo())
+    assert text == "one "
+
+
+def test_undo_separator_ends_a_step():
+    history = UndoHistory()
+    history.autoseparators = False
+    history.record(TextEdit(0, "", "a"))
+    history.record(TextEdit(1, "", "b"))
+    history.separator()
+    history.record(TextEdit(2, "", "c"))
+    assert len(history) == 2
+    assert apply_edits("abc", history.undo()) == "ab"
+
+
+def test_undo_new_edit_clears_redo():
+    history = UndoHistory()
+    type_text(history, "ab")
+    history.undo()
+    history.record(TextEdit(0, "", "x"))
+    assert history.redo() is None
+
+
+def test_undo_max_steps():
+    history = UndoHistory(max_steps=3)
+    for index in range(10):
+        history.separator()
+        history.record(TextEdit(index, "", " "))
+    assert len(history) == 3
+
+
+def test_undo_object_char_resets():
+    history = UndoHistory()
+    type_text(history, "abc")
+    history.record(TextEdit(3, "", OBJECT_CHAR))
+    assert len(history) == 0
+
+
+def test_undo_old_steps_survive_compression():
+    history = UndoHistory()
+    text = ""
+    for index in range(200):
+        history.separator()
+        edit = TextEdit(len(text), "", f"step {index} ")
+        history.record(edit)
+        text += edit.inserted
+    assert len(history) == 200
+    while True:
+        edits = history.undo()
+        if edits is None:
+            break
+        text = apply_edits(text, edits)
+    assert text == ""
+
+
+def test_undo_spill_keeps_every_step():
+    history = UndoHistory(memory_limit=2000, spill=True)
+    text = ""
+    for index in range(200):
+        history.separator()
+        edit = TextEdit(len(text), "", f"step {index} ")
+        history.record(edit)
+        text += edit.inserted
+    # One step larger than the whole memory limit
+    history.separator()
+    history.record(TextEdit(len(text), "", "x" * 5000))
+    text += "x" * 5000
+    assert len(history) == 201
+    while True:
+        edits = history.undo()
+        if edits is None:
+            break
+        text = apply_edits(text, edits)
+    assert text == ""
+
+
+def test_undo_memory_limit_without_spill_drops_oldest():
+    history = UndoHistory(memory_limit=2000)
+    for index in range(100):
+        history.separator()
+        history.record(TextEdit(index, "", "y"))
+    assert 1 <= len(history) < 100
+
+
+def test_undo_spill_file_stays_bounded():
+    history = UndoHistory(max_steps=20, memory_limit=1000, spill=True)
+    text = ""
+    for index in range(500):
+        history.separator()
+        # Incompressible, so every step costs its full size on disk
+        edit = TextEdit(len(text), "", os.urandom(300).hex())
+        history.record(edit)
+        text += edit.inserted
+    step = len(zlib.compress(json.dumps([edit]).encode("utf-8")))
+    assert history._spill_file.seek(0, os.SEEK_END) <= 2 * 20 * step
+    # The steps left still come back from the rewritten file
+    for _ in range(20):
+        text = apply_edits(text, history.undo())
+    assert history.undo() is None
+    assert len(text) == 480 * 600